@@ -0,0 +1,164 @@
+"""Failure artifacts: what the pages looked like in the run up to a failure.
+
+An ArtifactRecorder is activated for the duration of a registration and
+records the steps it completes in memory, along with the last few pages
+already fetched (HTTP responses) in a bounded ring buffer. Browser pages are
+only read from the browser when the run fails, so successful runs pay no
+extra WebDriver calls; with `step_snapshots` every browser step is
+snapshotted too. Nothing is written unless the run fails, in which case the
+steps, buffer, a final snapshot and an optional screenshot are written out as
+one compressed zip bundle, capped in size. Like the helpers in metrics.py, the
+module-level functions record into whichever recorder is active and do
+nothing when none is.
+"""
+import contextvars
+import json
+import os
+import re
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+_current_recorder = contextvars.ContextVar('r2p_artifact_recorder', default=None)
+
+# Returns [url, html, full length] for the current page, with scripts, styles
+# and inline SVG removed and the HTML cut to arguments[0] characters
+TRIMMED_DOM_SCRIPT = """
+    const root = document.documentElement.cloneNode(true);
+    root.querySelectorAll('script, style, svg, noscript').forEach(function (node) { node.remove(); });
+    const html = root.outerHTML;
+    return [location.href, html.slice(0, arguments[0]), html.length];
+"""
+
+
+def _safe_name(value):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '-', str(value or 'unknown')).strip('-')[:60] or 'unknown'
+
+
+class ArtifactRecorder:
+    """Ring buffer of the last `max_snapshots` page snapshots of one run."""
+
+    def __init__(self, directory, max_snapshots=5, max_dom_chars=100_000, max_bytes=2_000_000,
+                 screenshot=True, keep=50, step_snapshots=False):
+        self.directory = directory
+        self.step_snapshots = step_snapshots
+        self.max_dom_chars = max_dom_chars
+        self.max_bytes = max_bytes
+        self.screenshot = screenshot
+        self.keep = keep
+        self.snapshots = deque(maxlen=max_snapshots)
+        self.steps = []
+        self.started_at = datetime.now(timezone.utc)
+
+    @contextmanager
+    def activate(self):
+        """Make this the recorder the module-level helpers record into."""
+        token = _current_recorder.set(self)
+        try:
+            yield self
+        finally:
+            _current_recorder.reset(token)
+
+    def _snapshot(self, name, url, html, full_length=None):
+        html = html or ''
+        return {
+            'name': name,
+            'at': round(time.time(), 3),
+            'url': url,
+            'html': html[:self.max_dom_chars],
+            'truncated': (full_length or len(html)) > self.max_dom_chars,
+        }
+
+    def _browser_snapshot(self, driver, name):
+        try:
+            url, html, full_length = driver.execute_script(TRIMMED_DOM_SCRIPT, self.max_dom_chars)
+        except Exception as e:
+            return {'name': name, 'at': round(time.time(), 3), 'error': str(e)}
+        return self._snapshot(name, url, html, full_length)
+
+    def add(self, name, url, html):
+        """Keep a snapshot of a page, dropping the oldest once the buffer is full."""
+        if self.snapshots.maxlen:
+            self.snapshots.append(self._snapshot(name, url, html))
+
+    def capture(self, driver, name):
+        """Record that step `name` completed, snapshotting the browser's page
+        in one WebDriver call if `step_snapshots` is set."""
+        self.steps.append({'name': name, 'at': round(time.time(), 3)})
+        if self.step_snapshots and self.snapshots.maxlen:
+            self.snapshots.append(self._browser_snapshot(driver, name))
+
+    def write(self, summary, driver=None):
+        """Write the buffered snapshots and `summary` (a JSON-serialisable dict
+        describing the run) to a zip bundle, adding a final snapshot and
+        screenshot from `driver` if given. Returns the bundle's path."""
+        history = list(self.snapshots)
+        if driver is not None:
+            history.append(self._browser_snapshot(driver, 'final'))
+        screenshot = None
+        if driver is not None and self.screenshot:
+            try:
+                screenshot = driver.get_screenshot_as_png()
+            except Exception:
+                screenshot = None
+
+        # Keep within the size cap: the newest snapshots matter most, then the screenshot
+        snapshots, budget = [], self.max_bytes
+        for snapshot in reversed(history):
+            size = len(snapshot.get('html', '').encode('utf-8'))
+            if size > budget:
+                break
+            budget -= size
+            snapshots.insert(0, snapshot)
+        if screenshot is not None and len(screenshot) > budget:
+            screenshot = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = self.started_at.strftime('%Y%m%dT%H%M%SZ')
+        path = os.path.join(self.directory, f"{stamp}-{_safe_name(summary.get('vehicle_plate'))}-{os.urandom(3).hex()}.zip")
+        manifest = dict(summary, steps=self.steps, snapshots=[], dropped_snapshots=len(history) - len(snapshots))
+        import zipfile  # only failed runs need it
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+            for index, snapshot in enumerate(snapshots):
+                entry = {key: value for key, value in snapshot.items() if key != 'html'}
+                if 'html' in snapshot:
+                    entry['file'] = f"{index:02d}-{_safe_name(snapshot['name'])}.html"
+                    bundle.writestr(entry['file'], snapshot['html'])
+                manifest['snapshots'].append(entry)
+            if screenshot is not None:
+                # PNGs are already compressed
+                bundle.writestr(zipfile.ZipInfo('screenshot.png'), screenshot, compress_type=zipfile.ZIP_STORED)
+                manifest['screenshot'] = 'screenshot.png'
+            bundle.writestr('manifest.json', json.dumps(manifest, indent=2, default=str))
+        self._prune()
+        return path
+
+    def _prune(self):
+        """Delete all but the `keep` most recently written bundles. Names
+        only sort by the second a run started, so go by modification time."""
+        try:
+            bundles = sorted((entry.stat().st_mtime_ns, entry.path) for entry in os.scandir(self.directory)
+                             if entry.name.endswith('.zip'))
+        except OSError:
+            return
+        for _, path in bundles[:-self.keep] if self.keep else []:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def capture_browser(driver, name):
+    """Record a completed browser step in the active recorder, if any."""
+    recorder = _current_recorder.get()
+    if recorder is not None:
+        recorder.capture(driver, name)
+
+
+def capture_page(name, url, html):
+    """Keep an already fetched page (e.g. an HTTP response) in the active
+    recorder, if any."""
+    recorder = _current_recorder.get()
+    if recorder is not None:
+        recorder.add(name, url, html)
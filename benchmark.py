@@ -0,0 +1,399 @@
+"""End-to-end benchmarks against the local stand-in server.
+
+Runs registrations against mock_server.py (no network access needed) and
+reports p50/p95 latency and registrations per minute for each engine, both
+one at a time and as a concurrent batch:
+
+    python benchmark.py
+    python benchmark.py --engines http --runs 50 --batch-size 100 --concurrency 8
+    python benchmark.py --latency 150 --jitter 50 --failure-rate 0.05 --json bench.json
+
+The Selenium scenarios are skipped when Chrome/chromedriver can't be started.
+
+--compare-profiles instead compares the browser profiles (standard vs
+lean): Chrome startup time, time until the registration form is usable, and
+the resident memory of the whole Chrome process tree.
+
+--compare-cache compares first page loads in a cold (empty) and a warm
+persistent browser profile: Chrome startup, time until the registration
+form is usable, and bytes transferred over the network.
+
+--startup measures start-up cost in fresh interpreters instead: importing
+register_parking, loading Selenium on top of it, and a full --check run.
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_server import start_mock_server
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of `values` (0 < fraction <= 1)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarise(name, durations, wall_time, succeeded, total):
+    return {
+        'scenario': name,
+        'registrations': total,
+        'succeeded': succeeded,
+        'p50': percentile(durations, 0.50),
+        'p95': percentile(durations, 0.95),
+        'wall_time': round(wall_time, 3),
+        'per_minute': round(total / wall_time * 60, 1) if wall_time else None,
+    }
+
+
+def make_registrations(rp, count, prefix):
+    return [
+        rp.Registration(
+            unit_number=str(100 + i), resident_name='Bench Resident', guest_name='Bench Guest',
+            guest_phone='5555550100', vehicle_make='Toyota', vehicle_model='Camry',
+            vehicle_plate=f"{prefix}{i:04d}", property_name='Sondery, The',
+        )
+        for i in range(count)
+    ]
+
+
+def bench_single(rp, name, engine, runs, pool=None):
+    """Run `runs` registrations one after another."""
+    durations, succeeded = [], 0
+    started = time.perf_counter()
+    for registration in make_registrations(rp, runs, name[:3].upper()):
+        result = rp.run_registration(registration, engine=engine, pool=pool)
+        durations.append(result.duration)
+        succeeded += bool(result)
+    return summarise(name, durations, time.perf_counter() - started, succeeded, runs)
+
+
+def bench_batch(rp, name, engine, size, concurrency):
+    """Run `size` registrations through register_batch()."""
+    registrations = make_registrations(rp, size, name[:3].upper())
+    started = time.perf_counter()
+    results = rp.register_batch(registrations, concurrency=concurrency, engine=engine)
+    wall_time = time.perf_counter() - started
+    return summarise(name, [r.duration for r in results], wall_time, sum(map(bool, results)), size)
+
+
+def selenium_available(rp):
+    try:
+        rp.quit_driver(rp.setup_driver())
+        return True
+    except Exception as e:
+        print(f"Skipping Selenium scenarios, Chrome could not be started: {e}", file=sys.stderr)
+        return False
+
+
+def process_tree_rss(pid):
+    """Total resident memory in bytes of `pid` and all its descendants (Linux)."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces; fields resume after ')'
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/statm') as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            pass
+        pending.extend(children.get(current, []))
+    return total
+
+
+def bench_profile(rp, profile, runs):
+    """Start Chrome with `profile` `runs` times and load the registration page."""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    startups, loads, rss = [], [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        driver = rp.setup_driver(profile=profile)
+        startups.append(time.perf_counter() - started)
+        try:
+            started = time.perf_counter()
+            driver.get(rp.REGISTER_URL)
+            WebDriverWait(driver, 30, poll_frequency=0.05).until(
+                EC.element_to_be_clickable((By.ID, 'confirmProperty'))
+            )
+            loads.append(time.perf_counter() - started)
+            rss.append(process_tree_rss(driver.service.process.pid))
+        finally:
+            rp.quit_driver(driver)
+    return {
+        'profile': profile,
+        'runs': runs,
+        'startup_p50': percentile(startups, 0.50),
+        'startup_p95': percentile(startups, 0.95),
+        'page_load_p50': percentile(loads, 0.50),
+        'page_load_p95': percentile(loads, 0.95),
+        'rss_mb_p50': round(percentile(rss, 0.50) / 1024 / 1024, 1),
+    }
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Settings that point register_parking at files outside its state directory
+STATE_PATH_SETTINGS = (
+    'STRATEGY_CACHE_PATH', 'PROPERTY_CACHE_PATH', 'ARTIFACT_DIR', 'LEDGER_PATH', 'PROFILE_STORE_DIR', 'WORK_QUEUE',
+)
+
+
+def isolate_state():
+    """Point register_parking's state (ledger, caches, artifacts) at a
+    temporary directory, removed at exit, so benchmark registrations never
+    touch the real ones. Must run before register_parking is imported."""
+    state_dir = tempfile.mkdtemp(prefix='r2p-bench-state-')
+    atexit.register(shutil.rmtree, state_dir, True)
+    os.environ['R2P_STATE_DIR'] = state_dir
+    for name in STATE_PATH_SETTINGS:
+        os.environ.pop(name, None)
+    return state_dir
+
+# A complete registration in the environment, for the --check scenario
+CHECK_ENV = {
+    'UNIT_NUMBER': '101', 'RESIDENT_NAME': 'Bench Resident', 'GUEST_NAME': 'Bench Guest',
+    'GUEST_PHONE': '5555550100', 'VEHICLE_MAKE': 'Toyota', 'VEHICLE_MODEL': 'Camry', 'VEHICLE_PLATE': 'BENCH01',
+}
+
+STARTUP_SCENARIOS = [
+    ('python (baseline)', ['-c', 'pass']),
+    ('import register_parking', ['-c', 'import register_parking']),
+    ('import + load Selenium', ['-c', 'import register_parking; register_parking.load_selenium()']),
+    ('--check --engine http', ['register_parking.py', '--check', '--engine', 'http']),
+    ('--check --engine selenium', ['register_parking.py', '--check', '--engine', 'selenium']),
+]
+
+
+def bench_startup(runs):
+    """Time each start-up scenario `runs` times in a fresh interpreter."""
+    env = dict(os.environ, **CHECK_ENV)
+    rows = []
+    for name, args in STARTUP_SCENARIOS:
+        durations = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, *args], cwd=HERE, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            durations.append(time.perf_counter() - started)
+        rows.append({
+            'scenario': name, 'runs': runs,
+            'p50_ms': round(percentile(durations, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(durations, 0.95) * 1000, 1),
+        })
+    return rows
+
+
+# Bytes the current page and its resources actually fetched over the network
+# (cache hits transfer nothing)
+TRANSFER_SIZE_SCRIPT = """
+    return performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'))
+        .reduce(function (total, entry) { return total + entry.transferSize; }, 0);
+"""
+
+
+def bench_cache(rp, warm, runs):
+    """Start Chrome `runs` times in a persistent profile and load the
+    registration page. Cold runs get a new, empty profile each time; warm
+    runs reuse one profile whose caches were filled by a first load."""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    from user_data import UserDataStore
+
+    def new_store():
+        return UserDataStore(tempfile.mkdtemp(prefix='r2p-bench-profile-'))
+
+    store = new_store()
+    if warm:
+        driver = rp.setup_driver(user_data=store)
+        try:
+            driver.get(rp.REGISTER_URL)
+        finally:
+            rp.quit_driver(driver)
+
+    startups, loads, transferred = [], [], []
+    for _ in range(runs):
+        if not warm:
+            store = new_store()
+        started = time.perf_counter()
+        driver = rp.setup_driver(user_data=store)
+        startups.append(time.perf_counter() - started)
+        try:
+            started = time.perf_counter()
+            driver.get(rp.REGISTER_URL)
+            WebDriverWait(driver, 30, poll_frequency=0.05).until(
+                EC.element_to_be_clickable((By.ID, 'confirmProperty'))
+            )
+            loads.append(time.perf_counter() - started)
+            transferred.append(driver.execute_script(TRANSFER_SIZE_SCRIPT))
+        finally:
+            rp.quit_driver(driver)
+        if not warm:
+            shutil.rmtree(store.directory, ignore_errors=True)
+    shutil.rmtree(store.directory, ignore_errors=True)
+    return {
+        'profile': 'warm' if warm else 'cold',
+        'runs': runs,
+        'startup_p50': percentile(startups, 0.50),
+        'startup_p95': percentile(startups, 0.95),
+        'page_load_p50': percentile(loads, 0.50),
+        'page_load_p95': percentile(loads, 0.95),
+        'transfer_kb_p50': round(percentile(transferred, 0.50) / 1024, 1),
+    }
+
+
+def print_cache_table(rows):
+    header = (f"{'profile':<10} {'n':>4} {'start p50':>10} {'start p95':>10} "
+              f"{'load p50':>10} {'load p95':>10} {'KiB in':>8}")
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(f"{row['profile']:<10} {row['runs']:>4} {row['startup_p50']:>10.3f} {row['startup_p95']:>10.3f} "
+              f"{row['page_load_p50']:>10.3f} {row['page_load_p95']:>10.3f} {row['transfer_kb_p50']:>8.1f}")
+
+
+def print_startup_table(rows):
+    header = f"{'scenario':<28} {'n':>4} {'p50 (ms)':>10} {'p95 (ms)':>10}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(f"{row['scenario']:<28} {row['runs']:>4} {row['p50_ms']:>10.1f} {row['p95_ms']:>10.1f}")
+
+
+def print_profile_table(rows):
+    header = (f"{'profile':<10} {'n':>4} {'start p50':>10} {'start p95':>10} "
+              f"{'load p50':>10} {'load p95':>10} {'RSS MB':>8}")
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(f"{row['profile']:<10} {row['runs']:>4} {row['startup_p50']:>10.3f} {row['startup_p95']:>10.3f} "
+              f"{row['page_load_p50']:>10.3f} {row['page_load_p95']:>10.3f} {row['rss_mb_p50']:>8.1f}")
+
+
+def print_table(rows):
+    header = f"{'scenario':<28} {'n':>5} {'ok':>5} {'p50 (s)':>9} {'p95 (s)':>9} {'wall (s)':>9} {'reg/min':>9}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        p50 = f"{row['p50']:.3f}" if row['p50'] is not None else '-'
+        p95 = f"{row['p95']:.3f}" if row['p95'] is not None else '-'
+        print(f"{row['scenario']:<28} {row['registrations']:>5} {row['succeeded']:>5} "
+              f"{p50:>9} {p95:>9} {row['wall_time']:>9.2f} {row['per_minute'] or 0:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark registrations against the local stand-in server')
+    parser.add_argument('--engines', default='http,selenium', help='Comma-separated engines to benchmark')
+    parser.add_argument('--runs', type=int, default=20, help='Sequential registrations per single-run scenario')
+    parser.add_argument('--batch-size', type=int, default=40, help='Registrations per batch scenario')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrency of the batch scenarios')
+    parser.add_argument('--latency', type=float, default=0, help='Server latency per response in milliseconds')
+    parser.add_argument('--jitter', type=float, default=0, help='Extra random server latency in milliseconds')
+    parser.add_argument('--failure-rate', type=float, default=0, help='Fraction of form posts that fail')
+    parser.add_argument('--compare-profiles', action='store_true',
+                        help='Compare browser profiles (startup, page load, RSS) instead of engines')
+    parser.add_argument('--compare-cache', action='store_true',
+                        help='Compare first page loads with a cold and a warm persistent browser profile')
+    parser.add_argument('--startup', action='store_true',
+                        help='Measure import and --check start-up time instead of registrations')
+    parser.add_argument('--json', help='Also write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        rows = bench_startup(args.runs)
+        print_startup_table(rows)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(rows, f, indent=2)
+        return rows
+
+    server = start_mock_server(
+        latency=args.latency / 1000, jitter=args.jitter / 1000,
+        failure_rate=args.failure_rate, email_enable_delay=0.2, seed=0,
+    )
+    # register_parking reads the site URL and its state paths at import time
+    os.environ['REGISTER2PARK_URL'] = server.base_url
+    isolate_state()
+    import register_parking as rp
+    logging.getLogger('register_parking').setLevel(logging.WARNING)
+
+    if args.compare_profiles:
+        try:
+            if not selenium_available(rp):
+                return []
+            rows = [bench_profile(rp, profile, args.runs) for profile in rp.BROWSER_PROFILES]
+        finally:
+            server.shutdown()
+        print_profile_table(rows)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(rows, f, indent=2)
+        return rows
+
+    if args.compare_cache:
+        try:
+            if not selenium_available(rp):
+                return []
+            rows = [bench_cache(rp, warm, args.runs) for warm in (False, True)]
+        finally:
+            server.shutdown()
+        print_cache_table(rows)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(rows, f, indent=2)
+        return rows
+
+    engines = [engine.strip() for engine in args.engines.split(',') if engine.strip()]
+    if 'selenium' in engines and not selenium_available(rp):
+        engines.remove('selenium')
+
+    rows = []
+    try:
+        for engine in engines:
+            if engine == 'selenium':
+                rows.append(bench_single(rp, 'selenium single (cold)', engine, args.runs))
+                with rp.DriverPool(size=1) as pool:
+                    rows.append(bench_single(rp, 'selenium single (pooled)', engine, args.runs, pool=pool))
+            else:
+                rows.append(bench_single(rp, f"{engine} single", engine, args.runs))
+            rows.append(bench_batch(rp, f"{engine} batch x{args.concurrency}", engine,
+                                    args.batch_size, args.concurrency))
+    finally:
+        server.shutdown()
+
+    print_table(rows)
+    if server.injected_failures:
+        print(f"\n{server.injected_failures} failures injected by the server")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Local SQLite ledger of completed registrations.
+
+Every successful registration is recorded with its confirmation code and
+when it is expected to expire, so a later run can tell (with one indexed
+lookup) that a vehicle is still registered and skip it.
+"""
+import csv
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+COLUMNS = (
+    'id', 'vehicle_plate', 'unit_number', 'property_name', 'confirmation_code',
+    'engine', 'registered_at', 'expires_at',
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS registrations (
+    id INTEGER PRIMARY KEY,
+    vehicle_plate TEXT NOT NULL,
+    unit_number TEXT,
+    property_name TEXT,
+    confirmation_code TEXT,
+    engine TEXT,
+    registered_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS registrations_active
+    ON registrations (vehicle_plate, property_name, expires_at);
+CREATE INDEX IF NOT EXISTS registrations_registered_at
+    ON registrations (registered_at);
+CREATE INDEX IF NOT EXISTS registrations_unit
+    ON registrations (property_name, unit_number);
+"""
+
+
+def normalize_plate(plate):
+    """Plates are compared ignoring case and spaces."""
+    return ''.join((plate or '').split()).upper()
+
+
+def _timestamp(moment):
+    # Fixed-width UTC timestamps compare correctly as strings
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def parse_timestamp(value):
+    """Parse a ledger timestamp back into an aware UTC datetime."""
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+class Ledger:
+    """The registrations table of one SQLite file. Safe to share between
+    threads."""
+
+    def __init__(self, path):
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        if path != ':memory:':
+            # Readers (another process checking the ledger) don't block writers
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def record(self, registration, result, valid_for, engine=None, registered_at=None):
+        """Record a successful registration that stays valid for `valid_for`
+        (a timedelta) from `registered_at` (default now)."""
+        registered_at = registered_at or _now()
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO registrations (vehicle_plate, unit_number, property_name, confirmation_code,'
+                ' engine, registered_at, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (normalize_plate(registration.vehicle_plate), registration.unit_number, registration.property_name,
+                 result.confirmation_code, engine, _timestamp(registered_at), _timestamp(registered_at + valid_for)),
+            )
+
+    def active(self, vehicle_plate, property_name, margin=timedelta(0), now=None):
+        """Return the latest registration of the plate at the property that is
+        still valid `margin` from now, as a dict, or None."""
+        cutoff = _timestamp((now or _now()) + margin)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT * FROM registrations WHERE vehicle_plate = ? AND property_name = ? AND expires_at > ?'
+                ' ORDER BY expires_at DESC LIMIT 1',
+                (normalize_plate(vehicle_plate), property_name, cutoff),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def query(self, vehicle_plate=None, property_name=None, unit_number=None, since=None, active_only=False,
+              limit=None):
+        """Return matching registrations, newest first, as dicts. `since` is a
+        datetime; only registrations made at or after it are returned."""
+        clauses, params = [], []
+        if vehicle_plate is not None:
+            clauses.append('vehicle_plate = ?')
+            params.append(normalize_plate(vehicle_plate))
+        if property_name is not None:
+            clauses.append('property_name = ?')
+            params.append(property_name)
+        if unit_number is not None:
+            clauses.append('unit_number = ?')
+            params.append(unit_number)
+        if since is not None:
+            clauses.append('registered_at >= ?')
+            params.append(_timestamp(since))
+        if active_only:
+            clauses.append('expires_at > ?')
+            params.append(_timestamp(_now()))
+        sql = 'SELECT * FROM registrations'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY registered_at DESC, id DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(int(limit))
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def export(self, path, **filters):
+        """Write the matching registrations (see query()) to `path` as CSV, or
+        as JSONL when it ends in .jsonl/.ndjson. Returns the row count."""
+        rows = self.query(**filters)
+        with open(path, 'w', newline='') as f:
+            if path.endswith('.jsonl') or path.endswith('.ndjson'):
+                for row in rows:
+                    f.write(json.dumps(row) + "\n")
+            else:
+                writer = csv.DictWriter(f, fieldnames=COLUMNS)
+                writer.writeheader()
+                writer.writerows(rows)
+        return len(rows)
+
+    def prune(self, older_than):
+        """Delete registrations that expired more than `older_than` (a
+        timedelta) ago. Returns the number deleted."""
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM registrations WHERE expires_at < ?',
+                                        (_timestamp(_now() - older_than),))
+            return cursor.rowcount
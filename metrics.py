@@ -0,0 +1,170 @@
+"""Per-run timing spans and machine-readable metrics for registrations.
+
+A RunMetrics is activated for the duration of a registration; the helpers
+below (span, record_retry, record_fallback) record into whichever run is
+active in the current thread and do nothing when none is.
+"""
+import contextvars
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+_current_run = contextvars.ContextVar('r2p_run_metrics', default=None)
+
+
+class RunMetrics:
+    """Timings, retry counts and fallback paths for one registration run."""
+
+    def __init__(self, engine, vehicle_plate=None):
+        self.engine = engine
+        self.vehicle_plate = vehicle_plate
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        self.spans = []
+        self.retries = {}
+        self.fallbacks = []
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def activate(self):
+        """Make this the run that the module-level helpers record into."""
+        token = _current_run.set(self)
+        try:
+            yield self
+        finally:
+            _current_run.reset(token)
+
+    @contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append({'name': name, 'duration': round(time.perf_counter() - started, 4)})
+
+    def record_retry(self, target):
+        self.retries[target] = self.retries.get(target, 0) + 1
+
+    def record_fallback(self, path):
+        self.fallbacks.append(path)
+
+    def step_durations(self):
+        """Return {span name: total seconds}, summing repeated spans."""
+        totals = {}
+        for span in self.spans:
+            totals[span['name']] = round(totals.get(span['name'], 0) + span['duration'], 4)
+        return totals
+
+    def to_dict(self):
+        return {
+            'engine': self.engine,
+            'vehicle_plate': self.vehicle_plate,
+            'started_at': self.started_at,
+            'total_duration': round(time.perf_counter() - self._started, 4),
+            'steps': self.step_durations(),
+            'spans': self.spans,
+            'retries': self.retries,
+            'fallbacks': self.fallbacks,
+        }
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as `name` in the active run, if any."""
+    run = _current_run.get()
+    if run is None:
+        yield
+        return
+    with run.span(name):
+        yield
+
+
+def record_retry(target):
+    run = _current_run.get()
+    if run is not None:
+        run.record_retry(target)
+
+
+def record_fallback(path):
+    run = _current_run.get()
+    if run is not None:
+        run.record_fallback(path)
+
+
+def append_metrics(results, path):
+    """Append the metrics record of each result to the JSONL file at `path`."""
+    with open(path, 'a') as f:
+        for result in results:
+            record = dict(result.metrics or {'vehicle_plate': result.vehicle_plate})
+            record.update(success=result.success, confirmation_code=result.confirmation_code, error=result.error)
+            f.write(json.dumps(record) + "\n")
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def write_prometheus_textfile(results, path):
+    """Write a Prometheus textfile-collector file summarising `results`.
+
+    The file is replaced atomically so the collector never reads a partial
+    write.
+    """
+    succeeded = sum(1 for result in results if result.success)
+    step_sums, step_counts, retries, fallbacks = {}, {}, {}, {}
+    for result in results:
+        metrics = result.metrics or {}
+        for name, duration in metrics.get('steps', {}).items():
+            step_sums[name] = step_sums.get(name, 0) + duration
+            step_counts[name] = step_counts.get(name, 0) + 1
+        for target, count in metrics.get('retries', {}).items():
+            retries[target] = retries.get(target, 0) + count
+        for fallback in metrics.get('fallbacks', []):
+            fallbacks[fallback] = fallbacks.get(fallback, 0) + 1
+
+    lines = [
+        '# HELP r2p_registrations Registrations in the last run by outcome.',
+        '# TYPE r2p_registrations gauge',
+        f'r2p_registrations{{outcome="success"}} {succeeded}',
+        f'r2p_registrations{{outcome="failure"}} {len(results) - succeeded}',
+        # Plain gauges: the _sum/_count suffixes are reserved for summaries
+        # and histograms
+        '# HELP r2p_registration_seconds Total registration time in the last run.',
+        '# TYPE r2p_registration_seconds gauge',
+        f'r2p_registration_seconds {sum(result.duration for result in results):.4f}',
+        '# HELP r2p_step_seconds Time spent in each step in the last run.',
+        '# TYPE r2p_step_seconds gauge',
+    ]
+    lines += [f'r2p_step_seconds{{step="{_escape_label(name)}"}} {total:.4f}'
+              for name, total in sorted(step_sums.items())]
+    lines += [
+        '# HELP r2p_step_runs Number of times each step ran in the last run.',
+        '# TYPE r2p_step_runs gauge',
+    ]
+    lines += [f'r2p_step_runs{{step="{_escape_label(name)}"}} {count}'
+              for name, count in sorted(step_counts.items())]
+    lines += [
+        '# HELP r2p_retries Retries of each click/field helper in the last run.',
+        '# TYPE r2p_retries gauge',
+    ]
+    lines += [f'r2p_retries{{target="{_escape_label(target)}"}} {count}'
+              for target, count in sorted(retries.items())]
+    lines += [
+        '# HELP r2p_fallbacks Fallback paths taken in the last run.',
+        '# TYPE r2p_fallbacks gauge',
+    ]
+    lines += [f'r2p_fallbacks{{path="{_escape_label(fallback)}"}} {count}'
+              for fallback, count in sorted(fallbacks.items())]
+    lines += [
+        '# HELP r2p_last_run_timestamp_seconds When the last run finished.',
+        '# TYPE r2p_last_run_timestamp_seconds gauge',
+        f'r2p_last_run_timestamp_seconds {time.time():.0f}',
+    ]
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.r2p-', suffix='.prom.tmp')
+    with os.fdopen(fd, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
@@ -0,0 +1,379 @@
+"""A local stand-in for the Register2Park registration site.
+
+Serves the same pages, form fields and element IDs that register_parking.py
+depends on so both registration engines can be exercised offline. The
+registration page is interactive: its script posts each stage to the same
+form endpoints the HTTP engine uses and swaps the response into the page,
+so a real browser walks through property search, the rules popup, Visitor
+Parking, the vehicle form, the confirmation and the email modal.
+
+    python mock_server.py --port 8000 --latency 150 --failure-rate 0.05
+    REGISTER2PARK_URL=http://127.0.0.1:8000 python register_parking.py
+
+It can also be started in-process with start_mock_server().
+"""
+import argparse
+import html
+import logging
+import random
+import secrets
+import threading
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+SESSION_COOKIE = 'r2p_session'
+
+PROPERTIES = {
+    '1001': 'Sondery, The',
+    '1002': 'Sonder Heights',
+    '1003': 'Maple Court Apartments',
+}
+
+VEHICLE_FIELDS = (
+    ('vehicleApt', 'Apartment Number'),
+    ('vehicleResidentName', 'Resident Name'),
+    ('vehicleGuestName', 'Guest Name'),
+    ('vehicleGuestPhone', 'Guest Phone'),
+    ('vehicleMake', 'Make'),
+    ('vehicleModel', 'Model'),
+    ('vehicleLicensePlate', 'License Plate'),
+    ('vehicleLicensePlateConfirm', 'Confirm License Plate'),
+)
+
+# Form endpoints, named as in register_parking.HTTP_ENDPOINTS
+ENDPOINTS = {
+    '/register/property-search': 'property_search',
+    '/register/select-property': 'select_property',
+    '/register/parking-type': 'parking_type',
+    '/register/vehicle-information': 'vehicle_information',
+    '/register/email-confirmation': 'email_confirmation',
+}
+
+# Static assets referenced by the registration page, like the real site's
+# images, web fonts and third-party scripts: {name: (content type, body)}
+STATIC_ASSETS = {
+    'site.css': ('text/css', (
+        "@font-face { font-family: 'Site'; src: url('/static/site.woff2') format('woff2'); }\n"
+        "body { font-family: 'Site', sans-serif; }\n"
+        ".hero { background: url('/static/background.jpg'); }\n"
+    ).encode('utf-8')),
+    'site.woff2': ('font/woff2', bytes(48 * 1024)),
+    'hero.jpg': ('image/jpeg', bytes(250 * 1024)),
+    'background.jpg': ('image/jpeg', bytes(400 * 1024)),
+    'analytics.js': ('application/javascript', (
+        "window.dataLayer = window.dataLayer || [];\n" + "/* tracking */\n" * 2000
+    ).encode('utf-8')),
+}
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="csrf-token" content="{token}">
+<title>Register2Park</title>
+<style>
+.modal {{ position: fixed; top: 20%; left: 20%; background: #fff; border: 1px solid #888; padding: 1em; }}
+</style>
+</head>
+<body>
+{body}
+{script}
+</body>
+</html>
+"""
+
+# Drives the registration page the way the real site's scripts do: each
+# button posts its stage and the returned page body replaces #stage.
+SCRIPT = """<script>
+(function () {
+  const meta = document.querySelector('meta[name="csrf-token"]');
+  const stage = document.getElementById('stage');
+  const emailEnableDelay = %(email_enable_delay)d;
+  let propertyId = null;
+
+  async function post(path, data) {
+    const body = new URLSearchParams(data);
+    body.set('_token', meta.content);
+    const response = await fetch(path, {method: 'POST', body: body, credentials: 'same-origin'});
+    const doc = new DOMParser().parseFromString(await response.text(), 'text/html');
+    const token = doc.querySelector('meta[name="csrf-token"]');
+    if (token) meta.content = token.content;
+    return doc.body.innerHTML;
+  }
+
+  document.addEventListener('click', async function (event) {
+    const button = event.target.closest('button');
+    if (!button) return;
+    if (button.id === 'confirmProperty') {
+      const name = document.getElementById('propertyName').value;
+      document.getElementById('propertyResults').innerHTML =
+        await post('/register/property-search', {propertyName: name});
+    } else if (button.classList.contains('select-property')) {
+      propertyId = button.dataset.propertyId;
+      stage.innerHTML = await post('/register/select-property', {propertyId: propertyId});
+    } else if (button.id === 'rulesContinue') {
+      document.getElementById('rulesModal').remove();
+      document.getElementById('registrationTypeVisitor').style.display = '';
+    } else if (button.id === 'registrationTypeVisitor') {
+      stage.innerHTML = await post('/register/parking-type', {propertyId: propertyId, parkingType: 'visitor'});
+    } else if (button.id === 'vehicleInformation') {
+      const form = document.getElementById('vehicleInformationForm');
+      stage.innerHTML = await post('/register/vehicle-information', Object.fromEntries(new FormData(form)));
+      const emailButton = document.getElementById('email-confirmation');
+      if (emailButton) setTimeout(function () { emailButton.disabled = false; }, emailEnableDelay);
+    } else if (button.id === 'email-confirmation') {
+      document.getElementById('emailModal').style.display = '';
+    } else if (button.id === 'email-confirmation-send-view') {
+      const code = document.getElementById('email-confirmation').dataset.confirmationCode;
+      const email = document.getElementById('emailConfirmationEmailView').value;
+      const result = await post('/register/email-confirmation', {email: email, confirmationCode: code});
+      document.getElementById('emailModal').style.display = 'none';
+      alert(result.includes('success') ? 'Confirmation email sent' : 'Could not send email');
+    }
+  });
+})();
+</script>"""
+
+
+class MockRegister2ParkServer(ThreadingHTTPServer):
+    """The stand-in server. Keeps per-session state and a list of every
+    approved registration and email confirmation it has received.
+
+    `latency` (plus up to `jitter`) seconds is added to every response.
+    `failure_rate` is the chance that a form post fails with HTTP 500, and
+    `fail_endpoints` names endpoints (see ENDPOINTS) that always fail.
+    `email_enable_delay` is how long the email button stays disabled after
+    the confirmation page is shown.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, failure_rate=0.0, fail_endpoints=(),
+                 email_enable_delay=1.0, seed=None):
+        super().__init__(address, MockRegister2ParkHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.fail_endpoints = set(fail_endpoints)
+        self.email_enable_delay = email_enable_delay
+        self.random = random.Random(seed)
+        self.sessions = {}
+        self.registrations = []
+        self.emails = []
+        self.injected_failures = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def delay(self):
+        with self.lock:
+            extra = self.random.uniform(0, self.jitter) if self.jitter else 0
+        if self.latency or extra:
+            time.sleep(self.latency + extra)
+
+    def should_fail(self, endpoint):
+        with self.lock:
+            fail = endpoint in self.fail_endpoints or (
+                self.failure_rate and self.random.random() < self.failure_rate
+            )
+            if fail:
+                self.injected_failures += 1
+            return fail
+
+
+class MockRegister2ParkHandler(BaseHTTPRequestHandler):
+    server_version = 'MockRegister2Park/1.0'
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    # -- plumbing -----------------------------------------------------------
+
+    def _session(self):
+        cookie = SimpleCookie(self.headers.get('Cookie', ''))
+        session_id = cookie[SESSION_COOKIE].value if SESSION_COOKIE in cookie else None
+        with self.server.lock:
+            if session_id not in self.server.sessions:
+                session_id = secrets.token_hex(8)
+                self.server.sessions[session_id] = {'token': secrets.token_hex(16)}
+            self._session_id = session_id
+            return self.server.sessions[session_id]
+
+    def _form(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        return {name: values[-1] for name, values in parse_qs(body, keep_blank_values=True).items()}
+
+    def _send(self, status, body, content_type='text/html; charset=utf-8', cache=False):
+        payload = body.encode('utf-8') if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if cache:
+            # Static assets are cacheable, as on the real site
+            self.send_header('Cache-Control', 'public, max-age=86400')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Set-Cookie', f"{SESSION_COOKIE}={self._session_id}; Path=/; HttpOnly")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _page(self, session, body, status=200, script=''):
+        self._send(status, PAGE.format(token=session['token'], body=body, script=script))
+
+    # -- routes -------------------------------------------------------------
+
+    def do_GET(self):
+        session = self._session()
+        self.server.delay()
+        path = self.path.split('?')[0]
+        if path in ('/register', '/register/'):
+            script = SCRIPT % {'email_enable_delay': int(self.server.email_enable_delay * 1000)}
+            self._page(session, self._register_page(), script=script)
+        elif path.startswith('/static/') and path[len('/static/'):] in STATIC_ASSETS:
+            content_type, body = STATIC_ASSETS[path[len('/static/'):]]
+            self._send(200, body, content_type=content_type, cache=True)
+        else:
+            self._page(session, "<h1>Not Found</h1>", status=404)
+
+    def do_POST(self):
+        session = self._session()
+        form = self._form()
+        self.server.delay()
+        endpoint = ENDPOINTS.get(self.path.split('?')[0])
+        if endpoint is None:
+            self._page(session, "<h1>Not Found</h1>", status=404)
+            return
+        if form.get('_token') != session['token']:
+            self._page(session, "<h1>Page Expired</h1>", status=419)
+            return
+        if self.server.should_fail(endpoint):
+            self._page(session, "<h1>Server Error</h1>", status=500)
+            return
+        status, body = getattr(self, f"_{endpoint}")(session, form)
+        self._page(session, body, status=status)
+
+    def _register_page(self):
+        return """<link rel="stylesheet" href="/static/site.css">
+<script src="/static/analytics.js" async></script>
+<div class="hero"><img src="/static/hero.jpg" alt="" width="960" height="320"></div>
+<h1>Register Your Vehicle</h1>
+<form id="propertySearch" method="post" action="/register/property-search" onsubmit="return false;">
+<input type="text" id="propertyName" name="propertyName" placeholder="Property Name">
+<button type="button" id="confirmProperty">Next</button>
+</form>
+<div id="propertyResults"></div>
+<div id="stage"></div>"""
+
+    def _property_search(self, session, form):
+        query = form.get('propertyName', '').strip().lower()
+        matches = [(pid, name) for pid, name in PROPERTIES.items() if query and query in name.lower()]
+        if not matches:
+            return 200, '<p>No properties found</p>'
+        return 200, "\n".join(
+            f'<div class="property"><span>{html.escape(name)}</span>'
+            f'<button type="button" class="select-property" data-property-id="{pid}">Select</button></div>'
+            for pid, name in matches
+        )
+
+    def _select_property(self, session, form):
+        property_id = form.get('propertyId')
+        if property_id not in PROPERTIES:
+            return 404, "<h1>Unknown property</h1>"
+        session['property_id'] = property_id
+        return 200, f"""<div class="modal show" id="rulesModal">
+<p>Parking rules for {html.escape(PROPERTIES[property_id])}</p>
+<button type="button" id="rulesContinue">Continue</button>
+</div>
+<button type="button" id="registrationTypeVisitor" style="display: none">Visitor Parking</button>"""
+
+    def _parking_type(self, session, form):
+        if 'property_id' not in session or form.get('parkingType') != 'visitor':
+            return 400, "<h1>Select a property first</h1>"
+        session['form_nonce'] = secrets.token_hex(8)
+        inputs = "\n".join(
+            f'<label for="{field_id}">{label}</label>'
+            f'<input type="text" id="{field_id}" name="{field_id}">'
+            for field_id, label in VEHICLE_FIELDS
+        )
+        return 200, f"""<form id="vehicleInformationForm" method="post" action="/register/vehicle-information" onsubmit="return false;">
+<input type="hidden" name="propertyId" value="{session['property_id']}">
+<input type="hidden" name="formNonce" value="{session['form_nonce']}">
+{inputs}
+<button type="button" id="vehicleInformation">Next</button>
+</form>"""
+
+    def _vehicle_information(self, session, form):
+        if form.get('formNonce') != session.get('form_nonce'):
+            return 400, "<h1>Form expired</h1>"
+        missing = [label for field_id, label in VEHICLE_FIELDS if not form.get(field_id)]
+        if missing:
+            return 422, f"<p class=\"error\">Missing: {html.escape(', '.join(missing))}</p>"
+        if form['vehicleLicensePlate'] != form['vehicleLicensePlateConfirm']:
+            return 422, '<p class="error">License plates do not match</p>'
+        code = secrets.token_hex(4).upper()
+        with self.server.lock:
+            self.server.registrations.append(dict(form, property_id=session['property_id'], code=code))
+        session['confirmation_code'] = code
+        return 200, f"""<div class="circle-success"></div>
+<h2>Approved</h2>
+<p>Confirmation Code</p>
+<h3>{code}</h3>
+<button type="button" id="email-confirmation" data-confirmation-code="{code}" disabled>Email Confirmation</button>
+<div class="modal" id="emailModal" style="display: none">
+<label for="emailConfirmationEmailView">Email</label>
+<input type="email" id="emailConfirmationEmailView" name="email">
+<button type="button" id="email-confirmation-send-view">Send</button>
+</div>"""
+
+    def _email_confirmation(self, session, form):
+        if form.get('confirmationCode') != session.get('confirmation_code') or not form.get('email'):
+            return 400, '<p class="error">Could not send email</p>'
+        with self.server.lock:
+            self.server.emails.append((form['email'], form['confirmationCode']))
+        return 200, '<p class="success">Confirmation email sent</p>'
+
+
+def start_mock_server(host='127.0.0.1', port=0, **options):
+    """Start the stand-in server on a background thread and return it. Use
+    `server.base_url` to point REGISTER2PARK_URL at it and `server.shutdown()`
+    to stop it. `options` are passed to MockRegister2ParkServer."""
+    server = MockRegister2ParkServer((host, port), **options)
+    thread = threading.Thread(target=server.serve_forever, name='mock-register2park', daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run a local stand-in for Register2Park')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0, help='Milliseconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0, help='Up to this many extra random milliseconds')
+    parser.add_argument('--failure-rate', type=float, default=0,
+                        help='Fraction of form posts that fail with HTTP 500')
+    parser.add_argument('--fail-endpoint', action='append', default=[], choices=sorted(ENDPOINTS.values()),
+                        help='Endpoint that always fails (repeatable)')
+    parser.add_argument('--email-enable-delay', type=float, default=1000,
+                        help='Milliseconds the email button stays disabled')
+    parser.add_argument('--seed', type=int, help='Random seed for jitter and failures')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = MockRegister2ParkServer(
+        (args.host, args.port), latency=args.latency / 1000, jitter=args.jitter / 1000,
+        failure_rate=args.failure_rate, fail_endpoints=args.fail_endpoint,
+        email_enable_delay=args.email_enable_delay / 1000, seed=args.seed,
+    )
+    print(f"Mock Register2Park running at {server.base_url}/register")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
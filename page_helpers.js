@@ -0,0 +1,133 @@
+// In-page helpers for register_parking.py, installed as window.__r2p.
+//
+// Injected once per document (Page.addScriptToEvaluateOnNewDocument, or on
+// first use) and called through execute_async_script, so each lookup, click
+// or wait is a single WebDriver round trip. Waits are driven by a
+// MutationObserver in the page rather than by polling from Python.
+//
+// Element specs are plain objects:
+//   {selector: 'css'}          elements matching a CSS selector
+//   {role: 'button'}           elements with that role (see ROLES)
+//   {text: 'Continue'}         ...whose text (or value) contains this; a text
+//                              spec with no selector/role looks at buttons
+//   {enabled: true}            ...that are not disabled
+//   {visible: false}           include hidden elements (default: visible only)
+//   {any: [spec, ...]}         the first spec that matches
+(function () {
+  if (window.__r2p) return;
+
+  const ROLES = {
+    button: 'button, [role="button"], input[type="submit"], input[type="button"]',
+    link: 'a[href], [role="link"]',
+    textbox: 'input:not([type]), input[type="text"], input[type="email"], input[type="tel"], textarea, [role="textbox"]',
+    dialog: 'dialog, [role="dialog"], .modal',
+    heading: 'h1, h2, h3, h4, h5, h6, [role="heading"]',
+  };
+
+  function isVisible(el) {
+    if (!el.getClientRects().length) return false;
+    return getComputedStyle(el).visibility !== 'hidden';
+  }
+
+  function textOf(el) {
+    return el.textContent || el.value || '';
+  }
+
+  function find(spec) {
+    if (spec.any) {
+      for (const option of spec.any) {
+        const el = find(option);
+        if (el) return el;
+      }
+      return null;
+    }
+    const selector = spec.selector || ROLES[spec.role || (spec.text ? 'button' : '')] || '*';
+    for (const el of document.querySelectorAll(selector)) {
+      if (spec.text && !textOf(el).includes(spec.text)) continue;
+      if (spec.visible !== false && !isVisible(el)) continue;
+      if (spec.enabled && el.disabled) continue;
+      return el;
+    }
+    return null;
+  }
+
+  function exists(spec) {
+    return find(spec) !== null;
+  }
+
+  function click(spec) {
+    const el = find(spec);
+    if (!el) return false;
+    el.click();
+    return true;
+  }
+
+  function networkIdleFor(ms) {
+    const entries = performance.getEntriesByType('resource');
+    if (!entries.length) return true;
+    return performance.now() - Math.max(...entries.map(e => e.responseEnd)) >= ms;
+  }
+
+  // Resolve true once `spec` matches, or false after timeoutMs. With settleMs,
+  // the match must also survive settleMs without DOM changes or network
+  // responses, i.e. the page has finished rendering around it.
+  function waitFor(spec, timeoutMs, settleMs) {
+    return new Promise(function (resolve) {
+      let settleTimer = null;
+      let finished = false;
+      let observer = null;
+      let fallbackTimer = null;
+      let deadline = null;
+
+      function finish(value) {
+        if (finished) return;
+        finished = true;
+        if (observer) observer.disconnect();
+        clearTimeout(settleTimer);
+        clearTimeout(deadline);
+        clearInterval(fallbackTimer);
+        resolve(value);
+      }
+
+      function settled() {
+        settleTimer = null;
+        if (!exists(spec)) return;
+        if (document.readyState === 'complete' && networkIdleFor(settleMs)) {
+          finish(true);
+        } else {
+          settleTimer = setTimeout(settled, settleMs);
+        }
+      }
+
+      // Called on every DOM mutation: (re)start the settle period, since the
+      // page is evidently still changing.
+      function check() {
+        if (finished) return;
+        if (!exists(spec)) {
+          clearTimeout(settleTimer);
+          settleTimer = null;
+          return;
+        }
+        if (!settleMs) {
+          finish(true);
+          return;
+        }
+        clearTimeout(settleTimer);
+        settleTimer = setTimeout(settled, settleMs);
+      }
+
+      observer = new MutationObserver(check);
+      observer.observe(document.documentElement, {
+        childList: true, subtree: true, attributes: true, characterData: true,
+      });
+      // Style-only changes (transitions, stylesheet loads) don't mutate the DOM
+      fallbackTimer = setInterval(function () {
+        if (settleTimer === null) check();
+      }, 250);
+      deadline = setTimeout(function () { finish(false); }, timeoutMs);
+      check();
+    });
+  }
+
+  window.__r2p = {find: find, exists: exists, click: click, waitFor: waitFor};
+})();
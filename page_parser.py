@@ -0,0 +1,205 @@
+"""Lightweight HTML parsing for Register2Park pages.
+
+Uses only the standard library so that responses (and browser page source)
+can be queried locally without a WebDriver round trip per lookup.
+"""
+import re
+from html.parser import HTMLParser
+
+# Elements that never have a closing tag
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr',
+}
+
+# Field names Register2Park-style forms use for their CSRF token
+CSRF_FIELD_NAMES = ('_token', 'csrf_token', 'csrfmiddlewaretoken', '__RequestVerificationToken')
+
+
+class Element:
+    """A parsed element: its tag, attributes and text content (including the
+    text of its descendants, like the DOM's textContent)."""
+
+    def __init__(self, tag, attrs, parent=None):
+        self.tag = tag
+        self.attrs = {name: (value if value is not None else '') for name, value in attrs}
+        self.parent = parent
+        self._text = []
+
+    @property
+    def id(self):
+        return self.attrs.get('id')
+
+    @property
+    def classes(self):
+        return self.attrs.get('class', '').split()
+
+    @property
+    def text(self):
+        return ' '.join(''.join(self._text).split())
+
+    def get(self, name, default=None):
+        return self.attrs.get(name, default)
+
+    def __repr__(self):
+        return f"<{self.tag} id={self.id!r} class={self.attrs.get('class')!r}>"
+
+
+class _SnapshotParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.elements = []
+        self._open = []
+
+    def handle_starttag(self, tag, attrs):
+        element = Element(tag, attrs, parent=self._open[-1] if self._open else None)
+        self.elements.append(element)
+        if tag not in VOID_ELEMENTS:
+            self._open.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.elements.append(Element(tag, attrs, parent=self._open[-1] if self._open else None))
+
+    def handle_endtag(self, tag):
+        # Close back to the matching tag, tolerating unclosed children
+        for index in range(len(self._open) - 1, -1, -1):
+            if self._open[index].tag == tag:
+                del self._open[index:]
+                break
+
+    def handle_data(self, data):
+        for element in self._open:
+            element._text.append(data)
+
+
+class PageSnapshot:
+    """A parsed copy of an HTML document that can be queried locally."""
+
+    def __init__(self, html, url=None):
+        self.html = html or ''
+        self.url = url
+        parser = _SnapshotParser()
+        parser.feed(self.html)
+        parser.close()
+        self.elements = parser.elements
+
+    def find_all(self, tag=None, id=None, class_name=None, text=None, **attrs):
+        """Return every element matching all of the given criteria. `text`
+        matches when it is contained in the element's text content."""
+        matches = []
+        for element in self.elements:
+            if tag is not None and element.tag != tag:
+                continue
+            if id is not None and element.id != id:
+                continue
+            if class_name is not None and class_name not in element.classes:
+                continue
+            if text is not None and text not in element.text:
+                continue
+            if any(element.attrs.get(name.replace('_', '-')) != value for name, value in attrs.items()):
+                continue
+            matches.append(element)
+        return matches
+
+    def find(self, tag=None, id=None, class_name=None, text=None, **attrs):
+        """Return the first matching element, or None."""
+        matches = self.find_all(tag=tag, id=id, class_name=class_name, text=text, **attrs)
+        return matches[0] if matches else None
+
+    def exists(self, tag=None, id=None, class_name=None, text=None, **attrs):
+        return self.find(tag=tag, id=id, class_name=class_name, text=text, **attrs) is not None
+
+    def csrf_token(self):
+        """Return the page's CSRF token from a <meta> tag or hidden input, if any."""
+        meta = self.find('meta', name='csrf-token')
+        if meta is not None and meta.get('content'):
+            return meta.get('content')
+        for field_name in CSRF_FIELD_NAMES:
+            field = self.find('input', name=field_name)
+            if field is not None and field.get('value'):
+                return field.get('value')
+        return None
+
+    def form_fields(self, form_id=None):
+        """Return {name: value} for the named inputs of a form (or the whole
+        page when `form_id` is None)."""
+        inside = None
+        if form_id is not None:
+            inside = self.find('form', id=form_id)
+            if inside is None:
+                return {}
+        values = {}
+        for element in self.elements:
+            if element.tag not in ('input', 'select', 'textarea') or not element.get('name'):
+                continue
+            if inside is not None and not _is_descendant(element, inside):
+                continue
+            values[element.get('name')] = element.get('value', '')
+        return values
+
+
+def _is_descendant(element, ancestor):
+    parent = element.parent
+    while parent is not None:
+        if parent is ancestor:
+            return True
+        parent = parent.parent
+    return False
+
+
+CONFIRMATION_CODE_PATTERN = re.compile(r'Confirmation Code\s*:?\s*([A-Za-z0-9-]+)', re.IGNORECASE)
+
+
+def registration_approved(snapshot):
+    """True if the page shows the Approved heading or the success circle."""
+    return (snapshot.exists('h2', text='Approved')
+            or snapshot.exists(class_name='circle-success'))
+
+
+def extract_confirmation_code(snapshot):
+    """Return the confirmation code shown on the confirmation page, or None."""
+    # The code is rendered as the page's <h3>
+    heading = snapshot.find('h3')
+    if heading is not None and heading.text:
+        return heading.text
+    # Or an element carrying it as data (e.g. the email confirmation button)
+    for element in snapshot.elements:
+        if element.get('data-confirmation-code'):
+            return element.get('data-confirmation-code')
+    # Otherwise look for "Confirmation Code: XYZ" in the text
+    for element in snapshot.find_all(text='Confirmation Code'):
+        match = CONFIRMATION_CODE_PATTERN.search(element.text)
+        if match:
+            return match.group(1)
+    return None
+
+
+def _is_hidden(element):
+    style = element.get('style', '').replace(' ', '').lower()
+    return 'display:none' in style or 'hidden' in element.attrs
+
+
+def page_diagnostics(snapshot, limit=10):
+    """Summarise what a page shows, for logging when a step goes wrong:
+    headings, error messages, modals, inputs and buttons (at most `limit` of
+    each)."""
+    def describe(element):
+        return {name: value for name, value in (
+            ('tag', element.tag), ('id', element.id), ('class', element.get('class')),
+            ('type', element.get('type')), ('text', element.text[:80] or None),
+            ('hidden', _is_hidden(element) or None), ('disabled', 'disabled' in element.attrs or None),
+        ) if value}
+
+    title = snapshot.find('title')
+    errors = [element for element in snapshot.elements
+              if {'error', 'alert', 'invalid-feedback'} & set(element.classes)]
+    return {
+        'url': snapshot.url,
+        'title': title.text if title is not None else None,
+        'headings': [element.text for element in snapshot.elements
+                     if element.tag in ('h1', 'h2', 'h3') and element.text][:limit],
+        'errors': [element.text for element in errors if element.text][:limit],
+        'modals': [describe(element) for element in snapshot.find_all(class_name='modal')][:limit],
+        'inputs': [describe(element) for element in snapshot.find_all('input')][:limit],
+        'buttons': [describe(element) for element in snapshot.find_all('button')][:limit],
+    }
@@ -1,33 +1,96 @@
-import os
 import time
+# When the module started importing, so --check can report its full cost
+IMPORT_STARTED = time.perf_counter()
+import os
+import re
+import csv
+import functools
+import json
 import logging
 import argparse
+import queue
+import random
+import shutil
+import signal
+import subprocess
+import threading
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, asdict, fields
 from datetime import datetime, timedelta
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, ElementClickInterceptedException
-
-# Try to import dotenv for local development
-try:
-    from dotenv import load_dotenv
-    load_dotenv()  # This loads the variables from .env
-    print("Loaded environment from .env file")
-except ImportError:
-    print("python-dotenv not installed, using system environment variables")
+from importlib.util import find_spec
+from typing import Callable, Optional
+from page_parser import PageSnapshot, registration_approved, extract_confirmation_code, page_diagnostics
+from metrics import RunMetrics, span, record_retry, record_fallback, append_metrics, write_prometheus_textfile
+from ledger import Ledger, normalize_plate, parse_timestamp
+from artifacts import ArtifactRecorder, capture_browser, capture_page
+from tracing import NetworkTrace, configure_options as configure_tracing
+from user_data import UserDataStore
+from work_queue import open_queue
+from scheduler import Scheduler, backoff_delay
 
 # Set up logging - console only, no file
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
+    format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
+# Load a .env file for local development, if there is one (python-dotenv is
+# only imported when it's needed)
+for _dotenv_path in ('.env', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')):
+    if os.path.isfile(_dotenv_path):
+        try:
+            from dotenv import load_dotenv
+            load_dotenv(_dotenv_path)
+            logger.debug(f"Loaded environment from {_dotenv_path}")
+        except ImportError:
+            logger.warning(f"Found {_dotenv_path} but python-dotenv is not installed, ignoring it")
+        break
+
+# Selenium and requests take most of this module's import time, so they are
+# imported on first use by load_selenium() and load_requests()
+webdriver = By = Options = WebDriverWait = EC = None
+TimeoutException = NoSuchElementException = ElementClickInterceptedException = None
+requests = HTTPAdapter = None
+
+_import_lock = threading.Lock()
+
+def load_selenium():
+    """Import Selenium into this module's namespace, once. `webdriver` is
+    bound last, so a caller that finds it set finds everything else set too."""
+    global webdriver, By, Options, WebDriverWait, EC
+    global TimeoutException, NoSuchElementException, ElementClickInterceptedException
+    if webdriver is not None:
+        return
+    with _import_lock:
+        if webdriver is not None:
+            return
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.common.exceptions import TimeoutException, NoSuchElementException, ElementClickInterceptedException
+        from selenium import webdriver
+
+def load_requests():
+    """Import requests for the HTTP engine, once. Returns False if it isn't
+    installed. Like load_selenium(), the flag (`requests`) is bound last."""
+    global requests, HTTPAdapter
+    if requests is not None:
+        return True
+    with _import_lock:
+        if requests is None:
+            try:
+                from requests.adapters import HTTPAdapter
+                import requests
+            except ImportError:
+                return False
+    return True
+
 # Get environment variables
 PROPERTY_NAME = os.environ.get('PROPERTY_NAME', 'Sondery, The')
 UNIT_NUMBER = os.environ.get('UNIT_NUMBER')
@@ -39,53 +102,478 @@ VEHICLE_MODEL = os.environ.get('VEHICLE_MODEL')
 VEHICLE_PLATE = os.environ.get('VEHICLE_PLATE')
 NOTIFICATION_EMAIL = os.environ.get('NOTIFICATION_EMAIL')
 
-def setup_driver(headless=True):
-    """Set up and return a configured Chrome webdriver."""
+REGISTER2PARK_URL = os.environ.get('REGISTER2PARK_URL', 'https://www.register2park.com').rstrip('/')
+REGISTER_URL = f"{REGISTER2PARK_URL}/register"
+
+# Which engine performs registrations: 'selenium' drives Chrome, 'http' posts
+# the forms directly, 'auto' tries 'http' and falls back to 'selenium'
+ENGINES = ('selenium', 'http', 'auto')
+REGISTRATION_ENGINE = os.environ.get('REGISTRATION_ENGINE', 'selenium')
+
+# Total wall-clock budget for one registration run, in seconds. Each step has
+# its own deadline as well, but no step may run past what is left of this.
+RUN_BUDGET = float(os.environ.get('RUN_BUDGET', '120'))
+# How often readiness conditions are re-evaluated while waiting
+POLL_INTERVAL = 0.1
+
+# Where state that outlives a run (learned strategies, caches) is kept
+STATE_DIR = os.path.expanduser(os.environ.get('R2P_STATE_DIR', '~/.cache/register2park'))
+# Set to an empty string to keep learned strategies in memory only
+STRATEGY_CACHE_PATH = os.environ.get('STRATEGY_CACHE_PATH', os.path.join(STATE_DIR, 'strategies.json'))
+# Resolved property ids are reused for this long before being searched for again
+PROPERTY_CACHE_TTL_HOURS = float(os.environ.get('PROPERTY_CACHE_TTL_HOURS', '168'))
+# Set to an empty string to keep resolved properties in memory only
+PROPERTY_CACHE_PATH = os.environ.get('PROPERTY_CACHE_PATH', os.path.join(STATE_DIR, 'properties.json'))
+# HTTP-engine confirmation emails are sent by this many background workers
+# (browser sends each run at once on their own thread), each send allowed
+# this many seconds
+EMAIL_WORKERS = int(os.environ.get('EMAIL_WORKERS', '2'))
+EMAIL_BUDGET = float(os.environ.get('EMAIL_BUDGET', '60'))
+# Failed runs leave a zip of their steps, last ARTIFACT_SNAPSHOTS pages (each
+# cut to ARTIFACT_DOM_CHARS, the bundle to ARTIFACT_MAX_BYTES), final page and
+# a screenshot here;
+# the newest ARTIFACT_KEEP bundles are kept. An empty ARTIFACT_DIR disables this.
+ARTIFACT_DIR = os.environ.get('ARTIFACT_DIR', os.path.join(STATE_DIR, 'artifacts'))
+ARTIFACT_SNAPSHOTS = int(os.environ.get('ARTIFACT_SNAPSHOTS', '5'))
+ARTIFACT_DOM_CHARS = int(os.environ.get('ARTIFACT_DOM_CHARS', '100000'))
+ARTIFACT_MAX_BYTES = int(os.environ.get('ARTIFACT_MAX_BYTES', '2000000'))
+ARTIFACT_SCREENSHOT = os.environ.get('ARTIFACT_SCREENSHOT', 'true').lower() == 'true'
+ARTIFACT_KEEP = int(os.environ.get('ARTIFACT_KEEP', '50'))
+# Also snapshot the page after every browser step (one WebDriver call each,
+# paid on successful runs too) instead of only the final page of a failure
+ARTIFACT_STEP_SNAPSHOTS = os.environ.get('ARTIFACT_STEP_SNAPSHOTS', 'false').lower() == 'true'
+# Browser runs write a network/performance trace (see tracing.py) here when
+# set; the newest TRACE_KEEP traces are kept
+TRACE_DIR = os.environ.get('TRACE_DIR', '')
+TRACE_KEEP = int(os.environ.get('TRACE_KEEP', '50'))
+# Ledger of completed registrations; set to an empty string to disable it
+LEDGER_PATH = os.environ.get('LEDGER_PATH', os.path.join(STATE_DIR, 'ledger.sqlite3'))
+# How long a visitor registration stays valid on the site
+REGISTRATION_VALIDITY_HOURS = float(os.environ.get('REGISTRATION_VALIDITY_HOURS', '24'))
+# A registration expiring sooner than this is renewed rather than skipped
+LEDGER_RENEW_MARGIN_MINUTES = float(os.environ.get('LEDGER_RENEW_MARGIN_MINUTES', '120'))
+# Ledger entries that expired more than this long ago are deleted, checked at
+# most once a day per process (0 keeps them all)
+LEDGER_RETENTION_DAYS = float(os.environ.get('LEDGER_RETENTION_DAYS', '90'))
+# A pooled browser session is recycled after this many registrations
+DRIVER_MAX_USES = int(os.environ.get('DRIVER_MAX_USES', '20'))
+
+# With PERSISTENT_PROFILES, each browser runs in a persistent user-data
+# directory under PROFILE_STORE_DIR that keeps its HTTP and code caches
+# (at most PROFILE_CACHE_MB) between runs. Cleanup of oversized or unused
+# (PROFILE_MAX_AGE_DAYS) profiles runs every PROFILE_CLEANUP_HOURS.
+PERSISTENT_PROFILES = os.environ.get('PERSISTENT_PROFILES', 'false').lower() == 'true'
+PROFILE_STORE_DIR = os.environ.get('PROFILE_STORE_DIR', os.path.join(STATE_DIR, 'chrome-profiles'))
+PROFILE_CACHE_MB = int(os.environ.get('PROFILE_CACHE_MB', '200'))
+PROFILE_CLEANUP_HOURS = float(os.environ.get('PROFILE_CLEANUP_HOURS', '24'))
+PROFILE_MAX_AGE_DAYS = float(os.environ.get('PROFILE_MAX_AGE_DAYS', '14'))
+
+# 'standard' loads the site like a desktop browser; 'lean' skips everything
+# a registration doesn't need (images, fonts, analytics) and starts faster
+BROWSER_PROFILES = ('standard', 'lean')
+BROWSER_PROFILE = os.environ.get('BROWSER_PROFILE', 'standard')
+
+# Requests the lean profile blocks, as Network.setBlockedURLs patterns
+LEAN_BLOCKED_URLS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+    '*facebook.net*', '*hotjar.com*', '*clarity.ms*', '*/analytics.js*',
+]
+
+# Chrome features and background services the lean profile turns off
+LEAN_CHROME_FLAGS = [
+    "--window-size=1024,768",
+    "--blink-settings=imagesEnabled=false",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-translate",
+    "--disable-features=Translate,OptimizationHints,MediaRouter,InterestFeedContentSuggestions",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--metrics-recording-only",
+    "--mute-audio",
+]
+
+@dataclass
+class Registration:
+    """The details for a single vehicle registration."""
+    unit_number: Optional[str] = None
+    resident_name: Optional[str] = None
+    guest_name: Optional[str] = None
+    guest_phone: Optional[str] = None
+    vehicle_make: Optional[str] = None
+    vehicle_model: Optional[str] = None
+    vehicle_plate: Optional[str] = None
+    property_name: Optional[str] = PROPERTY_NAME
+    notification_email: Optional[str] = None
+
+    REQUIRED = (
+        'unit_number', 'resident_name', 'guest_name',
+        'guest_phone', 'vehicle_make', 'vehicle_model', 'vehicle_plate'
+    )
+
+    @classmethod
+    def from_env(cls):
+        """Build a registration from the environment variables."""
+        return cls(
+            unit_number=UNIT_NUMBER,
+            resident_name=RESIDENT_NAME,
+            guest_name=GUEST_NAME,
+            guest_phone=GUEST_PHONE,
+            vehicle_make=VEHICLE_MAKE,
+            vehicle_model=VEHICLE_MODEL,
+            vehicle_plate=VEHICLE_PLATE,
+            property_name=PROPERTY_NAME,
+            notification_email=NOTIFICATION_EMAIL,
+        )
+
+    @classmethod
+    def from_record(cls, record):
+        """Build a registration from a manifest record. Keys may be the field
+        names or the matching environment variable names (e.g. UNIT_NUMBER);
+        unknown keys are ignored and blank values count as missing."""
+        known = {f.name for f in fields(cls)}
+        values = {}
+        for key, value in record.items():
+            key = key.strip().lower()
+            if key in known and value not in (None, ''):
+                values[key] = str(value).strip()
+        return cls(**values)
+
+    def missing_fields(self):
+        """Return the names of required fields that are not set."""
+        return [name.upper() for name in self.REQUIRED if not getattr(self, name)]
+
+@dataclass
+class RegistrationResult:
+    """The outcome of one registration. Truthy when the registration succeeded."""
+    vehicle_plate: Optional[str]
+    success: bool
+    confirmation_code: Optional[str] = None
+    duration: float = 0.0
+    error: Optional[str] = None
+    metrics: Optional[dict] = None
+    # True when the ledger showed the vehicle was already registered
+    skipped: bool = False
+    # True when a confirmation email was handed to the email stage
+    email_queued: bool = False
+    # Path of the failure artifact bundle, if one was written
+    artifacts: Optional[str] = None
+    # Path of the network trace, if one was written
+    trace: Optional[str] = None
+
+    def __bool__(self):
+        return self.success
+
+    def to_dict(self):
+        return asdict(self)
+
+_user_data_store = None
+_user_data_store_lock = threading.Lock()
+
+def get_user_data_store():
+    """Return the process-wide UserDataStore, or None when persistent
+    profiles are off or unsupported on this platform."""
+    global _user_data_store
+    if not PERSISTENT_PROFILES:
+        return None
+    with _user_data_store_lock:
+        if _user_data_store is None:
+            _user_data_store = UserDataStore(
+                PROFILE_STORE_DIR, max_cache_bytes=PROFILE_CACHE_MB * 1024 * 1024,
+                cleanup_interval=PROFILE_CLEANUP_HOURS * 3600, max_age=PROFILE_MAX_AGE_DAYS * 24 * 3600,
+            )
+            if not _user_data_store.available:
+                logger.warning("Persistent browser profiles need fcntl, using throwaway profiles")
+    return _user_data_store if _user_data_store.available else None
+
+def setup_driver(headless=True, profile=BROWSER_PROFILE, trace=None, user_data=None):
+    """Set up and return a configured Chrome webdriver.
+
+    `profile` is one of BROWSER_PROFILES. The lean profile uses the eager
+    page-load strategy, a smaller window, fewer background services, and
+    blocks images, fonts and analytics. With `trace` (default: TRACE_DIR is
+    set) Chrome records the DevTools network events NetworkTrace reads.
+    `user_data` is the UserDataStore to take a persistent profile from
+    (default: get_user_data_store()); close such drivers with quit_driver().
+    """
+    if trace is None:
+        trace = bool(TRACE_DIR)
+    if user_data is None:
+        user_data = get_user_data_store()
+    load_selenium()
+    if profile not in BROWSER_PROFILES:
+        raise ValueError(f"Unknown browser profile '{profile}', expected one of {', '.join(BROWSER_PROFILES)}")
     chrome_options = Options()
     if headless:
         chrome_options.add_argument("--headless=new")  # Using newer headless mode
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--window-size=1920,1080")
-    
-    driver = webdriver.Chrome(options=chrome_options)
+    if profile == 'lean':
+        for flag in LEAN_CHROME_FLAGS:
+            chrome_options.add_argument(flag)
+        chrome_options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.default_content_setting_values.notifications": 2,
+        })
+        # Return from driver.get() at DOMContentLoaded; steps wait for what they need
+        chrome_options.page_load_strategy = 'eager'
+    else:
+        chrome_options.add_argument("--window-size=1920,1080")
+    if trace:
+        configure_tracing(chrome_options)
+
+    slot = None
+    if user_data is not None:
+        slot = user_data.checkout()
+        chrome_options.add_argument(f"--user-data-dir={slot.path}")
+        chrome_options.add_argument(f"--disk-cache-size={user_data.max_cache_bytes}")
+    try:
+        driver = webdriver.Chrome(options=chrome_options)
+    except Exception:
+        if slot is not None:
+            user_data.release(slot)
+        raise
+    # Given back by quit_driver() once the browser has exited
+    driver.r2p_profile_slot = (user_data, slot) if slot is not None else None
+    if profile == 'lean':
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": LEAN_BLOCKED_URLS})
+        except Exception as e:
+            logger.warning(f"Could not set up request blocking: {e}")
+    # In-page waits run as async scripts, so allow them as long as a whole run
+    driver.set_script_timeout(RUN_BUDGET)
+    install_page_helpers(driver)
     return driver
 
-def safe_click(driver, selector_type, selector, timeout=5, description="element"):
-    """Try to click an element with retries."""
-    for attempt in range(3):
+def quit_driver(driver):
+    """Quit a driver from setup_driver(), clearing and unlocking its
+    persistent profile if it has one."""
+    try:
+        driver.quit()
+    finally:
+        user_data, slot = getattr(driver, 'r2p_profile_slot', None) or (None, None)
+        if slot is not None:
+            user_data.release(slot)
+
+class DriverPool:
+    """A bounded pool of warm Chrome sessions shared between registrations.
+
+    Sessions are started on demand, up to `size` at once. When an idle
+    session is borrowed again its cookies and storage are cleared and it is
+    sent back to the registration page, so the borrower starts on a fresh
+    page and sessions idle at shutdown are quit without any reset. Sessions
+    that fail that reset, raised during use, or have served `max_uses`
+    registrations are quit and replaced.
+    """
+
+    def __init__(self, size=1, headless=True, max_uses=DRIVER_MAX_USES, profile=BROWSER_PROFILE):
+        self.size = size
+        self.headless = headless
+        self.profile = profile
+        self.max_uses = max_uses
+        # LIFO so the most recently used (warmest) session is handed out first
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._uses = {}
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def acquire(self, timeout=None):
+        """Borrow a freshly reset session, starting a new one if none are idle."""
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No browser session available after {timeout}s")
         try:
-            element = WebDriverWait(driver, timeout).until(
-                EC.element_to_be_clickable((selector_type, selector))
-            )
-            driver.execute_script("arguments[0].click();", element)
-            logger.info(f"Clicked on {description}")
-            return True
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    driver = setup_driver(headless=self.headless, profile=self.profile)
+                    self._uses[driver] = 0
+                    logger.info("Started new pooled browser session")
+                    return driver
+                try:
+                    self._reset(driver)
+                    return driver
+                except Exception as e:
+                    logger.warning(f"Could not reset pooled browser session, replacing it: {e}")
+                    self._discard(driver)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, driver, discard=False):
+        """Return a borrowed session for reuse, or recycle it."""
+        try:
+            self._uses[driver] = self._uses.get(driver, 0) + 1
+            if discard or self._closed or self._uses[driver] >= self.max_uses:
+                self._discard(driver)
+                return
+            self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def session(self):
+        """Borrow a session for the duration of a `with` block."""
+        driver = self.acquire()
+        broken = False
+        try:
+            yield driver
+        except Exception:
+            broken = True
+            raise
+        finally:
+            self.release(driver, discard=broken)
+
+    def close(self):
+        """Quit every idle session. Sessions still borrowed are quit on release."""
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def _reset(self, driver):
+        # Storage can only be cleared from a page on the site's origin
+        try:
+            driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        except Exception:
+            pass
+        driver.delete_all_cookies()
+        driver.get(REGISTER_URL)
+
+    def _discard(self, driver):
+        uses = self._uses.pop(driver, 0)
+        try:
+            quit_driver(driver)
+            logger.info(f"Closed pooled browser session after {uses} registrations")
         except Exception as e:
-            logger.warning(f"Attempt {attempt+1}/3: Failed to click on {description}: {str(e)}")
-            time.sleep(1)
-    
-    logger.error(f"Failed to click on {description} after multiple attempts")
-    return False
+            logger.warning(f"Error closing pooled browser session: {e}")
+
+def safe_click(driver, selector_type, selector, timeout=5, description="element"):
+    """Try to click an element with retries."""
+    with span(f"click {description}"):
+        for attempt in range(3):
+            try:
+                element = WebDriverWait(driver, timeout).until(
+                    EC.element_to_be_clickable((selector_type, selector))
+                )
+                driver.execute_script("arguments[0].click();", element)
+                logger.info(f"Clicked on {description}")
+                return True
+            except Exception as e:
+                logger.warning(f"Attempt {attempt+1}/3: Failed to click on {description}: {str(e)}")
+                record_retry(description)
+                time.sleep(1)
+
+        logger.error(f"Failed to click on {description} after multiple attempts")
+        return False
 
 def safe_send_keys(driver, selector_type, selector, text, timeout=5, description="field"):
     """Try to send keys to an element with retries."""
-    for attempt in range(3):
+    with span(f"type {description}"):
+        for attempt in range(3):
+            try:
+                element = WebDriverWait(driver, timeout).until(
+                    EC.visibility_of_element_located((selector_type, selector))
+                )
+                element.clear()
+                element.send_keys(text)
+                logger.info(f"Entered text in {description}: {text}")
+                return True
+            except Exception as e:
+                logger.warning(f"Attempt {attempt+1}/3: Failed to enter text in {description}: {str(e)}")
+                record_retry(description)
+                time.sleep(1)
+
+        logger.error(f"Failed to enter text in {description} after multiple attempts")
+        return False
+
+# Sets every field in one round trip the way typing would: through the
+# element's native value setter (so framework-managed inputs notice), firing
+# input/change and blur. Returns the ids that could not be set or that read
+# back different, checked only after every field's handlers have run.
+FILL_FORM_SCRIPT = """
+    const values = arguments[0];
+    const failed = [];
+    for (const [id, value] of Object.entries(values)) {
+        const field = document.getElementById(id);
+        if (!field || field.disabled || field.readOnly) {
+            failed.push(id);
+            continue;
+        }
+        const proto = field instanceof HTMLTextAreaElement ? HTMLTextAreaElement.prototype
+            : field instanceof HTMLSelectElement ? HTMLSelectElement.prototype
+            : HTMLInputElement.prototype;
+        field.focus();
+        Object.getOwnPropertyDescriptor(proto, 'value').set.call(field, value);
+        field.dispatchEvent(new Event('input', {bubbles: true}));
+        field.dispatchEvent(new Event('change', {bubbles: true}));
+        field.blur();
+    }
+    for (const [id, value] of Object.entries(values)) {
+        const field = document.getElementById(id);
+        if (!failed.includes(id) && field.value !== value) {
+            failed.push(id);
+        }
+    }
+    return failed;
+"""
+
+def fill_form(driver, fields, description="form"):
+    """Fill several fields at once. `fields` is a list of
+    (element id, value, description) tuples.
+
+    All fields are set and verified in a single injected script; only the
+    fields that didn't take are then typed individually with safe_send_keys.
+    Returns True if every field was filled.
+    """
+    values = {field_id: str(value) for field_id, value, _ in fields}
+    with span(f"fill {description}"):
         try:
-            element = WebDriverWait(driver, timeout).until(
-                EC.visibility_of_element_located((selector_type, selector))
-            )
-            element.clear()
-            element.send_keys(text)
-            logger.info(f"Entered text in {description}: {text}")
-            return True
+            failed = driver.execute_script(FILL_FORM_SCRIPT, values)
         except Exception as e:
-            logger.warning(f"Attempt {attempt+1}/3: Failed to enter text in {description}: {str(e)}")
-            time.sleep(1)
-    
-    logger.error(f"Failed to enter text in {description} after multiple attempts")
-    return False
+            logger.warning(f"Bulk fill of {description} failed, filling fields one by one: {str(e)}")
+            failed = list(values)
+        if not failed:
+            logger.info(f"Filled {len(values)} fields in {description}")
+            return True
+
+        for field_id, value, field_description in fields:
+            if field_id not in failed:
+                continue
+            record_fallback(f"fill {description}: type {field_id}")
+            if not safe_send_keys(driver, By.ID, field_id, value, description=field_description):
+                return False
+        return True
+
+def take_snapshot(driver):
+    """Fetch the page source once and parse it, so any number of questions
+    about the page can be answered without further WebDriver calls."""
+    with span("snapshot"):
+        return PageSnapshot(driver.page_source, url=driver.current_url)
+
+def log_page_diagnostics(driver, snapshot=None):
+    """Log a structured summary of the current page (headings, errors,
+    modals, inputs, buttons) from a single snapshot."""
+    try:
+        snapshot = snapshot or take_snapshot(driver)
+        logger.info(f"Page diagnostics: {json.dumps(page_diagnostics(snapshot))}")
+    except Exception as e:
+        logger.warning(f"Could not collect page diagnostics: {e}")
 
 def check_element_exists(driver, selector_type, selector, timeout=5, description="element"):
     """Check if an element exists on the page."""
@@ -99,447 +587,1724 @@ def check_element_exists(driver, selector_type, selector, timeout=5, description
         logger.info(f"Element {description} not found: {str(e)}")
         return False
 
-def register_parking(headless=True, debug_mode=False):
-    """Main function to handle the parking registration process."""
-    logger.info("Starting parking registration process")
-    
-    # Check if required environment variables are set
-    required_vars = [
-        'UNIT_NUMBER', 'RESIDENT_NAME', 'GUEST_NAME', 
-        'GUEST_PHONE', 'VEHICLE_MAKE', 'VEHICLE_MODEL', 'VEHICLE_PLATE'
-    ]
-    
-    missing_vars = [var for var in required_vars if not os.environ.get(var)]
-    if missing_vars:
-        logger.error(f"Missing required environment variables: {', '.join(missing_vars)}")
-        return False
-    
-    driver = None
+# ---------------------------------------------------------------------------
+# In-page helpers
+#
+# page_helpers.js installs window.__r2p in every document: text/role-based
+# element lookup, click, and MutationObserver-driven waits. Calling into it
+# is one WebDriver round trip, with no polling from Python.
+# ---------------------------------------------------------------------------
+
+PAGE_HELPERS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'page_helpers.js')
+
+@functools.lru_cache(maxsize=None)
+def page_helpers_source():
+    with open(PAGE_HELPERS_PATH) as f:
+        return f.read()
+
+def install_page_helpers(driver):
+    """Have Chrome add the helpers to every document it loads from now on."""
     try:
-        driver = setup_driver(headless=headless)
-        
-        # Step 1: Navigate directly to the registration page
-        driver.get("https://www.register2park.com/register")
-        logger.info("Navigated to Register2Park registration page")
-        
-        # Step 2: Enter property name
-        property_entered = safe_send_keys(
-            driver, By.ID, "propertyName", PROPERTY_NAME, 
-            description="property name field"
-        )
-        if not property_entered:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": page_helpers_source()})
+    except Exception as e:
+        # page_call() injects them on first use instead
+        logger.warning(f"Could not register page helpers: {e}")
+
+PAGE_CALL_SCRIPT = """
+    const done = arguments[arguments.length - 1];
+    if (!window.__r2p) {
+        done({missing: true});
+        return;
+    }
+    Promise.resolve(window.__r2p[arguments[0]](...arguments[1])).then(
+        value => done({value: value}),
+        error => done({error: String(error)})
+    );
+"""
+
+def page_call(driver, method, *args):
+    """Call window.__r2p.<method>(*args) in the page and return its result,
+    awaiting it if it is a promise. Injects the helpers if the page lacks them."""
+    for _ in range(2):
+        reply = driver.execute_async_script(PAGE_CALL_SCRIPT, method, list(args))
+        if reply.get('missing'):
+            driver.execute_script(page_helpers_source())
+            continue
+        if 'error' in reply:
+            raise RuntimeError(f"__r2p.{method} failed: {reply['error']}")
+        return reply.get('value')
+    raise RuntimeError("Could not install page helpers")
+
+def click_button_by_text(driver, text):
+    """Click the first button whose text contains `text`, preferring visible ones."""
+    return page_call(driver, 'click', {'any': [{'text': text}, {'text': text, 'visible': False}]})
+
+# ---------------------------------------------------------------------------
+# Readiness conditions
+#
+# Each of these returns a callable suitable for WebDriverWait.until(), in the
+# same shape as selenium's expected_conditions.
+# ---------------------------------------------------------------------------
+
+class InPageCondition:
+    """Readiness condition evaluated by the page helpers: the element described
+    by `spec` (see page_helpers.js) exists, and with `settle_ms`, the page has
+    then gone `settle_ms` without DOM changes or network responses.
+
+    run_steps() waits on it inside the page with a MutationObserver. It is
+    also a plain callable, so WebDriverWait can poll it like any other
+    condition."""
+
+    def __init__(self, spec, settle_ms=0):
+        self.spec = spec
+        self.settle_ms = settle_ms
+
+    def __call__(self, driver):
+        return bool(page_call(driver, 'exists', self.spec))
+
+    def wait(self, driver, timeout):
+        """Wait up to `timeout` seconds. Returns True once the condition holds."""
+        started = time.monotonic()
+        try:
+            return bool(page_call(driver, 'waitFor', self.spec, int(timeout * 1000), self.settle_ms))
+        except Exception as e:
+            # e.g. the page navigated away mid-wait, taking the observer with it
+            logger.info(f"In-page wait interrupted ({str(e).splitlines()[0]}), polling instead")
+        try:
+            WebDriverWait(driver, max(0, timeout - (time.monotonic() - started)), poll_frequency=POLL_INTERVAL).until(self)
+            return True
+        except TimeoutException:
             return False
-        
-        # Step 3: Click Next button
-        next_clicked = safe_click(
-            driver, By.ID, "confirmProperty", 
-            description="Next button"
-        )
-        if not next_clicked:
+
+def in_page(settle_ms=0, **spec):
+    """InPageCondition for one element spec, e.g. in_page(selector='#vehicleApt')."""
+    return InPageCondition(spec, settle_ms=settle_ms)
+
+def in_page_any(*conditions, settle_ms=0):
+    """InPageCondition that holds when any of `conditions` does."""
+    return InPageCondition({'any': [condition.spec for condition in conditions]}, settle_ms=settle_ms)
+
+def button_with_text(text):
+    """Locator for a <button> whose text contains `text`."""
+    return (By.XPATH, f"//button[contains(text(), '{text}')]")
+
+# ---------------------------------------------------------------------------
+# Step engine
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Step:
+    """One stage of the registration flow.
+
+    `ready` is waited on (up to `timeout` seconds, capped by what is left of
+    the run budget) before `action(driver, context)` is called. If the wait
+    times out, an optional step is skipped; any other step still runs its
+    action so that its fallback strategies get a chance. The action returns
+    True on success.
+    """
+    name: str
+    action: Callable
+    ready: Optional[Callable] = None
+    timeout: float = 10
+    optional: bool = False
+
+def _wait_until_ready(driver, condition, timeout):
+    if isinstance(condition, InPageCondition):
+        return condition.wait(driver, timeout)
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(condition)
+        return True
+    except TimeoutException:
+        return False
+
+def run_steps(driver, steps, context, budget=RUN_BUDGET):
+    """Run `steps` in order within `budget` seconds. Returns True if every
+    step succeeded; otherwise the name of the step that failed is left in
+    context['failed_step']."""
+    deadline = time.monotonic() + budget
+    for step in steps:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.error(f"Run budget of {budget:.0f}s exhausted before step '{step.name}'")
+            context['failed_step'] = step.name
             return False
-        
-        time.sleep(2)  # Wait for property list to load
-        
-        # Step 4: Select the property - FIXED VERSION
-        # First try to find the select button directly
+
+        started = time.monotonic()
+        with span(step.name):
+            if step.ready is not None:
+                with span(f"{step.name} (wait)"):
+                    ready = _wait_until_ready(driver, step.ready, min(step.timeout, remaining))
+                if not ready:
+                    if step.optional:
+                        logger.info(f"Step '{step.name}' not ready, skipping")
+                        continue
+                    logger.warning(f"Step '{step.name}' not ready after {time.monotonic() - started:.1f}s, trying anyway")
+
+            if not step.action(driver, context):
+                logger.error(f"Step '{step.name}' failed")
+                context['failed_step'] = step.name
+                return False
+            capture_browser(driver, step.name)
+            if context.get('trace') is not None:
+                context['trace'].step(step.name)
+        logger.info(f"Step '{step.name}' done in {time.monotonic() - started:.2f}s")
+    return True
+
+# ---------------------------------------------------------------------------
+# Learned fallback strategies
+#
+# Several steps have a chain of ways to do the same thing (a selenium click,
+# an XPath text match, a JavaScript scan). When the site changes, the first
+# strategy can cost many seconds of timeouts before a later one works, so the
+# strategy that last succeeded is remembered per step and tried first.
+# ---------------------------------------------------------------------------
+
+def _write_json_atomic(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+class SiteCache:
+    """A small JSON file of entries kept separately for each site URL, shared
+    between threads and rewritten atomically on change. An empty `path`
+    keeps the entries in memory only. Subclasses name what they hold in
+    `kind`, for log messages."""
+
+    kind = 'cache'
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        if not self.path:
+            return {}
         try:
-            select_buttons = driver.find_elements(By.CLASS_NAME, "select-property")
-            logger.info(f"Found {len(select_buttons)} select buttons")
-            
-            if len(select_buttons) > 0:
-                # Click the first select button (should be our property)
-                select_buttons[0].click()
-                logger.info("Clicked on the first select button")
-            else:
-                # If no buttons found, try different approaches
-                logger.warning("No select buttons found with class 'select-property'")
-                
-                # Approach 1: Try clicking any button with 'Select' text
-                select_text_buttons = driver.find_elements(By.XPATH, "//button[contains(text(), 'Select')]")
-                if len(select_text_buttons) > 0:
-                    select_text_buttons[0].click()
-                    logger.info("Clicked on button with 'Select' text")
-                else:
-                    # Approach 2: Try using JavaScript to find and click the button
-                    logger.warning("No buttons found with 'Select' text, trying JavaScript approach")
-                    driver.execute_script("""
-                        // Look for any button that contains 'Select'
-                        const buttons = document.querySelectorAll('button');
-                        for (const button of buttons) {
-                            if (button.textContent.includes('Select')) {
-                                button.click();
-                                return true;
-                            }
-                        }
-                        return false;
-                    """)
-                    logger.info("Attempted to click Select button via JavaScript")
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            _write_json_atomic(self.path, self._entries)
+        except OSError as e:
+            logger.warning(f"Could not save {self.kind}: {e}")
+
+    def _get(self, key):
+        with self._lock:
+            return self._entries.get(REGISTER2PARK_URL, {}).get(key)
+
+    def invalidate(self, key):
+        """Forget the entry for `key` on the current site."""
+        with self._lock:
+            if self._entries.get(REGISTER2PARK_URL, {}).pop(key, None) is not None:
+                self._save()
+
+class StrategyCache(SiteCache):
+    """Persisted record of which strategy last worked for each step, kept
+    separately for each site URL."""
+
+    kind = 'strategy cache'
+
+    def __init__(self, path=STRATEGY_CACHE_PATH):
+        super().__init__(path)
+
+    def preferred(self, step):
+        """Return the name of the strategy that last worked for `step`, if any."""
+        entry = self._get(step)
+        return entry['strategy'] if entry else None
+
+    def record_success(self, step, strategy):
+        with self._lock:
+            site = self._entries.setdefault(REGISTER2PARK_URL, {})
+            entry = site.get(step)
+            if entry and entry['strategy'] == strategy:
+                entry['successes'] += 1
+                # Only rewrite the file when what we'd try first changes
+                return
+            site[step] = {'strategy': strategy, 'successes': 1, 'learned_at': datetime.now().isoformat(timespec='seconds')}
+            self._save()
+
+_strategy_cache = None
+_strategy_cache_lock = threading.Lock()
+
+def get_strategy_cache():
+    """Return the process-wide StrategyCache, loading it on first use."""
+    global _strategy_cache
+    with _strategy_cache_lock:
+        if _strategy_cache is None:
+            _strategy_cache = StrategyCache()
+        return _strategy_cache
+
+def run_strategies(driver, step, strategies):
+    """Try `strategies`, a list of (name, function(driver) -> bool), until one
+    succeeds. The strategy that last worked for `step` is tried first; if it
+    fails it is forgotten and the rest are tried in their usual order."""
+    cache = get_strategy_cache()
+    preferred = cache.preferred(step)
+    ordered = sorted(strategies, key=lambda strategy: strategy[0] != preferred)
+    for name, attempt in ordered:
+        try:
+            succeeded = attempt(driver)
         except Exception as e:
-            logger.error(f"Failed to select property: {str(e)}")
-            return False
-        
+            logger.warning(f"Strategy '{name}' for {step} raised: {str(e)}")
+            succeeded = False
+        if succeeded:
+            if name != strategies[0][0]:
+                record_fallback(f"{step}: {name}")
+            cache.record_success(step, name)
+            return True
+        if name == preferred:
+            logger.info(f"Learned strategy '{name}' for {step} stopped working, re-learning")
+            cache.invalidate(step)
+    return False
+
+# ---------------------------------------------------------------------------
+# Property resolution cache
+#
+# The property search (type the name, confirm, pick the first result) gives
+# the same answer on every run of a deployment. The property id it resolves
+# to is remembered so later registrations can select it directly; if that
+# lands somewhere unexpected the entry is dropped and the search runs again.
+# ---------------------------------------------------------------------------
+
+class PropertyCache(SiteCache):
+    """Persisted property name -> property id, kept separately for each site
+    URL, with entries expiring after `ttl` seconds."""
+
+    kind = 'property cache'
+
+    def __init__(self, path=PROPERTY_CACHE_PATH, ttl=PROPERTY_CACHE_TTL_HOURS * 3600):
+        super().__init__(path)
+        self.ttl = ttl
+
+    def lookup(self, property_name, browser=False):
+        """Return the cached property id for `property_name`, or None if there
+        is none or it has expired. With `browser`, also None when selecting
+        the id directly didn't work in the browser."""
+        entry = self._get(property_name)
+        if entry is None or time.time() - entry['resolved_at'] > self.ttl:
+            return None
+        if browser and not entry.get('browser_shortcut', True):
+            return None
+        return entry['property_id']
+
+    def record(self, property_name, property_id, browser_shortcut=True):
+        """Remember `property_id`. `browser_shortcut` False records that the
+        site ignored a direct selection of it, so browser runs search until
+        the entry expires."""
+        with self._lock:
+            site = self._entries.setdefault(REGISTER2PARK_URL, {})
+            entry = site.get(property_name)
+            if (entry and entry['property_id'] == property_id and time.time() - entry['resolved_at'] <= self.ttl
+                    and entry.get('browser_shortcut', True) == browser_shortcut):
+                return
+            site[property_name] = {'property_id': property_id, 'resolved_at': time.time()}
+            if not browser_shortcut:
+                site[property_name]['browser_shortcut'] = False
+            self._save()
+
+_property_cache = None
+_property_cache_lock = threading.Lock()
+
+def get_property_cache():
+    """Return the process-wide PropertyCache, loading it on first use."""
+    global _property_cache
+    with _property_cache_lock:
+        if _property_cache is None:
+            _property_cache = PropertyCache()
+        return _property_cache
+
+# ---------------------------------------------------------------------------
+# Registration step actions
+# ---------------------------------------------------------------------------
+
+def _open_register_page(driver, context):
+    # A pooled session has just been reset onto a freshly loaded registration page
+    if driver.current_url == REGISTER_URL:
+        logger.info("Already on Register2Park registration page")
+        return True
+    driver.get(REGISTER_URL)
+    logger.info("Navigated to Register2Park registration page")
+    return True
+
+def _enter_property_name(driver, context):
+    return safe_send_keys(
+        driver, By.ID, "propertyName", context['registration'].property_name,
+        description="property name field"
+    )
+
+def _confirm_property(driver, context):
+    return safe_click(
+        driver, By.ID, "confirmProperty",
+        description="Next button"
+    )
+
+def _click_first(driver, locator, description):
+    elements = driver.find_elements(*locator)
+    logger.info(f"Found {len(elements)} {description}")
+    if not elements:
+        return False
+    elements[0].click()
+    logger.info(f"Clicked on the first of the {description}")
+    return True
+
+def _click_text_with_js(driver, text):
+    clicked = click_button_by_text(driver, text)
+    logger.info(f"Clicked {text} button via JavaScript: {clicked}")
+    return bool(clicked)
+
+PROPERTY_ID_SCRIPT = """
+    const button = document.querySelector('.select-property');
+    return button ? (button.dataset.propertyId || button.value || null) : null;
+"""
+
+# How long the site may take to show the rules popup after a cached property
+# is selected before the selection is taken to have been ignored
+CACHED_PROPERTY_RESPONSE_TIMEOUT = 1.0
+
+# Recreates the search result button for a known property and clicks it, so
+# the site's own handler makes the selection
+SELECT_CACHED_PROPERTY_SCRIPT = """
+    const button = document.createElement('button');
+    button.type = 'button';
+    button.className = 'select-property';
+    button.dataset.propertyId = arguments[0];
+    button.value = arguments[0];
+    button.textContent = 'Select';
+    (document.getElementById('propertyResults') || document.body).appendChild(button);
+    button.click();
+    return true;
+"""
+
+def _select_property(driver, context):
+    # Remember which property the search resolved to for next time
+    try:
+        context['resolved_property_id'] = driver.execute_script(PROPERTY_ID_SCRIPT)
+    except Exception as e:
+        logger.debug(f"Could not read the property id: {e}")
+    # The first select button should be our property
+    return run_strategies(driver, "select property", [
+        ("select-property class", lambda d: _click_first(d, (By.CLASS_NAME, "select-property"), "select buttons")),
+        ("Select text", lambda d: _click_first(d, button_with_text('Select'), "buttons with 'Select' text")),
+        ("JavaScript", lambda d: _click_text_with_js(d, 'Select')),
+    ])
+
+def _select_cached_property(driver, context):
+    logger.info(f"Selecting cached property id {context['property_id']}")
+    if not driver.execute_script(SELECT_CACHED_PROPERTY_SCRIPT, context['property_id']):
+        return False
+    # Fail fast if the site didn't act on the click, rather than in the
+    # rules popup step's waits and fallbacks
+    if not in_page(text='Continue').wait(driver, CACHED_PROPERTY_RESPONSE_TIMEOUT):
+        logger.warning(f"No rules popup {CACHED_PROPERTY_RESPONSE_TIMEOUT:.0f}s after selecting the cached property")
+        return False
+    return True
+
+def _click_button_with_js_fallback(driver, step, text, description):
+    return run_strategies(driver, step, [
+        ("XPath click", lambda d: safe_click(d, *button_with_text(text), description=description)),
+        ("JavaScript", lambda d: _click_text_with_js(d, text)),
+    ])
+
+def _dismiss_rules_popup(driver, context):
+    return _click_button_with_js_fallback(driver, "dismiss rules popup", 'Continue', "Continue button on rules popup")
+
+def _choose_visitor_parking(driver, context):
+    return _click_button_with_js_fallback(driver, "choose visitor parking", 'Visitor Parking', "Visitor Parking button")
+
+def _fill_vehicle_form(driver, context):
+    registration = context['registration']
+    # Fill in the form using the correct IDs from the HTML
+    form_fields = [
+        ("vehicleApt", registration.unit_number, "Apartment Number field"),
+        ("vehicleResidentName", registration.resident_name, "Resident Name field"),
+        ("vehicleGuestName", registration.guest_name, "Guest Name field"),
+        ("vehicleGuestPhone", registration.guest_phone, "Guest Phone field"),
+        ("vehicleMake", registration.vehicle_make, "Make field"),
+        ("vehicleModel", registration.vehicle_model, "Model field"),
+        ("vehicleLicensePlate", registration.vehicle_plate, "License Plate field"),
+        ("vehicleLicensePlateConfirm", registration.vehicle_plate, "Confirm License Plate field"),
+    ]
+    return fill_form(driver, form_fields, description="vehicle form")
+
+def _click_submit_with_js(driver):
+    clicked = driver.execute_script("""
+        const button = document.getElementById('vehicleInformation');
+        if (!button) return false;
+        button.click();
+        return true;
+    """)
+    logger.info(f"Clicked Next button via JavaScript: {clicked}")
+    return bool(clicked)
+
+def _submit_vehicle_form(driver, context):
+    return run_strategies(driver, "submit vehicle form", [
+        ("id click", lambda d: safe_click(d, By.ID, "vehicleInformation", description="Next button to submit form")),
+        ("JavaScript", _click_submit_with_js),
+    ])
+
+def _check_confirmation(driver, context):
+    # Answer every question about the confirmation page from one copy of it
+    snapshot = take_snapshot(driver)
+    approved = registration_approved(snapshot)
+    context['confirmation_code'] = extract_confirmation_code(snapshot)
+    logger.info(f"Approved: {approved}, confirmation code: {context['confirmation_code']}")
+
+    if approved:
+        logger.info("Registration successful!")
+        return True
+    logger.error("Couldn't confirm registration success")
+    return False
+
+# Once the rules popup is up the site has accepted the selection, so only a
+# failure of this step sends the run back to the property search
+CACHED_PROPERTY_CHECK_STEPS = ("select cached property",)
+
+def build_registration_steps(cached_property=False):
+    """Return the ordered list of steps that make up a registration. With
+    `cached_property`, the property search is skipped and the id in
+    context['property_id'] is selected directly."""
+    load_selenium()
+    if cached_property:
+        # Steps 2-4 collapse into one once the property id is known
+        find_property = [
+            Step("select cached property", _select_cached_property,
+                 ready=in_page(selector="#propertyName")),
+        ]
+    else:
+        find_property = [
+            # Step 2: Enter property name
+            Step("enter property name", _enter_property_name,
+                 ready=in_page(selector="#propertyName")),
+            # Step 3: Click Next button
+            Step("confirm property", _confirm_property,
+                 ready=in_page(selector="#confirmProperty", enabled=True)),
+            # Step 4: Select the property once the property list has loaded
+            Step("select property", _select_property,
+                 ready=in_page_any(
+                     in_page(selector=".select-property", visible=False),
+                     in_page(text='Select'),
+                 )),
+        ]
+    return [
+        # Step 1: Navigate directly to the registration page
+        Step("open register page", _open_register_page),
+        *find_property,
         # Step 5: Handle the rules popup - wait for it and click Continue
-        time.sleep(2)  # Give popup time to appear
-        
-        popup_continue_clicked = safe_click(
-            driver, By.XPATH, "//button[contains(text(), 'Continue')]", 
-            description="Continue button on rules popup"
-        )
-        if not popup_continue_clicked:
-            # Try alternative approach with JavaScript
-            try:
-                driver.execute_script("""
-                    const buttons = document.querySelectorAll('button');
-                    for (const button of buttons) {
-                        if (button.textContent.includes('Continue')) {
-                            button.click();
-                            return true;
-                        }
-                    }
-                    return false;
-                """)
-                logger.info("Attempted to click Continue button via JavaScript")
-            except Exception as e:
-                logger.error(f"Failed to click Continue button with JavaScript: {str(e)}")
-                return False
-        
+        Step("dismiss rules popup", _dismiss_rules_popup,
+             ready=in_page(text='Continue')),
         # Step 6: Click on Visitor Parking
-        time.sleep(2)  # Give page time to load
-        
-        visitor_parking_clicked = safe_click(
-            driver, By.XPATH, "//button[contains(text(), 'Visitor Parking')]", 
-            description="Visitor Parking button"
-        )
-        if not visitor_parking_clicked:
-            # Try alternative approach with JavaScript
-            try:
-                driver.execute_script("""
-                    const buttons = document.querySelectorAll('button');
-                    for (const button of buttons) {
-                        if (button.textContent.includes('Visitor Parking')) {
-                            button.click();
-                            return true;
-                        }
-                    }
-                    return false;
-                """)
-                logger.info("Attempted to click Visitor Parking button via JavaScript")
-            except Exception as e:
-                logger.error(f"Failed to click Visitor Parking button with JavaScript: {str(e)}")
-                return False
-        
-        # Step 7: Fill out the registration form
-        time.sleep(2)  # Give form time to load
-        
-        # Fill in the form using the correct IDs from the HTML
-        
-        # Apartment Number
-        apt_filled = safe_send_keys(
-            driver, By.ID, "vehicleApt", 
-            UNIT_NUMBER, description="Apartment Number field"
-        )
-        if not apt_filled:
-            return False
-        
-        # Resident Name
-        resident_filled = safe_send_keys(
-            driver, By.ID, "vehicleResidentName", 
-            RESIDENT_NAME, description="Resident Name field"
-        )
-        if not resident_filled:
-            return False
-        
-        # Guest Name
-        guest_filled = safe_send_keys(
-            driver, By.ID, "vehicleGuestName", 
-            GUEST_NAME, description="Guest Name field"
-        )
-        if not guest_filled:
-            return False
-        
-        # Guest Phone
-        phone_filled = safe_send_keys(
-            driver, By.ID, "vehicleGuestPhone", 
-            GUEST_PHONE, description="Guest Phone field"
-        )
-        if not phone_filled:
-            return False
-        
-        # Make
-        make_filled = safe_send_keys(
-            driver, By.ID, "vehicleMake", 
-            VEHICLE_MAKE, description="Make field"
-        )
-        if not make_filled:
-            return False
-        
-        # Model
-        model_filled = safe_send_keys(
-            driver, By.ID, "vehicleModel", 
-            VEHICLE_MODEL, description="Model field"
-        )
-        if not model_filled:
-            return False
-        
-        # License Plate
-        plate_filled = safe_send_keys(
-            driver, By.ID, "vehicleLicensePlate", 
-            VEHICLE_PLATE, description="License Plate field"
-        )
-        if not plate_filled:
-            return False
-        
-        # Confirm License Plate
-        confirm_plate_filled = safe_send_keys(
-            driver, By.ID, "vehicleLicensePlateConfirm", 
-            VEHICLE_PLATE, description="Confirm License Plate field"
-        )
-        if not confirm_plate_filled:
-            return False
-        
+        Step("choose visitor parking", _choose_visitor_parking,
+             ready=in_page(text='Visitor Parking')),
+        # Step 7: Fill out the registration form once it has settled
+        Step("fill vehicle form", _fill_vehicle_form,
+             ready=in_page(selector="#vehicleApt", settle_ms=300)),
         # Step 8: Click Next to submit the form
-        submit_clicked = safe_click(
-            driver, By.ID, "vehicleInformation", 
-            description="Next button to submit form"
-        )
-        if not submit_clicked:
-            # Try JavaScript approach
-            try:
-                driver.execute_script("document.getElementById('vehicleInformation').click();")
-                logger.info("Clicked Next button via JavaScript")
-            except Exception as e:
-                logger.error(f"Failed to click Next button with JavaScript: {str(e)}")
-                return False
-        
-        # Step 9: Wait for confirmation page to load
-        logger.info("Waiting for confirmation page to load...")
-        time.sleep(8)  # Increased wait time for confirmation page
-        
-        # Check for confirmation message elements
-        approved_msg = check_element_exists(
-            driver, By.XPATH, "//h2[contains(text(), 'Approved')]",
-            description="Approved message"
-        )
-        
-        circle_success = check_element_exists(
-            driver, By.CLASS_NAME, "circle-success",
-            description="Success circle"
-        )
-        
-        # Extract confirmation code if available
+        Step("submit vehicle form", _submit_vehicle_form,
+             ready=in_page(selector="#vehicleInformation", enabled=True)),
+        # Step 9: Wait for the confirmation page and check the result
+        Step("check confirmation", _check_confirmation,
+             ready=in_page_any(
+                 in_page(selector="h2", text='Approved', visible=False),
+                 in_page(selector=".circle-success", visible=False),
+             ),
+             timeout=30),
+    ]
+
+# ---------------------------------------------------------------------------
+# Email confirmation step actions
+# ---------------------------------------------------------------------------
+
+def _click_email_button(driver, context):
+    try:
+        email_button = driver.find_element(By.ID, "email-confirmation")
+
+        # Check if it's now enabled
+        if email_button.get_attribute("disabled") is None:
+            logger.info("Email button is enabled, clicking it")
+            email_button.click()
+            logger.info("Clicked email confirmation button")
+        else:
+            logger.warning("Email button still disabled, trying JavaScript bypass")
+            record_fallback("email button: JavaScript bypass")
+            driver.execute_script("""
+                document.getElementById('email-confirmation').removeAttribute('disabled');
+                document.getElementById('email-confirmation').click();
+            """)
+            logger.info("Used JavaScript to enable and click email button")
+        return True
+    except Exception as e:
+        logger.warning(f"Could not interact with email button normally: {e}")
+        # Try alternative approach using JavaScript
+        record_fallback("email button: JavaScript")
         try:
-            confirmation_code_element = driver.find_element(By.XPATH, "//h3[contains(text(), '')]")
-            confirmation_code = confirmation_code_element.text.strip()
-            logger.info(f"Registration successful! Confirmation code: {confirmation_code}")
-        except Exception:
-            # Try another approach
-            try:
-                confirmation_element = driver.find_element(By.XPATH, "//*[contains(text(), 'Confirmation Code')]")
-                logger.info("Found confirmation code reference")
-                confirmation_code = "Found but couldn't extract"
-            except Exception:
-                logger.info("Couldn't find confirmation code")
-                confirmation_code = None
-        
-        if approved_msg or circle_success:
-            logger.info("Registration successful!")
-            
-            # Handle email confirmation if requested
-            if NOTIFICATION_EMAIL:
-                # Debug: log page source to understand what we're looking at
-                if debug_mode:
-                    logger.info("Current page source before email button interaction:")
-                    logger.info("=== PAGE SOURCE START ===")
-                    logger.info(driver.page_source[:500] + "...")  # Just the start
-                    logger.info("=== PAGE SOURCE END ===")
-                
-                # Wait longer for the button to be enabled
-                logger.info("Waiting for email button to be enabled...")
-                time.sleep(5)  # Give extra time for any page scripts to run
-                
-                # First check if the email button is disabled
-                try:
-                    email_button = driver.find_element(By.ID, "email-confirmation")
-                    
-                    # Get button text and disabled state
-                    button_text = email_button.text
-                    is_disabled = email_button.get_attribute("disabled") is not None
-                    
-                    logger.info(f"Email button found: Text='{button_text}', Disabled={is_disabled}")
-                    
-                    if is_disabled:
-                        logger.info("Button is disabled, waiting for it to become enabled...")
-                        # Wait for the button to become enabled (up to 15 seconds)
-                        wait_time = 15
-                        for i in range(wait_time):
-                            is_still_disabled = email_button.get_attribute("disabled") is not None
-                            if not is_still_disabled:
-                                logger.info(f"Button became enabled after {i+1} seconds")
-                                break
-                            logger.info(f"Still disabled, waiting... ({i+1}/{wait_time})")
-                            time.sleep(1)
-                        
-                        # Refresh the element reference
-                        email_button = driver.find_element(By.ID, "email-confirmation")
-                    
-                    # Check if it's now enabled
-                    if email_button.get_attribute("disabled") is None:
-                        logger.info("Email button is now enabled, clicking it")
-                        email_button.click()
-                        logger.info("Clicked email confirmation button")
-                    else:
-                        logger.warning("Email button still disabled, trying JavaScript bypass")
-                        driver.execute_script("""
-                            document.getElementById('email-confirmation').removeAttribute('disabled');
-                            document.getElementById('email-confirmation').click();
-                        """)
-                        logger.info("Used JavaScript to enable and click email button")
-                except Exception as e:
-                    logger.warning(f"Could not interact with email button normally: {e}")
-                    # Try alternative approach using JavaScript
-                    try:
-                        driver.execute_script("""
-                            var emailBtn = document.getElementById('email-confirmation');
-                            if(emailBtn) {
-                                emailBtn.disabled = false;
-                                emailBtn.click();
-                                console.log('Email button clicked via JavaScript');
-                            } else {
-                                console.log('Email button not found');
-                            }
-                        """)
-                        logger.info("Used JavaScript to find and click email button")
-                    except Exception as e2:
-                        logger.error(f"JavaScript approach also failed: {e2}")
-                
-                # Wait for modal to appear
-                logger.info("Waiting for email modal to appear...")
-                time.sleep(4)
-                
-                # Debug - log what modals might be present
-                if debug_mode:
-                    modals = driver.find_elements(By.CLASS_NAME, "modal")
-                    logger.info(f"Found {len(modals)} modal elements")
-                    for i, modal in enumerate(modals):
-                        try:
-                            modal_id = modal.get_attribute("id")
-                            is_visible = modal.is_displayed()
-                            modal_class = modal.get_attribute("class")
-                            logger.info(f"Modal {i+1}: ID={modal_id}, Visible={is_visible}, Class={modal_class}")
-                        except:
-                            logger.info(f"Modal {i+1}: [Error getting attributes]")
-                
-                # Look for the email input field in the modal
-                email_field_found = check_element_exists(
-                    driver, By.ID, "emailConfirmationEmailView", 
-                    timeout=5, description="Email field in popup"
-                )
-                
-                if email_field_found:
-                    # Enter email address
-                    email_entered = safe_send_keys(
-                        driver, By.ID, "emailConfirmationEmailView", 
-                        NOTIFICATION_EMAIL, description="Email field"
-                    )
-                    
-                    if email_entered:
-                        logger.info(f"Email entered: {NOTIFICATION_EMAIL}")
-                        
-                        # Click Send button
-                        logger.info("Attempting to click Send button")
-                        send_clicked = safe_click(
-                            driver, By.ID, "email-confirmation-send-view", 
-                            timeout=5, description="Send email button"
-                        )
-                        
-                        if send_clicked:
-                            logger.info(f"Confirmation email send button clicked")
-                            # Wait for confirmation alert
-                            time.sleep(2)
-                            
-                            # Check for confirmation alert
-                            try:
-                                alert = driver.switch_to.alert
-                                alert_text = alert.text
-                                logger.info(f"Alert found: {alert_text}")
-                                alert.accept()
-                                logger.info("Alert accepted")
-                            except:
-                                logger.info("No JavaScript alert found - this is normal if confirmation was shown in page")
-                                
-                            logger.info("Email confirmation process completed")
-                        else:
-                            logger.warning("Failed to click send button")
-                            # Try with JavaScript
-                            try:
-                                driver.execute_script("""
-                                    document.getElementById('email-confirmation-send-view').click();
-                                """)
-                                logger.info("Clicked send button via JavaScript")
-                                time.sleep(2)  # Wait for the operation to complete
-                                logger.info("Email confirmation process completed via JavaScript")
-                            except Exception as e:
-                                logger.error(f"JavaScript click for send button failed: {e}")
-                    else:
-                        logger.warning("Failed to enter email address")
-                else:
-                    logger.warning("Email popup did not appear or couldn't find the email field")
-                    
-                    # Try to get all input fields as a diagnostic
-                    try:
-                        inputs = driver.find_elements(By.TAG_NAME, "input")
-                        logger.info(f"Found {len(inputs)} input elements on page")
-                        for i, input_el in enumerate(inputs[:5]):  # Show just first 5 to avoid log spam
-                            input_id = input_el.get_attribute("id")
-                            input_type = input_el.get_attribute("type")
-                            logger.info(f"Input {i+1}: ID={input_id}, Type={input_type}")
-                    except:
-                        logger.info("Could not enumerate input fields")
-            
-            # Pause at the end if in debug mode
-            if debug_mode:
-                logger.info("DEBUG MODE: Pausing for 10 seconds at end for manual inspection")
-                time.sleep(10)
-            
+            driver.execute_script("""
+                var emailBtn = document.getElementById('email-confirmation');
+                if(emailBtn) {
+                    emailBtn.disabled = false;
+                    emailBtn.click();
+                    console.log('Email button clicked via JavaScript');
+                } else {
+                    console.log('Email button not found');
+                }
+            """)
+            logger.info("Used JavaScript to find and click email button")
             return True
-        else:
-            logger.error("Couldn't confirm registration success")
-            
-            # In debug mode, pause to inspect
-            if debug_mode:
-                logger.info("DEBUG MODE: Registration could not be confirmed. Pausing for manual inspection.")
-                time.sleep(20)  # Longer pause for error inspection
-                
+        except Exception as e2:
+            logger.error(f"JavaScript approach also failed: {e2}")
             return False
-            
+
+def _enter_notification_email(driver, context):
+    email = context['registration'].notification_email
+    # Look for the email input field in the modal
+    if not check_element_exists(
+        driver, By.ID, "emailConfirmationEmailView",
+        timeout=0, description="Email field in popup"
+    ):
+        logger.warning("Email popup did not appear or couldn't find the email field")
+        log_page_diagnostics(driver)
+        return False
+
+    # Enter email address
+    if not safe_send_keys(
+        driver, By.ID, "emailConfirmationEmailView",
+        email, description="Email field"
+    ):
+        logger.warning("Failed to enter email address")
+        return False
+    logger.info(f"Email entered: {email}")
+    return True
+
+def _send_notification_email(driver, context):
+    # Click Send button
+    logger.info("Attempting to click Send button")
+    if safe_click(
+        driver, By.ID, "email-confirmation-send-view",
+        timeout=5, description="Send email button"
+    ):
+        logger.info(f"Confirmation email send button clicked")
+        return True
+
+    logger.warning("Failed to click send button")
+    # Try with JavaScript
+    record_fallback("send email button: JavaScript")
+    try:
+        driver.execute_script("""
+            document.getElementById('email-confirmation-send-view').click();
+        """)
+        logger.info("Clicked send button via JavaScript")
+        return True
     except Exception as e:
-        logger.error(f"Error during registration process: {str(e)}")
-        
-        # In debug mode, pause to inspect
-        if debug_mode and driver:
-            logger.info("DEBUG MODE: Error occurred. Pausing for manual inspection.")
-            time.sleep(20)  # Longer pause for error inspection
-            
+        logger.error(f"JavaScript click for send button failed: {e}")
+        return False
+
+def _accept_confirmation_alert(driver, context):
+    alert = driver.switch_to.alert
+    alert_text = alert.text
+    logger.info(f"Alert found: {alert_text}")
+    alert.accept()
+    logger.info("Alert accepted")
+    return True
+
+def build_email_steps():
+    """Return the steps that send the confirmation email to the
+    registration's notification address."""
+    load_selenium()
+    return [
+        # Wait for the email button to be enabled by the page's scripts
+        Step("click email button", _click_email_button,
+             ready=in_page(selector="#email-confirmation", enabled=True),
+             timeout=20),
+        # Wait for the email modal to appear
+        Step("enter notification email", _enter_notification_email,
+             ready=in_page(selector="#emailConfirmationEmailView")),
+        Step("send notification email", _send_notification_email,
+             ready=in_page(selector="#email-confirmation-send-view", enabled=True)),
+        # Not every send shows an alert; a confirmation shown in page is normal too
+        Step("accept confirmation alert", _accept_confirmation_alert,
+             ready=EC.alert_is_present(), timeout=3, optional=True),
+    ]
+
+# ---------------------------------------------------------------------------
+# Registration ledger
+# ---------------------------------------------------------------------------
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+def get_ledger():
+    """Return the process-wide Ledger, opening it on first use, or None when
+    LEDGER_PATH is empty."""
+    global _ledger
+    if not LEDGER_PATH:
+        return None
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = Ledger(LEDGER_PATH)
+        return _ledger
+
+_next_ledger_prune = 0
+
+def _prune_ledger(ledger):
+    """Delete entries that expired over LEDGER_RETENTION_DAYS ago, at most
+    once a day."""
+    global _next_ledger_prune
+    with _ledger_lock:
+        if not LEDGER_RETENTION_DAYS or time.time() < _next_ledger_prune:
+            return
+        _next_ledger_prune = time.time() + 24 * 3600
+    pruned = ledger.prune(timedelta(days=LEDGER_RETENTION_DAYS))
+    if pruned:
+        logger.info(f"Pruned {pruned} ledger entries that expired over {LEDGER_RETENTION_DAYS:g} days ago")
+
+def _record_in_ledger(registration, result, engine):
+    # The registration went through either way, so a ledger problem is only logged
+    try:
+        ledger = get_ledger()
+        if ledger is not None:
+            ledger.record(registration, result, timedelta(hours=REGISTRATION_VALIDITY_HOURS), engine=engine)
+            _prune_ledger(ledger)
+    except Exception as e:
+        logger.warning(f"Could not record registration in the ledger: {e}")
+
+def skip_active(registrations):
+    """Split `registrations` into those that still need registering and
+    results for those the ledger shows are active for at least another
+    LEDGER_RENEW_MARGIN_MINUTES. Returns (pending, skipped_results)."""
+    ledger = get_ledger()
+    if ledger is None:
+        return list(registrations), []
+    margin = timedelta(minutes=LEDGER_RENEW_MARGIN_MINUTES)
+    pending, skipped = [], []
+    for registration in registrations:
+        entry = ledger.active(registration.vehicle_plate, registration.property_name, margin=margin) \
+            if registration.vehicle_plate else None
+        if entry is None:
+            pending.append(registration)
+            continue
+        logger.info(f"{registration.vehicle_plate} is already registered until {entry['expires_at']} "
+                    f"(confirmation code {entry['confirmation_code']}), skipping")
+        skipped.append(RegistrationResult(
+            vehicle_plate=registration.vehicle_plate, success=True,
+            confirmation_code=entry['confirmation_code'], skipped=True,
+        ))
+    return pending, skipped
+
+# ---------------------------------------------------------------------------
+# Email confirmation stage
+#
+# Sending the confirmation email waits on the site (the email button is only
+# enabled a while after the confirmation page appears, then a modal, then an
+# alert), none of which affects whether the vehicle is registered. So a
+# registration returns as soon as it is confirmed and hands the send, with
+# the browser or HTTP session it needs, to background workers that report
+# each outcome as an EmailResult.
+# ---------------------------------------------------------------------------
+
+@dataclass
+class EmailResult:
+    """The outcome of sending one confirmation email. Truthy when sent."""
+    vehicle_plate: Optional[str]
+    email: str
+    confirmation_code: Optional[str]
+    success: bool = False
+    duration: float = 0.0
+    error: Optional[str] = None
+    metrics: Optional[dict] = None
+
+    def __bool__(self):
+        return self.success
+
+    def to_dict(self):
+        return asdict(self)
+
+class EmailStage:
+    """Background workers that send confirmation emails after the
+    registration has returned. `on_result` is called with each EmailResult;
+    without one, results are kept until join() collects them."""
+
+    def __init__(self, workers=EMAIL_WORKERS, on_result=None):
+        self.on_result = on_result
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='email')
+        self._lock = threading.Lock()
+        self._pending = []
+        self._results = []
+
+    def submit(self, result, email, engine, send, cleanup=None, holds_browser=False):
+        """Queue `send()`, which raises if the email couldn't be sent, for the
+        registration `result`. `cleanup()` runs afterwards either way, e.g. to
+        hand the browser back.
+
+        A send that `holds_browser` starts at once on its own thread instead
+        of queueing: its browser's pool slot is taken until it finishes, so
+        waiting for a worker would only hold up the next registration. The
+        pools bound how many of these run at once."""
+        email_result = EmailResult(vehicle_plate=result.vehicle_plate, email=email,
+                                   confirmation_code=result.confirmation_code)
+        if holds_browser:
+            future = Future()
+            def _run():
+                try:
+                    future.set_result(self._send(email_result, engine, send, cleanup))
+                except BaseException as e:
+                    future.set_exception(e)
+            threading.Thread(target=_run, name=f"email-{result.vehicle_plate}").start()
+        else:
+            future = self._executor.submit(self._send, email_result, engine, send, cleanup)
+        with self._lock:
+            self._pending = [pending for pending in self._pending if not pending.done()]
+            self._pending.append(future)
+        result.email_queued = True
+        return future
+
+    def _send(self, email_result, engine, send, cleanup):
+        started = time.monotonic()
+        run = RunMetrics(f"{engine} email", email_result.vehicle_plate)
+        with run.activate():
+            try:
+                send()
+                email_result.success = True
+                logger.info(f"Confirmation email for {email_result.vehicle_plate} sent to {email_result.email}")
+            except Exception as e:
+                email_result.error = str(e)
+                logger.warning(f"Confirmation email for {email_result.vehicle_plate} could not be sent: {e}")
+            finally:
+                if cleanup is not None:
+                    cleanup()
+                email_result.duration = round(time.monotonic() - started, 3)
+                email_result.metrics = run.to_dict()
+        if self.on_result is not None:
+            self.on_result(email_result)
+        else:
+            with self._lock:
+                self._results.append(email_result)
+        return email_result
+
+    def join(self):
+        """Wait for every queued send and return the EmailResults collected
+        since the last join()."""
+        while True:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                break
+            for future in pending:
+                future.exception()
+        with self._lock:
+            results, self._results = self._results, []
+        return results
+
+    def close(self):
+        """Wait for every queued send and stop the workers."""
+        self._executor.shutdown(wait=True)
+
+_email_stage = None
+_email_stage_lock = threading.Lock()
+
+def get_email_stage():
+    """Return the process-wide EmailStage, starting it on first use."""
+    global _email_stage
+    with _email_stage_lock:
+        if _email_stage is None:
+            _email_stage = EmailStage()
+        return _email_stage
+
+def wait_for_emails():
+    """Wait for any confirmation emails still being sent, stop the email
+    stage and return their EmailResults (none if no email was queued). An
+    email queued later starts a new stage."""
+    global _email_stage
+    with _email_stage_lock:
+        email_stage, _email_stage = _email_stage, None
+    if email_stage is None:
+        return []
+    results = email_stage.join()
+    email_stage.close()
+    return results
+
+def _queue_browser_email(driver, pool, registration, result, context):
+    """Hand the browser, still on the confirmation page, to the email stage,
+    which releases it once the email has been sent."""
+    def send():
+        if not run_steps(driver, build_email_steps(), context, budget=EMAIL_BUDGET):
+            raise RuntimeError(f"step '{context.get('failed_step')}' failed")
+
+    def cleanup():
+        _release_driver(driver, pool)
+
+    get_email_stage().submit(result, registration.notification_email, 'selenium', send, cleanup,
+                             holds_browser=True)
+
+def _release_driver(driver, pool, broken=False):
+    if pool:
+        pool.release(driver, discard=broken)
+    else:
+        # Close the browser
+        quit_driver(driver)
+        logger.info("Browser closed")
+
+# ---------------------------------------------------------------------------
+# Failure artifacts
+# ---------------------------------------------------------------------------
+
+def new_artifact_recorder():
+    """Return an ArtifactRecorder for one run, or None when ARTIFACT_DIR is
+    empty."""
+    if not ARTIFACT_DIR:
+        return None
+    return ArtifactRecorder(
+        ARTIFACT_DIR, max_snapshots=ARTIFACT_SNAPSHOTS, max_dom_chars=ARTIFACT_DOM_CHARS,
+        max_bytes=ARTIFACT_MAX_BYTES, screenshot=ARTIFACT_SCREENSHOT, keep=ARTIFACT_KEEP,
+        step_snapshots=ARTIFACT_STEP_SNAPSHOTS,
+    )
+
+def _write_artifacts(recorder, result, run, context=None, driver=None):
+    if recorder is None:
+        return
+    summary = {
+        'vehicle_plate': result.vehicle_plate,
+        'engine': run.engine,
+        'success': result.success,
+        'error': result.error,
+        'failed_step': (context or {}).get('failed_step'),
+        'metrics': run.to_dict(),
+    }
+    try:
+        with span("write artifacts"):
+            result.artifacts = recorder.write(summary, driver=driver)
+        logger.info(f"Wrote run artifacts to {result.artifacts}")
+    except Exception as e:
+        logger.warning(f"Could not write run artifacts: {e}")
+
+def _write_trace(result, context):
+    """Write the run's network trace, if it is being traced, and stop tracing it."""
+    trace = context.pop('trace', None)
+    if trace is None:
+        return
+    summary = {
+        'vehicle_plate': result.vehicle_plate,
+        'success': result.success,
+        'error': result.error,
+        'failed_step': context.get('failed_step'),
+    }
+    try:
+        with span("write trace"):
+            result.trace, context['trace_summary'] = trace.finish(TRACE_DIR, summary, keep=TRACE_KEEP)
+        logger.info(f"Wrote network trace to {result.trace}: {context['trace_summary']['requests']} requests, "
+                    f"{len(context['trace_summary']['blocked'])} blocked")
+    except Exception as e:
+        logger.warning(f"Could not write network trace: {e}")
+
+def _check_required_fields(registration, result):
+    missing_vars = registration.missing_fields()
+    if missing_vars:
+        result.error = f"Missing required registration fields: {', '.join(missing_vars)}"
+        logger.error(result.error)
+        return False
+    return True
+
+def _run_registration_steps(driver, registration, context, started):
+    """Run the registration steps, selecting the property directly when its
+    id is cached. If the site doesn't respond to that selection, the full
+    flow runs instead; when the search then finds the same id, the shortcut
+    is recorded as not working here and browser runs stop trying it."""
+    property_cache = get_property_cache()
+    context['property_id'] = property_cache.lookup(registration.property_name, browser=True)
+    shortcut_failed = None
+    if context['property_id'] is not None:
+        if run_steps(driver, build_registration_steps(cached_property=True), context):
+            return True
+        if context.get('failed_step') not in CACHED_PROPERTY_CHECK_STEPS:
+            return False
+        logger.warning("Site didn't respond to the cached property selection, searching for the property again")
+        shortcut_failed = context['property_id']
+        property_cache.invalidate(registration.property_name)
+        record_fallback("property cache: stale")
+        # Reload so the search starts from a fresh page, and don't let the
+        # shortcut's failure be reported if the search succeeds
+        driver.get(REGISTER_URL)
+        context.pop('failed_step', None)
+
+    remaining = RUN_BUDGET - (time.monotonic() - started)
+    if not run_steps(driver, build_registration_steps(), context, budget=remaining):
         return False
+    if context.get('resolved_property_id'):
+        # The same id again means the id was fine and the shortcut is what failed
+        property_cache.record(registration.property_name, context['resolved_property_id'],
+                              browser_shortcut=context['resolved_property_id'] != shortcut_failed)
+    return True
+
+def register_parking(headless=True, debug_mode=False, registration=None, pool=None):
+    """Main function to handle the parking registration process.
+
+    Registers `registration`, or the vehicle described by the environment
+    variables if none is given, and returns a RegistrationResult. When a
+    DriverPool is passed the browser is borrowed from it instead of being
+    started and quit for this one registration.
+    """
+    load_selenium()
+    if registration is None:
+        registration = Registration.from_env()
+    logger.info(f"Starting parking registration process for {registration.vehicle_plate}")
+
+    started = time.monotonic()
+    result = RegistrationResult(vehicle_plate=registration.vehicle_plate, success=False)
+
+    # Check if required fields are set
+    if not _check_required_fields(registration, result):
+        return result
+
+    run = RunMetrics('selenium', registration.vehicle_plate)
+    recorder = new_artifact_recorder()
+    with run.activate(), (recorder.activate() if recorder else nullcontext()):
+        driver = None
+        broken = False
+        context = {'debug_mode': debug_mode, 'registration': registration}
+        try:
+            with span("start browser"):
+                driver = pool.acquire() if pool else setup_driver(headless=headless)
+            if TRACE_DIR:
+                context['trace'] = NetworkTrace(driver, label=registration.vehicle_plate)
+
+            if not _run_registration_steps(driver, registration, context, started):
+                result.error = "Couldn't confirm registration success"
+                log_page_diagnostics(driver)
+                _write_artifacts(recorder, result, run, context, driver)
+                return result
+
+            result.success = True
+            result.confirmation_code = context.get('confirmation_code')
+            _record_in_ledger(registration, result, 'selenium')
+
+            # In debug mode keep a record of successful runs too
+            if debug_mode:
+                _write_artifacts(recorder, result, run, context, driver)
+
+            # Send the confirmation email in the background; the browser goes with it
+            if registration.notification_email:
+                _write_trace(result, context)
+                _queue_browser_email(driver, pool, registration, result, context)
+                driver = None
+
+            return result
+
+        except Exception as e:
+            broken = True
+            result.error = str(e)
+            logger.error(f"Error during registration process: {str(e)}")
+            _write_artifacts(recorder, result, run, context, driver)
+            return result
+        finally:
+            _write_trace(result, context)
+            result.duration = round(time.monotonic() - started, 3)
+            result.metrics = run.to_dict()
+            if 'trace_summary' in context:
+                result.metrics['trace'] = context['trace_summary']
+            if driver:
+                _release_driver(driver, pool, broken)
+
+# ---------------------------------------------------------------------------
+# HTTP engine
+#
+# The pages the Selenium steps drive are a short series of form posts. This
+# engine makes the same posts with a plain HTTP session and reads what it
+# needs (property id, CSRF token, hidden form state, confirmation code) out
+# of the responses.
+# ---------------------------------------------------------------------------
+
+# Form targets of each stage, relative to REGISTER2PARK_URL
+HTTP_ENDPOINTS = {
+    'property_search': '/register/property-search',
+    'select_property': '/register/select-property',
+    'parking_type': '/register/parking-type',
+    'vehicle_information': '/register/vehicle-information',
+    'email_confirmation': '/register/email-confirmation',
+}
+HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', '15'))
+# Maximum number of kept-alive connections shared by all HTTP registrations
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '10'))
+
+class HttpEngineError(Exception):
+    """Raised when a response does not look like the page the flow expects."""
+
+_http_adapter = None
+_http_adapter_lock = threading.Lock()
+
+def new_http_session():
+    """Return a requests session with its own cookies but a connection pool
+    shared with every other HTTP registration."""
+    global _http_adapter
+    load_requests()
+    with _http_adapter_lock:
+        if _http_adapter is None:
+            _http_adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session = requests.Session()
+    session.mount('http://', _http_adapter)
+    session.mount('https://', _http_adapter)
+    session.headers['User-Agent'] = 'Mozilla/5.0 (register2park automation)'
+    return session
+
+def _http_request(session, method, url, data=None, name=None):
+    with span(f"http {name or method.lower()}"):
+        response = session.request(method, url, data=data, timeout=HTTP_TIMEOUT)
+    capture_page(f"http {name or method.lower()}", response.url, response.text)
+    if response.status_code >= 400:
+        raise HttpEngineError(f"{method} {url} returned HTTP {response.status_code}")
+    return PageSnapshot(response.text, url=response.url)
+
+def _http_post(session, endpoint, token, data):
+    data = dict(data)
+    if token:
+        data['_token'] = token
+    return _http_request(session, 'POST', REGISTER2PARK_URL + HTTP_ENDPOINTS[endpoint], data, name=endpoint)
+
+def _http_select_property(session, token, property_id):
+    """Select `property_id`; return the resulting page, or None if it isn't
+    the page offering Visitor Parking."""
+    try:
+        page = _http_post(session, 'select_property', token, {'propertyId': property_id})
+    except HttpEngineError as e:
+        logger.info(f"Selecting property {property_id} failed: {e}")
+        return None
+    return page if page.exists('button', text='Visitor Parking') else None
+
+def register_parking_http(registration=None, session=None):
+    """Register a vehicle without a browser, posting each form directly.
+    Returns a RegistrationResult like register_parking()."""
+    if registration is None:
+        registration = Registration.from_env()
+    logger.info(f"Starting HTTP parking registration for {registration.vehicle_plate}")
+
+    started = time.monotonic()
+    result = RegistrationResult(vehicle_plate=registration.vehicle_plate, success=False)
+    if not _check_required_fields(registration, result):
+        return result
+    if not load_requests():
+        result.error = "requests is not installed, the HTTP engine is unavailable"
+        logger.error(result.error)
+        return result
+
+    run = RunMetrics('http', registration.vehicle_plate)
+    recorder = new_artifact_recorder()
+    with run.activate(), (recorder.activate() if recorder else nullcontext()):
+        session = session or new_http_session()
+        try:
+            # Load the registration page for the session cookie and CSRF token
+            page = _http_request(session, 'GET', REGISTER_URL, name='register_page')
+            token = page.csrf_token()
+
+            # Select the property (the rules popup is client-side only), using
+            # the cached id when there is one and searching for it otherwise
+            property_cache = get_property_cache()
+            property_id = property_cache.lookup(registration.property_name)
+            page = None
+            if property_id is not None:
+                page = _http_select_property(session, token, property_id)
+                if page is None:
+                    logger.warning("Cached property id was not accepted, searching for the property again")
+                    property_cache.invalidate(registration.property_name)
+                    record_fallback("property cache: stale")
+            if page is None:
+                page = _http_post(session, 'property_search', token, {'propertyName': registration.property_name})
+                select_button = page.find(class_name='select-property')
+                if select_button is None:
+                    raise HttpEngineError(f"No property found for '{registration.property_name}'")
+                property_id = select_button.get('data-property-id') or select_button.get('value')
+                logger.info(f"Found property id {property_id}")
+                page = _http_select_property(session, token, property_id)
+                if page is None:
+                    raise HttpEngineError(f"Selecting property {property_id} did not offer Visitor Parking")
+                property_cache.record(registration.property_name, property_id)
+            token = page.csrf_token() or token
+
+            # Choose Visitor Parking
+            page = _http_post(session, 'parking_type', token, {'propertyId': property_id, 'parkingType': 'visitor'})
+            token = page.csrf_token() or token
+            if not page.exists('input', id='vehicleApt'):
+                raise HttpEngineError("Vehicle information form not found")
+
+            # Submit the vehicle form along with any state it carries in hidden fields
+            form = page.form_fields()
+            form.update({
+                'vehicleApt': registration.unit_number,
+                'vehicleResidentName': registration.resident_name,
+                'vehicleGuestName': registration.guest_name,
+                'vehicleGuestPhone': registration.guest_phone,
+                'vehicleMake': registration.vehicle_make,
+                'vehicleModel': registration.vehicle_model,
+                'vehicleLicensePlate': registration.vehicle_plate,
+                'vehicleLicensePlateConfirm': registration.vehicle_plate,
+            })
+            form.pop('_token', None)
+            page = _http_post(session, 'vehicle_information', token, form)
+            token = page.csrf_token() or token
+
+            if not registration_approved(page):
+                result.error = "Couldn't confirm registration success"
+                logger.error(result.error)
+                _write_artifacts(recorder, result, run)
+                return result
+            result.success = True
+            result.confirmation_code = extract_confirmation_code(page)
+            logger.info(f"Registration successful! Confirmation code: {result.confirmation_code}")
+            _record_in_ledger(registration, result, 'http')
+
+            # Send the confirmation email in the background on the same session
+            if registration.notification_email:
+                data = {'email': registration.notification_email, 'confirmationCode': result.confirmation_code or ''}
+                get_email_stage().submit(
+                    result, registration.notification_email, 'http',
+                    functools.partial(_http_post, session, 'email_confirmation', token, data),
+                )
+            return result
+
+        except Exception as e:
+            result.error = str(e)
+            logger.error(f"Error during HTTP registration process: {str(e)}")
+            _write_artifacts(recorder, result, run)
+            return result
+        finally:
+            result.duration = round(time.monotonic() - started, 3)
+            result.metrics = run.to_dict()
+
+def run_registration(registration=None, engine=REGISTRATION_ENGINE, headless=True, debug_mode=False, pool=None):
+    """Register with the chosen engine. With 'auto' the HTTP engine is tried
+    first and the Selenium engine is used if it fails."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}', expected one of {', '.join(ENGINES)}")
+    if engine in ('http', 'auto'):
+        result = register_parking_http(registration)
+        if result or engine == 'http':
+            return result
+        logger.warning(f"HTTP engine failed ({result.error}), falling back to Selenium")
+        result = register_parking(headless=headless, debug_mode=debug_mode, registration=registration, pool=pool)
+        if result.metrics is not None:
+            result.metrics['fallbacks'].insert(0, "engine: http -> selenium")
+        return result
+    return register_parking(headless=headless, debug_mode=debug_mode, registration=registration, pool=pool)
+
+# ---------------------------------------------------------------------------
+# Batch registration
+# ---------------------------------------------------------------------------
+
+# Default number of registrations (and so Chrome instances) run at once
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', min(4, os.cpu_count() or 1)))
+
+def load_manifest(path):
+    """Load registrations from a CSV (with a header row) or JSONL manifest."""
+    registrations = []
+    with open(path, newline='') as f:
+        if path.endswith('.jsonl') or path.endswith('.ndjson'):
+            for line in f:
+                line = line.strip()
+                if line:
+                    registrations.append(Registration.from_record(json.loads(line)))
+        else:
+            for row in csv.DictReader(f):
+                registrations.append(Registration.from_record(row))
+    logger.info(f"Loaded {len(registrations)} registrations from {path}")
+    return registrations
+
+def register_batch(registrations, concurrency=BATCH_CONCURRENCY, headless=True, debug_mode=False,
+                   engine=REGISTRATION_ENGINE, profile=BROWSER_PROFILE):
+    """Register many vehicles concurrently, running at most `concurrency`
+    browsers at a time. Browsers are kept warm in a DriverPool and reused
+    across registrations. Returns the results in manifest order."""
+    concurrency = max(1, concurrency)
+    results = [None] * len(registrations)
+    with DriverPool(size=concurrency, headless=headless, profile=profile) as pool, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='worker') as executor:
+        futures = {
+            executor.submit(run_registration, registration, engine, headless, debug_mode, pool): index
+            for index, registration in enumerate(registrations)
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            status = "succeeded" if result.success else f"failed: {result.error}"
+            logger.info(f"Registration for {result.vehicle_plate} {status} in {result.duration:.1f}s")
+    return results
+
+# ---------------------------------------------------------------------------
+# asyncio API
+# ---------------------------------------------------------------------------
+
+async def register_async(registration=None, engine=REGISTRATION_ENGINE, headless=True, pool=None, executor=None):
+    """Run one registration without blocking the event loop. The blocking
+    browser or HTTP work runs in `executor` (the loop's default if None)."""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(
+        run_registration, registration, engine=engine, headless=headless, pool=pool
+    ))
+
+async def register_many(registrations, concurrency=BATCH_CONCURRENCY, engine=REGISTRATION_ENGINE, headless=True,
+                        profile=BROWSER_PROFILE):
+    """Register many vehicles from an event loop, yielding each
+    RegistrationResult as soon as it finishes:
+
+        async for result in register_many(registrations, concurrency=4):
+            ...
+
+    At most `concurrency` registrations run at once, sharing a DriverPool of
+    that size. Registrations not yet started are cancelled if the caller
+    stops iterating early.
+    """
+    import asyncio
+    concurrency = max(1, concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    pool = DriverPool(size=concurrency, headless=headless, profile=profile)
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='async-worker')
+
+    async def _register(registration):
+        async with semaphore:
+            return await register_async(registration, engine=engine, headless=headless, pool=pool, executor=executor)
+
+    tasks = [asyncio.ensure_future(_register(registration)) for registration in registrations]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
     finally:
-        if driver:
-            # Close the browser
-            driver.quit()
-            logger.info("Browser closed")
+        for task in tasks:
+            task.cancel()
+        # Let registrations already running finish off the loop, then close the browsers
+        def _shutdown():
+            executor.shutdown(wait=True)
+            pool.close()
+        await asyncio.get_running_loop().run_in_executor(None, _shutdown)
+
+# ---------------------------------------------------------------------------
+# Scheduler daemon
+#
+# Instead of a cron job that cold-starts Python and Chrome for every run, the
+# daemon stays resident and re-registers each vehicle shortly before it
+# expires on warm browser/HTTP sessions (see scheduler.py).
+# ---------------------------------------------------------------------------
+
+# Renewals are brought forward by a random amount up to this, so vehicles
+# registered together don't all come due at the same moment again
+SCHEDULER_JITTER_MINUTES = float(os.environ.get('SCHEDULER_JITTER_MINUTES', '10'))
+# Backoff after a failed registration: doubles per attempt from the base, up to the cap
+RETRY_BASE_SECONDS = float(os.environ.get('RETRY_BASE_SECONDS', '30'))
+RETRY_MAX_SECONDS = float(os.environ.get('RETRY_MAX_SECONDS', '1800'))
+# How often the manifest is checked for changes
+MANIFEST_RELOAD_SECONDS = float(os.environ.get('MANIFEST_RELOAD_SECONDS', '30'))
+
+def registration_key(registration):
+    """Identify the vehicle a registration is for (plate and property)."""
+    return (normalize_plate(registration.vehicle_plate), registration.property_name)
+
+def retry_delay(attempt):
+    """Seconds to wait before retry number `attempt` (1-based), backing off
+    from RETRY_BASE_SECONDS up to RETRY_MAX_SECONDS."""
+    return backoff_delay(attempt, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS)
+
+def new_scheduler(load_registrations, pool, concurrency=BATCH_CONCURRENCY, engine=REGISTRATION_ENGINE,
+                  headless=True, manifest_path=None, on_result=None):
+    """Return a Scheduler (see scheduler.py) that registers with `engine`
+    on `pool`'s browsers, with the timings configured above."""
+    return Scheduler(
+        load_registrations, functools.partial(run_registration, engine=engine, headless=headless, pool=pool),
+        key=registration_key, concurrency=concurrency, ledger=get_ledger(),
+        validity=REGISTRATION_VALIDITY_HOURS * 3600, renew_margin=LEDGER_RENEW_MARGIN_MINUTES * 60,
+        jitter=SCHEDULER_JITTER_MINUTES * 60, retry_delay=retry_delay, reload_interval=MANIFEST_RELOAD_SECONDS,
+        manifest_path=manifest_path, on_result=on_result,
+    )
+
+# ---------------------------------------------------------------------------
+# Distributed workers
+#
+# Registrations can be spread over several processes or machines: producers
+# enqueue them in a shared WorkQueue (see work_queue.py) and each worker
+# leases jobs from it and runs them on its own warm browsers.
+# ---------------------------------------------------------------------------
+
+# Shared queue location: a SQLite path or a backend URL (see work_queue.open_queue)
+WORK_QUEUE = os.environ.get('WORK_QUEUE', os.path.join(STATE_DIR, 'queue.sqlite3'))
+# A leased job is handed to another worker if not finished within this time
+LEASE_SECONDS = float(os.environ.get('LEASE_SECONDS', str(RUN_BUDGET * 2)))
+# Registrations started per minute per property, across all workers
+PROPERTY_RATE_LIMIT = float(os.environ.get('PROPERTY_RATE_LIMIT', '6'))
+# A job that has failed this many times is given up on
+MAX_ATTEMPTS = int(os.environ.get('MAX_ATTEMPTS', '5'))
+# Longest a worker sleeps between looks at an empty queue
+WORKER_IDLE_SECONDS = float(os.environ.get('WORKER_IDLE_SECONDS', '5'))
+# Finished (done or dead) jobs are deleted this long after they finished.
+# Keep it longer than REGISTRATION_VALIDITY_HOURS: a job's idempotency key
+# only stops a re-enqueue in the same window while the job is still there.
+QUEUE_RETENTION_HOURS = float(os.environ.get('QUEUE_RETENTION_HOURS', '168'))
+# How often a worker purges finished jobs
+QUEUE_PURGE_SECONDS = 3600
+
+def idempotency_key(registration, at=None):
+    """Key identifying one registration of a vehicle per validity window, so
+    the same vehicle enqueued twice in a window is only registered once."""
+    window = int((at or time.time()) // (REGISTRATION_VALIDITY_HOURS * 3600))
+    plate, property_name = registration_key(registration)
+    return f"{plate}|{property_name}|{window}"
+
+def enqueue_registrations(work_queue, registrations):
+    """Add `registrations` to `work_queue`. Returns how many were new."""
+    added = 0
+    for registration in registrations:
+        if registration.missing_fields():
+            logger.error(f"Not enqueueing {registration.vehicle_plate or 'registration'}: missing "
+                         f"{', '.join(registration.missing_fields())}")
+            continue
+        added += work_queue.enqueue(idempotency_key(registration), registration.property_name,
+                                    asdict(registration))
+    logger.info(f"Enqueued {added} of {len(registrations)} registrations ({len(registrations) - added} already queued)")
+    return added
+
+class Worker:
+    """Runs registrations leased from a shared WorkQueue, `concurrency` at a
+    time, until stop() is called (or, with `exit_when_idle`, until the queue
+    has nothing left to run). `on_result` is called with each result."""
+
+    def __init__(self, work_queue, concurrency=BATCH_CONCURRENCY, engine=REGISTRATION_ENGINE, headless=True,
+                 profile=BROWSER_PROFILE, on_result=None, exit_when_idle=False):
+        self.work_queue = work_queue
+        self.concurrency = max(1, concurrency)
+        self.engine = engine
+        self.headless = headless
+        self.profile = profile
+        self.on_result = on_result
+        self.exit_when_idle = exit_when_idle
+        # Minimum seconds between job starts at one property, across all workers
+        self.min_interval = 60 / PROPERTY_RATE_LIMIT if PROPERTY_RATE_LIMIT > 0 else 0
+        import socket  # only workers need it; keeps it out of --check's start-up
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._next_purge = 0
+        self._purge_lock = threading.Lock()
+
+    def stop(self):
+        """Stop leasing; registrations already running are allowed to finish."""
+        self._stop.set()
+
+    def run(self):
+        logger.info(f"Worker {self.name} started ({self.concurrency} at a time, engine {self.engine})")
+        with DriverPool(size=self.concurrency, headless=self.headless, profile=self.profile) as pool:
+            threads = [threading.Thread(target=self._loop, args=(pool, f"{self.name}:{index}"), name=f"worker_{index}")
+                       for index in range(self.concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        logger.info(f"Worker {self.name} stopped")
+
+    def _purge(self):
+        """Delete old finished jobs, at most once per QUEUE_PURGE_SECONDS."""
+        with self._purge_lock:
+            if time.time() < self._next_purge:
+                return
+            self._next_purge = time.time() + QUEUE_PURGE_SECONDS
+        purged = self.work_queue.purge(QUEUE_RETENTION_HOURS * 3600)
+        if purged:
+            logger.info(f"Purged {purged} finished jobs older than {QUEUE_RETENTION_HOURS:g}h from the queue")
+
+    def _idle(self):
+        self._purge()
+        counts = self.work_queue.counts()
+        if self.exit_when_idle and not counts.get('queued') and not counts.get('leased'):
+            return True
+        next_available = self.work_queue.next_available(self.min_interval)
+        delay = WORKER_IDLE_SECONDS if next_available is None else next_available - time.time()
+        # Jittered so idle workers don't all poll at the same moment
+        self._stop.wait(min(WORKER_IDLE_SECONDS, max(POLL_INTERVAL, delay)) * random.uniform(0.8, 1.2))
+        return False
+
+    def _loop(self, pool, owner):
+        while not self._stop.is_set():
+            job = self.work_queue.lease(owner, LEASE_SECONDS, min_interval=self.min_interval)
+            if job is None:
+                if self._idle():
+                    return
+                continue
+
+            registration = Registration.from_record(job.payload)
+            # A redelivered job may already have been registered before its worker died
+            _, skipped = skip_active([registration])
+            result = skipped[0] if skipped else run_registration(
+                registration, engine=self.engine, headless=self.headless, pool=pool
+            )
+            summary = {key: value for key, value in result.to_dict().items() if key != 'metrics'}
+            if result:
+                self.work_queue.complete(job, summary)
+            elif job.attempts >= MAX_ATTEMPTS:
+                logger.error(f"Giving up on {registration.vehicle_plate} after {job.attempts} attempts: {result.error}")
+                self.work_queue.fail(job, result.error)
+            else:
+                delay = retry_delay(job.attempts)
+                logger.warning(f"Registration for {registration.vehicle_plate} failed (attempt {job.attempts}), "
+                               f"requeued for {delay:.0f}s from now: {result.error}")
+                self.work_queue.fail(job, result.error, retry_at=time.time() + delay)
+            if self.on_result is not None:
+                try:
+                    self.on_result(result)
+                except Exception as e:
+                    logger.warning(f"Result handler failed: {e}")
+
+def write_results(results, path):
+    """Write one JSON line per result to `path` ('-' for stdout)."""
+    lines = [json.dumps(result.to_dict()) for result in results]
+    if path == '-':
+        print("\n".join(lines))
+    else:
+        with open(path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+
+# ---------------------------------------------------------------------------
+# Preflight checks
+#
+# Validate configuration without starting a browser or importing Selenium,
+# so a scheduler can vet many configs before dispatching real work.
+# ---------------------------------------------------------------------------
+
+PHONE_PATTERN = re.compile(r'^1?\d{10}$')
+PLATE_PATTERN = re.compile(r'^[A-Z0-9]{1,8}$')
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+CHROME_BINARIES = ('google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome')
+VERSION_PATTERN = re.compile(r'(\d+)\.[\d.]+')
+
+@dataclass
+class Check:
+    """One preflight finding. `level` is 'ok', 'warning' or 'error'."""
+    name: str
+    level: str
+    detail: str = ''
+
+def check_registration(registration):
+    """Validate one registration's fields. Returns a list of Checks."""
+    label = registration.vehicle_plate or 'registration'
+    checks = []
+    missing = registration.missing_fields()
+    if missing:
+        checks.append(Check(f"{label}: required fields", 'error', f"missing {', '.join(missing)}"))
+    phone = re.sub(r'[\s().+-]', '', registration.guest_phone or '')
+    if phone and not PHONE_PATTERN.match(phone):
+        checks.append(Check(f"{label}: guest phone", 'error', f"'{registration.guest_phone}' is not a 10 digit number"))
+    plate = re.sub(r'[\s-]', '', registration.vehicle_plate or '').upper()
+    if plate and not PLATE_PATTERN.match(plate):
+        checks.append(Check(f"{label}: vehicle plate", 'error',
+                            f"'{registration.vehicle_plate}' should be 1-8 letters and digits"))
+    if registration.notification_email and not EMAIL_PATTERN.match(registration.notification_email):
+        checks.append(Check(f"{label}: notification email", 'error',
+                            f"'{registration.notification_email}' is not an email address"))
+    if not registration.property_name:
+        checks.append(Check(f"{label}: property", 'error', "PROPERTY_NAME is empty"))
+    if not checks:
+        checks.append(Check(f"{label}: fields", 'ok'))
+    return checks
+
+def _command_version(path):
+    try:
+        output = subprocess.run([path, '--version'], capture_output=True, text=True, timeout=5).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = VERSION_PATTERN.search(output)
+    return match.group(0) if match else None
+
+def check_browser():
+    """Find Chrome and chromedriver and compare their major versions. Both
+    version probes run at once."""
+    chrome = next(filter(None, map(shutil.which, CHROME_BINARIES)), None)
+    chromedriver = shutil.which('chromedriver')
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        chrome_version = executor.submit(_command_version, chrome) if chrome else None
+        driver_version = executor.submit(_command_version, chromedriver) if chromedriver else None
+        chrome_version = chrome_version.result() if chrome_version else None
+        driver_version = driver_version.result() if driver_version else None
+
+    checks = []
+    if find_spec('selenium') is None:
+        checks.append(Check("selenium", 'error', "not installed (pip install selenium)"))
+    if chrome is None:
+        checks.append(Check("chrome", 'error', f"none of {', '.join(CHROME_BINARIES)} found on PATH"))
+    else:
+        checks.append(Check("chrome", 'ok' if chrome_version else 'warning', f"{chrome} {chrome_version or '(version unknown)'}"))
+    if chromedriver is None:
+        # Selenium 4.6+ can download a matching driver itself
+        checks.append(Check("chromedriver", 'warning', "not on PATH, Selenium Manager will have to fetch one"))
+    else:
+        checks.append(Check("chromedriver", 'ok' if driver_version else 'warning',
+                            f"{chromedriver} {driver_version or '(version unknown)'}"))
+    if chrome_version and driver_version and chrome_version.split('.')[0] != driver_version.split('.')[0]:
+        checks.append(Check("chrome/chromedriver versions", 'error',
+                            f"Chrome {chrome_version} needs chromedriver {chrome_version.split('.')[0]}, found {driver_version}"))
+    return checks
+
+def preflight(registrations, engine=REGISTRATION_ENGINE):
+    """Validate the configuration, each registration and (for engines that
+    may need it) the browser install. Returns a list of Checks."""
+    checks = []
+    if engine not in ENGINES:
+        checks.append(Check("engine", 'error', f"'{engine}' is not one of {', '.join(ENGINES)}"))
+    if not re.match(r'^https?://[^/\s]+', REGISTER2PARK_URL):
+        checks.append(Check("REGISTER2PARK_URL", 'error', f"'{REGISTER2PARK_URL}' is not an http(s) URL"))
+    if not registrations:
+        checks.append(Check("registrations", 'error', "nothing to register"))
+    for registration in registrations:
+        checks.extend(check_registration(registration))
+    if engine in ('http', 'auto') and find_spec('requests') is None:
+        checks.append(Check("requests", 'error' if engine == 'http' else 'warning',
+                            "not installed, the HTTP engine is unavailable"))
+    if engine in ('selenium', 'auto'):
+        checks.extend(check_browser())
+    return checks
 
 if __name__ == "__main__":
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Register parking on Register2Park')
     parser.add_argument('--debug', action='store_true', help='Run in debug mode (visible browser)')
-    parser.add_argument('--verbose', action='store_true', help='Enable verbose logging and pauses')
+    parser.add_argument('--verbose', action='store_true', help='Enable verbose logging and keep artifacts of successful runs too')
+    parser.add_argument('--manifest', help='CSV or JSONL file of registrations to run as a batch')
+    parser.add_argument('--concurrency', type=int, default=BATCH_CONCURRENCY,
+                        help='Number of registrations to run at once in batch mode')
+    parser.add_argument('--engine', choices=ENGINES, default=REGISTRATION_ENGINE,
+                        help="'selenium' drives Chrome, 'http' posts the forms directly, "
+                             "'auto' tries http and falls back to selenium")
+    parser.add_argument('--profile', choices=BROWSER_PROFILES, default=BROWSER_PROFILE,
+                        help="Browser profile: 'lean' blocks images/fonts/analytics and loads pages eagerly")
+    parser.add_argument('--results', default='-', help="Where to write batch results as JSONL ('-' for stdout)")
+    parser.add_argument('--metrics', default=os.environ.get('METRICS_FILE'),
+                        help='Append a JSON metrics record per registration to this file')
+    parser.add_argument('--prometheus', default=os.environ.get('PROMETHEUS_TEXTFILE'),
+                        help='Write a Prometheus textfile-collector file summarising the run')
+    parser.add_argument('--check', action='store_true',
+                        help='Validate the configuration and browser install without registering, then exit')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Stay running and re-register each vehicle shortly before it expires')
+    parser.add_argument('--enqueue', action='store_true',
+                        help='Add the registrations to the shared work queue instead of running them')
+    parser.add_argument('--worker', action='store_true',
+                        help='Run registrations leased from the shared work queue')
+    parser.add_argument('--queue', default=WORK_QUEUE, help='Work queue location (SQLite path or backend URL)')
+    parser.add_argument('--exit-when-idle', action='store_true',
+                        help='With --worker, exit once the queue has nothing left to run')
+    parser.add_argument('--force', action='store_true',
+                        help='Register even if the ledger shows the vehicle is already registered')
+    parser.add_argument('--trace', metavar='DIR', default=TRACE_DIR,
+                        help='Write a network/performance trace of each browser registration to this directory')
+    parser.add_argument('--persistent-profile', action='store_true', default=PERSISTENT_PROFILES,
+                        help='Keep each browser\'s HTTP and code caches between runs (see PROFILE_STORE_DIR)')
+    parser.add_argument('--export-ledger', metavar='PATH',
+                        help='Export the registration ledger to a CSV or JSONL file and exit')
     args = parser.parse_args()
-    
+    TRACE_DIR = args.trace
+    PERSISTENT_PROFILES = args.persistent_profile
+
+    if args.check:
+        try:
+            registrations = load_manifest(args.manifest) if args.manifest else [Registration.from_env()]
+        except (OSError, ValueError) as e:
+            registrations = []
+            logger.error(f"Could not load {args.manifest}: {e}")
+        checks = preflight(registrations, engine=args.engine)
+        for check in checks:
+            print(f"{check.level.upper():<8} {check.name}{': ' + check.detail if check.detail else ''}")
+        errors = sum(1 for check in checks if check.level == 'error')
+        print(f"{errors} errors, {len(checks)} checks in {(time.perf_counter() - IMPORT_STARTED) * 1000:.0f} ms "
+              f"(including start-up)")
+        exit(1 if errors or not registrations else 0)
+
+    if args.export_ledger:
+        ledger = get_ledger()
+        if ledger is None:
+            parser.error('the ledger is disabled (LEDGER_PATH is empty)')
+        count = ledger.export(args.export_ledger)
+        logger.info(f"Exported {count} ledger entries to {args.export_ledger}")
+        exit(0)
+
     # Check if running in debug mode
     debug_mode = args.debug or os.environ.get('DEBUG_MODE', 'false').lower() == 'true'
     verbose_mode = args.verbose or os.environ.get('VERBOSE_MODE', 'false').lower() == 'true'
-    
-    # Run the registration process
-    success = register_parking(headless=not debug_mode, debug_mode=verbose_mode)
-    
+
+    if args.enqueue:
+        registrations = load_manifest(args.manifest) if args.manifest else [Registration.from_env()]
+        enqueue_registrations(open_queue(args.queue), registrations)
+        exit(0)
+
+    if args.worker:
+        latest = {}
+        def _on_worker_result(result):
+            latest[result.vehicle_plate] = result
+            if args.metrics:
+                append_metrics([result], args.metrics)
+        worker = Worker(
+            open_queue(args.queue), concurrency=args.concurrency, engine=args.engine, headless=not debug_mode,
+            profile=args.profile, on_result=_on_worker_result, exit_when_idle=args.exit_when_idle,
+        )
+        signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+        signal.signal(signal.SIGINT, lambda *_: worker.stop())
+        worker.run()
+        wait_for_emails()
+        if args.prometheus:
+            write_prometheus_textfile(list(latest.values()), args.prometheus)
+        exit(0)
+
+    if args.daemon:
+        # Keep the vehicles registered until stopped; SIGHUP reloads the vehicle list
+        latest = {}
+        def _on_result(result):
+            latest[result.vehicle_plate] = result
+            if args.metrics:
+                append_metrics([result], args.metrics)
+            if args.prometheus:
+                write_prometheus_textfile(list(latest.values()), args.prometheus)
+        get_email_stage().on_result = lambda email_result: append_metrics([email_result], args.metrics) \
+            if args.metrics else None
+        with DriverPool(size=args.concurrency, headless=not debug_mode, profile=args.profile) as pool:
+            scheduler = new_scheduler(
+                (lambda: load_manifest(args.manifest)) if args.manifest else (lambda: [Registration.from_env()]),
+                pool, concurrency=args.concurrency, engine=args.engine, headless=not debug_mode,
+                manifest_path=args.manifest, on_result=_on_result,
+            )
+            signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+            signal.signal(signal.SIGINT, lambda *_: scheduler.stop())
+            if hasattr(signal, 'SIGHUP'):
+                signal.signal(signal.SIGHUP, lambda *_: scheduler.reload())
+            scheduler.run()
+        wait_for_emails()
+        exit(0)
+
+    registrations = load_manifest(args.manifest) if args.manifest else [Registration.from_env()]
+    skipped = []
+    if not args.force:
+        registrations, skipped = skip_active(registrations)
+
+    if args.manifest:
+        # Run every registration in the manifest that isn't already active
+        results = skipped + register_batch(
+            registrations, concurrency=args.concurrency,
+            headless=not debug_mode, debug_mode=verbose_mode, engine=args.engine, profile=args.profile
+        )
+        write_results(results, args.results)
+    elif registrations:
+        # Run the registration process on a borrowed session
+        with DriverPool(size=1, headless=not debug_mode, profile=args.profile) as pool:
+            results = [run_registration(
+                registrations[0], engine=args.engine, headless=not debug_mode, debug_mode=verbose_mode, pool=pool
+            )]
+    else:
+        results = skipped
+
+    # Confirmation emails are reported separately and don't affect the exit code
+    email_results = wait_for_emails()
+    if email_results:
+        logger.info(f"Confirmation emails sent: {sum(map(bool, email_results))}/{len(email_results)}")
+    if args.metrics:
+        append_metrics(results + email_results, args.metrics)
+    if args.prometheus:
+        write_prometheus_textfile(results, args.prometheus)
+    success = all(results)
+
     # Exit with appropriate code
-    exit(0 if success else 1)
\ No newline at end of file
+    exit(0 if success else 1)
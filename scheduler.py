@@ -0,0 +1,203 @@
+"""Scheduler that keeps a set of vehicles registered.
+
+Instead of a cron job that cold-starts Python and Chrome for every run, the
+daemon stays resident: it keeps the vehicle list in a priority queue keyed
+by when each registration is next due, re-registers each vehicle shortly
+before it expires, and retries failures with jittered exponential backoff.
+Registrations are run by a callable the caller supplies (register_parking
+passes one bound to its engine and warm browser pool), so the scheduling
+itself needs neither a browser nor the network.
+"""
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ledger import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+
+def backoff_delay(attempt, base=30, cap=1800):
+    """Seconds to wait before retry number `attempt` (1-based): exponential
+    backoff with "equal jitter", i.e. between half and all of the step."""
+    step = min(cap, base * 2 ** (attempt - 1))
+    return step / 2 + random.uniform(0, step / 2)
+
+
+class Scheduler:
+    """Keeps a set of vehicles registered, each renewed shortly before its
+    registration expires.
+
+    `load_registrations` is called to (re)load the vehicle list; it runs
+    again whenever `manifest_path` changes (if given) or reload() is called.
+    Vehicles are told apart by `key(registration)` and registered with
+    `register(registration)`, which returns a result that is truthy on
+    success; `on_result` is called with each result as it finishes.
+
+    A vehicle that `ledger` shows as registered waits for its renewal time:
+    `renew_margin` seconds (plus up to `jitter` more) before it expires. A
+    successful registration is valid for `validity` seconds, and failed ones
+    are retried after `retry_delay(attempt)` seconds. The manifest is checked
+    for changes every `reload_interval` seconds.
+    """
+
+    def __init__(self, load_registrations, register, key, concurrency=1, ledger=None, validity=24 * 3600,
+                 renew_margin=2 * 3600, jitter=600, retry_delay=backoff_delay, reload_interval=30,
+                 manifest_path=None, on_result=None):
+        self.load_registrations = load_registrations
+        self.register = register
+        self.key = key
+        self.concurrency = max(1, concurrency)
+        self.ledger = ledger
+        self.validity = validity
+        self.renew_margin = renew_margin
+        self.jitter = jitter
+        self.retry_delay = retry_delay
+        self.reload_interval = reload_interval
+        self.manifest_path = manifest_path
+        self.on_result = on_result
+        self._registrations = {}
+        self._due = {}
+        self._attempts = {}
+        self._heap = []
+        self._sequence = itertools.count()
+        self._running = {}
+        self._manifest_mtime = None
+        self._next_reload_check = 0
+        self._reload_requested = True
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+
+    def stop(self):
+        """Stop scheduling; registrations already running are allowed to finish."""
+        self._stop.set()
+        self._wakeup.set()
+
+    def reload(self):
+        """Reload the vehicle list at the next opportunity."""
+        self._reload_requested = True
+        self._wakeup.set()
+
+    def _schedule(self, key, due):
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, next(self._sequence), key))
+
+    def _renewal_due(self, expires_at):
+        return expires_at - self.renew_margin - random.uniform(0, self.jitter)
+
+    def _initial_due(self, registration):
+        # A vehicle the ledger shows as registered is first due at its renewal time
+        entry = self.ledger.active(registration.vehicle_plate, registration.property_name) if self.ledger else None
+        if entry is None:
+            return time.time()
+        return self._renewal_due(parse_timestamp(entry['expires_at']).timestamp())
+
+    def _manifest_changed(self):
+        if not self.manifest_path:
+            return False
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime
+        except OSError:
+            return False
+        return mtime != self._manifest_mtime
+
+    def _reload(self):
+        self._reload_requested = False
+        if self.manifest_path:
+            try:
+                self._manifest_mtime = os.stat(self.manifest_path).st_mtime
+            except OSError:
+                pass
+        try:
+            registrations = self.load_registrations()
+        except Exception as e:
+            logger.error(f"Could not reload the vehicle list, keeping the current one: {e}")
+            return
+        loaded = {}
+        for registration in registrations:
+            if registration.missing_fields():
+                logger.error(f"Ignoring {registration.vehicle_plate or 'registration'}: missing "
+                             f"{', '.join(registration.missing_fields())}")
+                continue
+            loaded[self.key(registration)] = registration
+
+        added = [key for key in loaded if key not in self._registrations]
+        removed = [key for key in self._registrations if key not in loaded]
+        # Changed details of a known vehicle are picked up at its next run
+        self._registrations = loaded
+        for key in removed:
+            self._due.pop(key, None)
+            self._attempts.pop(key, None)
+        for key in added:
+            self._schedule(key, self._initial_due(loaded[key]))
+        if added or removed:
+            logger.info(f"Vehicle list loaded: {len(loaded)} vehicles ({len(added)} added, {len(removed)} removed)")
+
+    def _finished(self, key, result):
+        # A vehicle removed from the list while it was running isn't rescheduled
+        if key in self._registrations and result:
+            self._attempts.pop(key, None)
+            self._schedule(key, self._renewal_due(time.time() + self.validity))
+        elif key in self._registrations:
+            attempt = self._attempts.get(key, 0) + 1
+            self._attempts[key] = attempt
+            delay = self.retry_delay(attempt)
+            logger.warning(f"Registration for {result.vehicle_plate} failed (attempt {attempt}), "
+                           f"retrying in {delay:.0f}s: {result.error}")
+            self._schedule(key, time.time() + delay)
+        if self.on_result is not None:
+            try:
+                self.on_result(result)
+            except Exception as e:
+                logger.warning(f"Result handler failed: {e}")
+
+    def _next_due(self):
+        """Pop stale heap entries and return the earliest live due time, or None."""
+        while self._heap:
+            due, _, key = self._heap[0]
+            if self._due.get(key) == due:
+                return due
+            heapq.heappop(self._heap)
+        return None
+
+    def run(self):
+        """Run until stop() is called."""
+        logger.info(f"Scheduler started ({self.concurrency} at a time)")
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='scheduler') as executor:
+            while not self._stop.is_set():
+                self._wakeup.clear()
+                now = time.time()
+                if self._reload_requested or (now >= self._next_reload_check and self._manifest_changed()):
+                    self._reload()
+                if now >= self._next_reload_check:
+                    self._next_reload_check = now + self.reload_interval
+
+                for future in [future for future in self._running if future.done()]:
+                    key = self._running.pop(future)
+                    self._finished(key, future.result())
+
+                next_due = self._next_due()
+                while next_due is not None and next_due <= now and len(self._running) < self.concurrency:
+                    _, _, key = heapq.heappop(self._heap)
+                    del self._due[key]
+                    future = executor.submit(self.register, self._registrations[key])
+                    future.add_done_callback(lambda _: self._wakeup.set())
+                    self._running[future] = key
+                    next_due = self._next_due()
+
+                timeout = self._next_reload_check - now
+                if next_due is not None and len(self._running) < self.concurrency:
+                    timeout = min(timeout, next_due - now)
+                self._wakeup.wait(max(0.0, timeout))
+
+            if self._running:
+                logger.info(f"Waiting for {len(self._running)} running registrations to finish")
+            for future, key in list(self._running.items()):
+                self._finished(key, future.result())
+            self._running.clear()
+        logger.info("Scheduler stopped")
@@ -0,0 +1,56 @@
+"""Shared fixtures: the stand-in server, and register_parking pointed at it
+with its state in a temporary directory. Nothing here needs Chrome."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# register_parking reads its state paths at import time; keep the real
+# ledger, caches and artifacts out of reach of every test
+os.environ['R2P_STATE_DIR'] = tempfile.mkdtemp(prefix='r2p-test-state-')
+for name in ('STRATEGY_CACHE_PATH', 'PROPERTY_CACHE_PATH', 'ARTIFACT_DIR', 'LEDGER_PATH', 'PROFILE_STORE_DIR',
+             'WORK_QUEUE', 'TRACE_DIR', 'PERSISTENT_PROFILES'):
+    os.environ.pop(name, None)
+
+from mock_server import start_mock_server  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    server = start_mock_server(email_enable_delay=0, seed=0)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def rp(server, tmp_path, monkeypatch):
+    """register_parking aimed at `server`, with a fresh ledger, caches and
+    artifact directory under `tmp_path`."""
+    import register_parking
+    from ledger import Ledger
+
+    monkeypatch.setattr(register_parking, 'REGISTER2PARK_URL', server.base_url)
+    monkeypatch.setattr(register_parking, 'REGISTER_URL', f"{server.base_url}/register")
+    monkeypatch.setattr(register_parking, 'ARTIFACT_DIR', str(tmp_path / 'artifacts'))
+    monkeypatch.setattr(register_parking, '_ledger', Ledger(str(tmp_path / 'ledger.sqlite3')))
+    monkeypatch.setattr(register_parking, '_property_cache',
+                        register_parking.PropertyCache(path=str(tmp_path / 'properties.json')))
+    monkeypatch.setattr(register_parking, '_strategy_cache',
+                        register_parking.StrategyCache(path=str(tmp_path / 'strategies.json')))
+    monkeypatch.setattr(register_parking, '_email_stage', None)
+    yield register_parking
+    register_parking.wait_for_emails()
+    register_parking._ledger.close()
+
+
+def make_registration(rp, plate, property_name='Sondery, The', **fields):
+    values = dict(
+        unit_number='101', resident_name='Test Resident', guest_name='Test Guest', guest_phone='5555550100',
+        vehicle_make='Toyota', vehicle_model='Camry', vehicle_plate=plate, property_name=property_name,
+    )
+    values.update(fields)
+    return rp.Registration(**values)
@@ -0,0 +1,102 @@
+import json
+import os
+import zipfile
+
+import pytest
+
+from artifacts import ArtifactRecorder, capture_browser, capture_page
+from conftest import make_registration
+
+
+def _bundle(path):
+    with zipfile.ZipFile(path) as bundle:
+        return json.loads(bundle.read('manifest.json')), {name: bundle.read(name) for name in bundle.namelist()}
+
+
+class FakeDriver:
+    def __init__(self, html='<p>final</p>', screenshot=b'PNG'):
+        self.html = html
+        self.screenshot = screenshot
+        self.scripts = 0
+
+    def execute_script(self, script, max_chars):
+        self.scripts += 1
+        return ['https://example.test/final', self.html[:max_chars], len(self.html)]
+
+    def get_screenshot_as_png(self):
+        return self.screenshot
+
+
+def test_ring_buffer_keeps_the_last_pages_and_trims_each(tmp_path):
+    recorder = ArtifactRecorder(str(tmp_path), max_snapshots=3, max_dom_chars=10)
+    with recorder.activate():
+        for index in range(5):
+            capture_page(f"page {index}", f"https://example.test/{index}", f"<p>{index}</p>" * 5)
+    assert [snapshot['name'] for snapshot in recorder.snapshots] == ['page 2', 'page 3', 'page 4']
+    assert all(len(snapshot['html']) == 10 and snapshot['truncated'] for snapshot in recorder.snapshots)
+    # Outside a run nothing is recorded
+    capture_page('page 5', 'https://example.test/5', '<p>5</p>')
+    assert len(recorder.snapshots) == 3
+
+
+def test_browser_steps_are_recorded_without_reading_the_page_by_default(tmp_path):
+    driver = FakeDriver()
+    recorder = ArtifactRecorder(str(tmp_path))
+    with recorder.activate():
+        capture_browser(driver, 'open register page')
+    assert [step['name'] for step in recorder.steps] == ['open register page']
+    assert driver.scripts == 0 and not recorder.snapshots
+
+    recorder = ArtifactRecorder(str(tmp_path), step_snapshots=True)
+    with recorder.activate():
+        capture_browser(driver, 'open register page')
+    assert driver.scripts == 1 and recorder.snapshots[0]['url'] == 'https://example.test/final'
+
+
+def test_bundle_drops_oldest_snapshots_and_then_the_screenshot_to_fit(tmp_path):
+    recorder = ArtifactRecorder(str(tmp_path), max_snapshots=5, max_bytes=250)
+    for index in range(4):
+        recorder.add(f"page {index}", f"https://example.test/{index}", 'x' * 100)
+    path = recorder.write({'vehicle_plate': 'ABC 123', 'error': 'boom'},
+                          driver=FakeDriver(html='y' * 40, screenshot=b'P' * 500))
+    manifest, files = _bundle(path)
+    # The final page and the two newest pages fit in 250 bytes; the screenshot doesn't
+    assert [snapshot['name'] for snapshot in manifest['snapshots']] == ['page 2', 'page 3', 'final']
+    assert manifest['dropped_snapshots'] == 2
+    assert 'screenshot' not in manifest and 'screenshot.png' not in files
+    assert manifest['error'] == 'boom'
+    assert os.path.basename(path).split('-')[1:3] == ['ABC', '123']
+
+
+def test_screenshot_is_kept_when_it_fits(tmp_path):
+    path = ArtifactRecorder(str(tmp_path)).write({'vehicle_plate': 'ABC123'}, driver=FakeDriver())
+    manifest, files = _bundle(path)
+    assert manifest['screenshot'] == 'screenshot.png' and files['screenshot.png'] == b'PNG'
+    assert files[manifest['snapshots'][0]['file']] == b'<p>final</p>'
+
+
+def test_only_the_newest_bundles_are_kept(tmp_path):
+    paths = [ArtifactRecorder(str(tmp_path), keep=2).write({'vehicle_plate': f"P{index}"}) for index in range(4)]
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(path) for path in paths[-2:])
+
+
+def test_failed_http_run_leaves_a_bundle(rp, server):
+    pytest.importorskip('requests')
+    server.fail_endpoints.add('vehicle_information')
+    result = rp.register_parking_http(make_registration(rp, 'ART001'))
+    assert not result and result.artifacts
+    manifest, files = _bundle(result.artifacts)
+    assert manifest['vehicle_plate'] == 'ART001' and manifest['engine'] == 'http'
+    assert manifest['error'] == result.error
+    assert [snapshot['name'] for snapshot in manifest['snapshots']] == [
+        'http register_page', 'http property_search', 'http select_property', 'http parking_type',
+        'http vehicle_information']
+    assert b'Server Error' in files[manifest['snapshots'][-1]['file']]
+    assert 'http vehicle_information' in manifest['metrics']['steps']
+
+
+def test_successful_http_run_writes_nothing(rp, server):
+    pytest.importorskip('requests')
+    result = rp.register_parking_http(make_registration(rp, 'ART002'))
+    assert result and result.artifacts is None
+    assert not os.path.exists(rp.ARTIFACT_DIR)
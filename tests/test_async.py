@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from conftest import make_registration
+
+
+class SlowRegistrar:
+    """Stands in for run_registration: each plate takes `durations[plate]`
+    seconds. Tracks how many run at once."""
+
+    def __init__(self, rp, durations):
+        self.rp = rp
+        self.durations = durations
+        self.started = []
+        self.finished = []
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, registration, engine=None, headless=True, debug_mode=False, pool=None):
+        plate = registration.vehicle_plate
+        with self.lock:
+            self.started.append(plate)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.durations[plate])
+        with self.lock:
+            self.running -= 1
+            self.finished.append(plate)
+        return self.rp.RegistrationResult(plate, True)
+
+
+async def _collect(generator):
+    return [result async for result in generator]
+
+
+def test_results_stream_in_completion_order_with_bounded_concurrency(rp, monkeypatch):
+    durations = {'SLOW01': 0.8, 'MID001': 0.2, 'FAST01': 0.05, 'FAST02': 0.05}
+    registrar = SlowRegistrar(rp, durations)
+    monkeypatch.setattr(rp, 'run_registration', registrar)
+    registrations = [make_registration(rp, plate) for plate in durations]
+    results = asyncio.run(_collect(rp.register_many(registrations, concurrency=2, engine='http')))
+    # SLOW01 and MID001 start first; the fast ones run in MID001's slot after it
+    assert [result.vehicle_plate for result in results] == ['MID001', 'FAST01', 'FAST02', 'SLOW01']
+    assert registrar.peak == 2
+
+
+def test_stopping_early_cancels_registrations_not_yet_started(rp, monkeypatch):
+    durations = {f"P{index:05d}": 0.1 for index in range(8)}
+    registrar = SlowRegistrar(rp, durations)
+    monkeypatch.setattr(rp, 'run_registration', registrar)
+
+    async def first_result():
+        generator = rp.register_many([make_registration(rp, plate) for plate in durations], concurrency=2,
+                                     engine='http')
+        result = await generator.__anext__()
+        await generator.aclose()
+        return result
+
+    assert asyncio.run(first_result())
+    # The registrations running when iteration stopped finish; the rest never start
+    assert 2 <= len(registrar.started) < len(durations)
+    assert sorted(registrar.finished) == sorted(registrar.started)
+    time.sleep(0.3)
+    assert len(registrar.started) == len(registrar.finished) < len(durations)
+
+
+def test_register_many_against_the_stand_in_server(rp, server):
+    pytest.importorskip('requests')
+    plates = [f"ASY{index:03d}" for index in range(5)]
+    results = asyncio.run(_collect(rp.register_many([make_registration(rp, plate) for plate in plates],
+                                                    concurrency=3, engine='http')))
+    assert sorted(result.vehicle_plate for result in results) == plates
+    assert all(results)
+    assert sorted(registration['vehicleLicensePlate'] for registration in server.registrations) == plates
+
+
+def test_register_async_runs_one_registration(rp, server):
+    pytest.importorskip('requests')
+    result = asyncio.run(rp.register_async(make_registration(rp, 'ASY100'), engine='http'))
+    assert result and result.confirmation_code == server.registrations[0]['code']
@@ -0,0 +1,72 @@
+import json
+import time
+
+import pytest
+
+from conftest import make_registration
+
+
+def test_csv_manifest_with_env_style_headers(rp, tmp_path):
+    path = tmp_path / 'vehicles.csv'
+    path.write_text(
+        'UNIT_NUMBER,resident_name,Guest_Name,GUEST_PHONE,VEHICLE_MAKE,VEHICLE_MODEL,VEHICLE_PLATE,notes\n'
+        '101, Test Resident ,Test Guest,5555550100,Toyota,Camry,ABC123,ignored\n'
+        '102,Other Resident,Guest Two,5555550101,Honda,Civic,,\n'
+    )
+    first, second = rp.load_manifest(str(path))
+    assert (first.unit_number, first.resident_name, first.vehicle_plate) == ('101', 'Test Resident', 'ABC123')
+    # PROPERTY_NAME falls back to the environment's value
+    assert first.property_name == rp.PROPERTY_NAME
+    assert first.missing_fields() == []
+    assert second.vehicle_plate is None and second.missing_fields() == ['VEHICLE_PLATE']
+
+
+def test_jsonl_manifest(rp, tmp_path):
+    path = tmp_path / 'vehicles.jsonl'
+    records = [
+        {'unit_number': 101, 'resident_name': 'A', 'guest_name': 'B', 'guest_phone': '5555550100',
+         'vehicle_make': 'Toyota', 'vehicle_model': 'Camry', 'vehicle_plate': 'ABC123',
+         'PROPERTY_NAME': 'Sonder Heights', 'NOTIFICATION_EMAIL': 'a@example.com'},
+        {'VEHICLE_PLATE': 'XYZ789', 'guest_name': ''},
+    ]
+    path.write_text(json.dumps(records[0]) + '\n\n' + json.dumps(records[1]) + '\n')
+    first, second = rp.load_manifest(str(path))
+    assert first.unit_number == '101'
+    assert (first.property_name, first.notification_email) == ('Sonder Heights', 'a@example.com')
+    assert second.vehicle_plate == 'XYZ789' and second.guest_name is None
+
+    path.write_text('{"vehicle_plate": "ABC123"\n')
+    with pytest.raises(ValueError):
+        rp.load_manifest(str(path))
+
+
+def test_batch_results_come_back_in_manifest_order(rp, monkeypatch):
+    durations = {'SLOW01': 0.3, 'MID001': 0.15, 'FAST01': 0.0}
+    started = []
+
+    def run_registration(registration, engine=None, headless=True, debug_mode=False, pool=None):
+        started.append(registration.vehicle_plate)
+        time.sleep(durations[registration.vehicle_plate])
+        return rp.RegistrationResult(registration.vehicle_plate, registration.vehicle_plate != 'MID001')
+
+    monkeypatch.setattr(rp, 'run_registration', run_registration)
+    results = rp.register_batch([make_registration(rp, plate) for plate in durations], concurrency=3, engine='http')
+    assert [result.vehicle_plate for result in results] == ['SLOW01', 'MID001', 'FAST01']
+    assert [result.success for result in results] == [True, False, True]
+    assert sorted(started) == sorted(durations)
+
+
+def test_batch_against_the_stand_in_server(rp, server, tmp_path):
+    pytest.importorskip('requests')
+    plates = [f"BAT{index:03d}" for index in range(6)]
+    registrations = [make_registration(rp, plate) for plate in plates]
+    registrations.insert(2, make_registration(rp, 'BAT999', guest_phone=None))
+    results = rp.register_batch(registrations, concurrency=3, engine='http')
+    assert [result.vehicle_plate for result in results] == [r.vehicle_plate for r in registrations]
+    assert [result.success for result in results] == [r.vehicle_plate != 'BAT999' for r in registrations]
+    assert sorted(registration['vehicleLicensePlate'] for registration in server.registrations) == plates
+
+    path = tmp_path / 'results.jsonl'
+    rp.write_results(results, str(path))
+    assert [json.loads(line)['vehicle_plate'] for line in path.read_text().splitlines()] == \
+        [r.vehicle_plate for r in registrations]
@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from conftest import make_registration
+
+
+def _result(rp, plate):
+    return rp.RegistrationResult(plate, True, confirmation_code=f"CODE-{plate}")
+
+
+def test_sends_report_success_failure_and_always_clean_up(rp):
+    stage = rp.EmailStage(workers=2)
+    cleaned = []
+
+    def fail():
+        raise RuntimeError('smtp down')
+
+    first, second = _result(rp, 'AAA111'), _result(rp, 'BBB222')
+    stage.submit(first, 'a@example.com', 'http', lambda: None, cleanup=lambda: cleaned.append('AAA111'))
+    stage.submit(second, 'b@example.com', 'http', fail, cleanup=lambda: cleaned.append('BBB222'))
+    assert first.email_queued and second.email_queued
+    results = {result.vehicle_plate: result for result in stage.join()}
+    assert results['AAA111'].success and results['AAA111'].confirmation_code == 'CODE-AAA111'
+    assert not results['BBB222'] and results['BBB222'].error == 'smtp down'
+    assert results['AAA111'].metrics['engine'] == 'http email'
+    assert sorted(cleaned) == ['AAA111', 'BBB222']
+    # Results are handed out once
+    assert stage.join() == []
+    stage.close()
+
+
+def test_browser_sends_start_at_once_instead_of_queueing(rp):
+    stage = rp.EmailStage(workers=1)
+    release = threading.Event()
+    threads = []
+    # The only worker is busy with a slow HTTP send
+    stage.submit(_result(rp, 'SLOW01'), 'slow@example.com', 'http', lambda: release.wait(10))
+    browser = stage.submit(_result(rp, 'BRWS01'), 'b@example.com', 'selenium',
+                           lambda: threads.append(threading.current_thread().name), holds_browser=True)
+    assert browser.result(timeout=5).success
+    assert threads == ['email-BRWS01']
+    release.set()
+    assert sorted(result.vehicle_plate for result in stage.join()) == ['BRWS01', 'SLOW01']
+    stage.close()
+
+
+def test_on_result_receives_each_result_instead_of_join(rp):
+    received = []
+    stage = rp.EmailStage(on_result=received.append)
+    stage.submit(_result(rp, 'AAA111'), 'a@example.com', 'http', lambda: None)
+    stage.submit(_result(rp, 'BBB222'), 'b@example.com', 'selenium', lambda: None, holds_browser=True)
+    assert stage.join() == []
+    assert sorted(result.vehicle_plate for result in received) == ['AAA111', 'BBB222']
+    stage.close()
+
+
+def test_wait_for_emails_stops_the_stage_and_a_new_one_starts_later(rp):
+    stage = rp.get_email_stage()
+    stage.submit(_result(rp, 'AAA111'), 'a@example.com', 'http', lambda: None)
+    assert [result.vehicle_plate for result in rp.wait_for_emails()] == ['AAA111']
+    assert stage._executor._shutdown
+    assert rp.wait_for_emails() == []
+    assert rp.get_email_stage() is not stage
+
+
+def test_http_registration_sends_its_email_in_the_background(rp, server):
+    pytest.importorskip('requests')
+    result = rp.register_parking_http(make_registration(rp, 'MAIL01', notification_email='guest@example.com'))
+    assert result and result.email_queued
+    email_results = rp.wait_for_emails()
+    assert [(email.email, email.success) for email in email_results] == [('guest@example.com', True)]
+    assert server.emails == [('guest@example.com', result.confirmation_code)]
@@ -0,0 +1,76 @@
+import pytest
+
+from conftest import make_registration
+
+pytest.importorskip('requests')
+
+
+def test_registers_through_the_form_endpoints(rp, server):
+    result = rp.register_parking_http(make_registration(rp, 'HTTP01'))
+    assert result and result.confirmation_code == server.registrations[0]['code']
+    assert server.registrations[0]['vehicleLicensePlate'] == 'HTTP01'
+    assert server.registrations[0]['property_id'] == '1001'
+    assert list(result.metrics['steps']) == ['http register_page', 'http property_search', 'http select_property',
+                                             'http parking_type', 'http vehicle_information']
+    assert rp.get_property_cache().lookup('Sondery, The') == '1001'
+
+
+def test_server_error_fails_the_run(rp, server):
+    server.fail_endpoints.add('vehicle_information')
+    result = rp.register_parking_http(make_registration(rp, 'HTTP02'))
+    assert not result
+    assert result.error.endswith('/register/vehicle-information returned HTTP 500')
+    assert not server.registrations
+    assert rp.get_ledger().active('HTTP02', 'Sondery, The') is None
+
+
+def test_rejected_csrf_token_fails_the_run(rp, server, monkeypatch):
+    monkeypatch.setattr(rp.PageSnapshot, 'csrf_token', lambda self: 'stale')
+    result = rp.register_parking_http(make_registration(rp, 'HTTP03'))
+    assert not result
+    assert result.error.endswith('/register/property-search returned HTTP 419')
+
+
+def test_unknown_property_and_missing_fields(rp, server):
+    result = rp.register_parking_http(make_registration(rp, 'HTTP04', property_name='Nowhere Towers'))
+    assert result.error == "No property found for 'Nowhere Towers'"
+    result = rp.register_parking_http(make_registration(rp, 'HTTP05', guest_phone=None))
+    assert not result and 'GUEST_PHONE' in result.error
+
+
+def test_http_engine_reports_requests_missing(rp, server, monkeypatch):
+    monkeypatch.setattr(rp, 'load_requests', lambda: False)
+    result = rp.register_parking_http(make_registration(rp, 'HTTP06'))
+    assert result.error == "requests is not installed, the HTTP engine is unavailable"
+    assert not server.registrations
+
+
+def _fake_selenium(rp, monkeypatch):
+    calls = []
+
+    def register_parking(headless=True, debug_mode=False, registration=None, pool=None):
+        calls.append(registration.vehicle_plate)
+        return rp.RegistrationResult(registration.vehicle_plate, True, confirmation_code='BROWSER',
+                                     metrics={'fallbacks': []})
+
+    monkeypatch.setattr(rp, 'register_parking', register_parking)
+    return calls
+
+
+def test_auto_falls_back_to_selenium_when_http_fails(rp, server, monkeypatch):
+    calls = _fake_selenium(rp, monkeypatch)
+    server.fail_endpoints.add('parking_type')
+    result = rp.run_registration(make_registration(rp, 'AUTO01'), engine='auto')
+    assert calls == ['AUTO01']
+    assert result.confirmation_code == 'BROWSER'
+    assert result.metrics['fallbacks'] == ['engine: http -> selenium']
+
+
+def test_auto_and_http_engines_stay_off_the_browser(rp, server, monkeypatch):
+    calls = _fake_selenium(rp, monkeypatch)
+    assert rp.run_registration(make_registration(rp, 'AUTO02'), engine='auto').confirmation_code != 'BROWSER'
+    server.fail_endpoints.add('parking_type')
+    assert not rp.run_registration(make_registration(rp, 'AUTO03'), engine='http')
+    assert calls == []
+    with pytest.raises(ValueError):
+        rp.run_registration(make_registration(rp, 'AUTO04'), engine='carrier-pigeon')
@@ -0,0 +1,100 @@
+import csv
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import make_registration
+from ledger import Ledger, normalize_plate, parse_timestamp
+
+NOW = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    with Ledger(str(tmp_path / 'ledger.sqlite3')) as ledger:
+        yield ledger
+
+
+def _record(ledger, plate, property_name='Sondery, The', unit='101', code='CODE1', at=NOW, hours=24):
+    registration = SimpleNamespace(vehicle_plate=plate, unit_number=unit, property_name=property_name)
+    ledger.record(registration, SimpleNamespace(confirmation_code=code), timedelta(hours=hours),
+                  engine='http', registered_at=at)
+
+
+def test_normalize_plate_ignores_case_and_spaces():
+    assert normalize_plate(' abc 123 ') == 'ABC123'
+    assert normalize_plate(None) == ''
+
+
+def test_active_respects_expiry_margin_and_property(ledger):
+    _record(ledger, 'abc 123')
+    assert ledger.active('ABC123', 'Sondery, The', now=NOW)['confirmation_code'] == 'CODE1'
+    # Expires at 12:00 the next day: still active with a margin that ends before then
+    assert ledger.active('ABC123', 'Sondery, The', margin=timedelta(hours=23), now=NOW) is not None
+    assert ledger.active('ABC123', 'Sondery, The', margin=timedelta(hours=24), now=NOW) is None
+    assert ledger.active('ABC123', 'Sondery, The', now=NOW + timedelta(hours=25)) is None
+    assert ledger.active('ABC123', 'Sonder Heights', now=NOW) is None
+
+
+def test_active_returns_the_latest_registration(ledger):
+    _record(ledger, 'ABC123', code='OLD')
+    _record(ledger, 'ABC123', code='NEW', at=NOW + timedelta(hours=6))
+    entry = ledger.active('ABC123', 'Sondery, The', now=NOW)
+    assert entry['confirmation_code'] == 'NEW'
+    assert parse_timestamp(entry['expires_at']) == NOW + timedelta(hours=30)
+
+
+def test_query_filters_and_orders_newest_first(ledger):
+    _record(ledger, 'AAA111', at=NOW - timedelta(days=3))
+    _record(ledger, 'BBB222', unit='202', at=NOW - timedelta(days=1))
+    _record(ledger, 'CCC333', property_name='Sonder Heights', at=NOW)
+    assert [row['vehicle_plate'] for row in ledger.query()] == ['CCC333', 'BBB222', 'AAA111']
+    assert [row['vehicle_plate'] for row in ledger.query(property_name='Sondery, The', unit_number='202')] == ['BBB222']
+    assert [row['vehicle_plate'] for row in ledger.query(since=NOW - timedelta(days=2))] == ['CCC333', 'BBB222']
+    assert len(ledger.query(limit=1)) == 1
+
+
+def test_export_csv_and_jsonl(ledger, tmp_path):
+    _record(ledger, 'AAA111')
+    _record(ledger, 'BBB222')
+    assert ledger.export(str(tmp_path / 'out.csv')) == 2
+    with open(tmp_path / 'out.csv', newline='') as f:
+        assert {row['vehicle_plate'] for row in csv.DictReader(f)} == {'AAA111', 'BBB222'}
+    assert ledger.export(str(tmp_path / 'out.jsonl'), vehicle_plate='aaa 111') == 1
+    with open(tmp_path / 'out.jsonl') as f:
+        assert json.loads(f.readline())['vehicle_plate'] == 'AAA111'
+
+
+def test_prune_deletes_long_expired_registrations(ledger):
+    _record(ledger, 'OLD111', at=datetime.now(timezone.utc) - timedelta(days=40))
+    _record(ledger, 'NEW222', at=datetime.now(timezone.utc))
+    assert ledger.prune(timedelta(days=30)) == 1
+    assert [row['vehicle_plate'] for row in ledger.query()] == ['NEW222']
+
+
+def test_successful_registration_is_recorded_and_then_skipped(rp, server):
+    pytest.importorskip('requests')
+    registration = make_registration(rp, 'LED 001')
+    result = rp.run_registration(registration, engine='http')
+    assert result and result.confirmation_code == server.registrations[0]['code']
+
+    pending, skipped = rp.skip_active([make_registration(rp, 'led001'), make_registration(rp, 'LED002')])
+    assert [r.vehicle_plate for r in pending] == ['LED002']
+    assert [(r.vehicle_plate, r.skipped, r.confirmation_code) for r in skipped] == \
+        [('led001', True, result.confirmation_code)]
+
+
+def test_recording_prunes_long_expired_entries_once_a_day(rp, monkeypatch):
+    ledger = rp.get_ledger()
+    _record(ledger, 'OLD111', at=datetime.now(timezone.utc) - timedelta(days=100))
+    monkeypatch.setattr(rp, '_next_ledger_prune', 0)
+    registration = SimpleNamespace(vehicle_plate='NEW222', unit_number='101', property_name='Sondery, The')
+    rp._record_in_ledger(registration, SimpleNamespace(confirmation_code='CODE2'), 'http')
+    assert [row['vehicle_plate'] for row in ledger.query()] == ['NEW222']
+
+    # Not again until a day has passed
+    _record(ledger, 'OLD333', at=datetime.now(timezone.utc) - timedelta(days=100))
+    rp._record_in_ledger(registration, SimpleNamespace(confirmation_code='CODE3'), 'http')
+    assert len(ledger.query(vehicle_plate='OLD333')) == 1
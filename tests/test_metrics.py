@@ -0,0 +1,87 @@
+import json
+import re
+import threading
+from types import SimpleNamespace
+
+from metrics import RunMetrics, append_metrics, record_fallback, record_retry, span, write_prometheus_textfile
+
+
+def _result(plate, success=True, duration=1.5, metrics=None):
+    return SimpleNamespace(vehicle_plate=plate, success=success, confirmation_code='CODE' if success else None,
+                           error=None if success else 'boom', duration=duration, metrics=metrics)
+
+
+def test_run_records_spans_retries_and_fallbacks_while_active():
+    run = RunMetrics('http', 'ABC123')
+    with run.activate():
+        for _ in range(2):
+            with span('http register_page'):
+                pass
+        record_retry('Next button')
+        record_retry('Next button')
+        record_fallback('engine: http -> selenium')
+    # Outside the run the helpers do nothing
+    with span('ignored'):
+        record_retry('ignored')
+    record = run.to_dict()
+    assert record['engine'] == 'http' and record['vehicle_plate'] == 'ABC123'
+    assert [entry['name'] for entry in record['spans']] == ['http register_page'] * 2
+    assert list(record['steps']) == ['http register_page']
+    assert record['retries'] == {'Next button': 2}
+    assert record['fallbacks'] == ['engine: http -> selenium']
+
+
+def test_concurrent_runs_record_separately():
+    runs = [RunMetrics('http', f"P{index}") for index in range(4)]
+
+    def work(run):
+        with run.activate():
+            with span(f"step {run.vehicle_plate}"):
+                pass
+
+    threads = [threading.Thread(target=work, args=(run,)) for run in runs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [list(run.step_durations()) for run in runs] == [[f"step P{index}"] for index in range(4)]
+
+
+def test_append_metrics_writes_one_line_per_result(tmp_path):
+    path = tmp_path / 'metrics.jsonl'
+    run = RunMetrics('http', 'AAA111')
+    append_metrics([_result('AAA111', metrics=run.to_dict())], str(path))
+    append_metrics([_result('BBB222', success=False)], str(path))
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(record['vehicle_plate'], record['success'], record['error']) for record in records] == \
+        [('AAA111', True, None), ('BBB222', False, 'boom')]
+    assert records[0]['engine'] == 'http' and 'steps' in records[0]
+
+
+def test_prometheus_textfile(tmp_path):
+    path = tmp_path / 'r2p.prom'
+    results = [
+        _result('AAA111', duration=2.0, metrics={'steps': {'http register_page': 0.5, 'say "hi"': 0.25},
+                                                 'retries': {'Next': 1}, 'fallbacks': ['select property: js']}),
+        _result('BBB222', success=False, duration=1.0, metrics={'steps': {'http register_page': 0.25},
+                                                                 'retries': {'Next': 2}, 'fallbacks': []}),
+    ]
+    write_prometheus_textfile(results, str(path))
+    assert [entry.name for entry in tmp_path.iterdir()] == ['r2p.prom']
+    text = path.read_text()
+
+    types = dict(re.findall(r'^# TYPE (\S+) (\S+)$', text, re.M))
+    samples = re.findall(r'^([a-z0-9_]+)(?:\{[^}]*\})? ', text, re.M)
+    assert set(samples) == set(types)
+    for name, kind in types.items():
+        # promtool rejects the reserved suffixes on gauges
+        assert kind == 'gauge' and not name.endswith(('_sum', '_count', '_bucket', '_total')), name
+
+    assert 'r2p_registrations{outcome="success"} 1' in text
+    assert 'r2p_registrations{outcome="failure"} 1' in text
+    assert 'r2p_registration_seconds 3.0000' in text
+    assert 'r2p_step_seconds{step="http register_page"} 0.7500' in text
+    assert 'r2p_step_runs{step="http register_page"} 2' in text
+    assert 'r2p_step_seconds{step="say \\"hi\\""} 0.2500' in text
+    assert 'r2p_retries{target="Next"} 3' in text
+    assert 'r2p_fallbacks{path="select property: js"} 1' in text
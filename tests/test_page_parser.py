@@ -0,0 +1,71 @@
+import pytest
+
+from page_parser import PageSnapshot, extract_confirmation_code, page_diagnostics, registration_approved
+
+CONFIRMATION = """<html><head><meta name="csrf-token" content="tok123"></head><body>
+<div class="circle-success"></div><h2>Approved</h2><p>Confirmation Code</p><h3>AB12CD34</h3>
+</body></html>"""
+
+
+def test_find_and_exists_match_tag_id_class_text_and_attributes():
+    snapshot = PageSnapshot('<div id="a" class="x y"><button data-property-id="1001">Select</button></div>')
+    assert snapshot.find(id='a').classes == ['x', 'y']
+    assert snapshot.find('div', class_name='y').text == 'Select'
+    assert snapshot.find('button', data_property_id='1001') is not None
+    assert snapshot.exists('button', text='Sel')
+    assert not snapshot.exists('button', text='Continue')
+
+
+def test_csrf_token_from_meta_or_hidden_input():
+    assert PageSnapshot(CONFIRMATION).csrf_token() == 'tok123'
+    assert PageSnapshot('<input type="hidden" name="_token" value="hidden456">').csrf_token() == 'hidden456'
+    assert PageSnapshot('<p>none</p>').csrf_token() is None
+
+
+def test_form_fields_limited_to_one_form():
+    snapshot = PageSnapshot('<input name="outside" value="1"><form id="f"><input name="propertyId" value="1001">'
+                            '<div><input name="formNonce" value="n"></div></form>')
+    assert snapshot.form_fields('f') == {'propertyId': '1001', 'formNonce': 'n'}
+    assert snapshot.form_fields('missing') == {}
+    assert set(snapshot.form_fields()) == {'outside', 'propertyId', 'formNonce'}
+
+
+def test_confirmation_page_is_approved_and_yields_its_code():
+    snapshot = PageSnapshot(CONFIRMATION)
+    assert registration_approved(snapshot)
+    assert extract_confirmation_code(snapshot) == 'AB12CD34'
+
+
+def test_confirmation_code_from_text_when_there_is_no_heading():
+    snapshot = PageSnapshot('<p>Your Confirmation Code: XY-99</p>')
+    assert extract_confirmation_code(snapshot) == 'XY-99'
+    assert not registration_approved(snapshot)
+    assert extract_confirmation_code(PageSnapshot('<h2>Error</h2>')) is None
+
+
+def test_stand_in_server_pages_parse(server):
+    requests = pytest.importorskip('requests')
+    response = requests.get(f"{server.base_url}/register", timeout=5)
+    snapshot = PageSnapshot(response.text, url=response.url)
+    assert snapshot.csrf_token()
+    assert snapshot.exists('button', id='confirmProperty')
+
+
+def test_confirmation_code_from_data_attribute():
+    snapshot = PageSnapshot('<button id="email-confirmation" data-confirmation-code="DATA42">Email</button>')
+    assert extract_confirmation_code(snapshot) == 'DATA42'
+
+
+def test_page_diagnostics_summarises_what_the_page_shows():
+    snapshot = PageSnapshot(
+        '<title>Register2Park</title><h1>Register</h1><p class="error">License plates do not match</p>'
+        '<div class="modal" id="emailModal" style="display: none"><input id="email" type="email"></div>'
+        '<button id="next" disabled>Next</button>', url='https://example.test/register')
+    diagnostics = page_diagnostics(snapshot)
+    assert diagnostics['url'] == 'https://example.test/register'
+    assert diagnostics['title'] == 'Register2Park'
+    assert diagnostics['headings'] == ['Register']
+    assert diagnostics['errors'] == ['License plates do not match']
+    assert diagnostics['modals'][0]['hidden'] is True
+    assert diagnostics['inputs'] == [{'tag': 'input', 'id': 'email', 'type': 'email'}]
+    assert diagnostics['buttons'] == [{'tag': 'button', 'id': 'next', 'text': 'Next', 'disabled': True}]
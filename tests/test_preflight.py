@@ -0,0 +1,123 @@
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from conftest import ROOT, make_registration
+
+VEHICLE_ENV = dict(UNIT_NUMBER='101', RESIDENT_NAME='Test Resident', GUEST_NAME='Test Guest',
+                   GUEST_PHONE='5555550100', VEHICLE_MAKE='Toyota', VEHICLE_MODEL='Camry', VEHICLE_PLATE='ABC123')
+
+
+def _levels(checks):
+    return {check.name: check.level for check in checks}
+
+
+def test_valid_registration_passes(rp):
+    assert _levels(rp.check_registration(make_registration(rp, 'ABC 123'))) == {'ABC 123: fields': 'ok'}
+
+
+def test_invalid_fields_are_reported(rp):
+    registration = make_registration(rp, 'TOO-LONG-PLATE', guest_phone='555-0100', resident_name=None,
+                                     notification_email='not-an-email', property_name='')
+    assert _levels(rp.check_registration(registration)) == {
+        'TOO-LONG-PLATE: required fields': 'error',
+        'TOO-LONG-PLATE: guest phone': 'error',
+        'TOO-LONG-PLATE: vehicle plate': 'error',
+        'TOO-LONG-PLATE: notification email': 'error',
+        'TOO-LONG-PLATE: property': 'error',
+    }
+
+
+def test_preflight_checks_engine_url_and_every_registration(rp, monkeypatch):
+    monkeypatch.setattr(rp, 'REGISTER2PARK_URL', 'register2park.com')
+    levels = _levels(rp.preflight([make_registration(rp, 'AAA111'), make_registration(rp, 'BBB222', unit_number='')],
+                                  engine='bogus'))
+    assert levels['engine'] == 'error'
+    assert levels['REGISTER2PARK_URL'] == 'error'
+    assert levels['AAA111: fields'] == 'ok'
+    assert levels['BBB222: required fields'] == 'error'
+    assert _levels(rp.preflight([], engine='http'))['registrations'] == 'error'
+
+
+def test_preflight_only_checks_the_browser_for_engines_that_use_it(rp, monkeypatch):
+    calls = []
+    monkeypatch.setattr(rp, 'check_browser', lambda: calls.append(1) or [])
+    rp.preflight([make_registration(rp, 'ABC123')], engine='http')
+    assert not calls
+    rp.preflight([make_registration(rp, 'ABC123')], engine='auto')
+    assert calls
+
+
+def _fake_install(rp, monkeypatch, chrome, chromedriver):
+    paths = {'google-chrome': '/bin/google-chrome' if chrome else None,
+             'chromedriver': '/bin/chromedriver' if chromedriver else None}
+    versions = {'/bin/google-chrome': chrome, '/bin/chromedriver': chromedriver}
+    monkeypatch.setattr(rp.shutil, 'which', paths.get)
+    monkeypatch.setattr(rp, '_command_version', versions.get)
+
+
+def test_check_browser_compares_major_versions(rp, monkeypatch):
+    _fake_install(rp, monkeypatch, '120.0.6099.109', '120.0.6099.71')
+    levels = _levels(rp.check_browser())
+    assert levels['chrome'] == levels['chromedriver'] == 'ok'
+    assert 'chrome/chromedriver versions' not in levels
+
+    _fake_install(rp, monkeypatch, '121.0.6167.85', '120.0.6099.71')
+    assert _levels(rp.check_browser())['chrome/chromedriver versions'] == 'error'
+
+
+def test_check_browser_reports_a_missing_install(rp, monkeypatch):
+    _fake_install(rp, monkeypatch, None, None)
+    levels = _levels(rp.check_browser())
+    assert levels['chrome'] == 'error'
+    assert levels['chromedriver'] == 'warning'
+
+
+def test_loaders_are_safe_to_call_from_many_threads(rp, monkeypatch):
+    pytest.importorskip('selenium')
+    # Start from an unloaded module, as at start-up
+    for name in ('webdriver', 'By', 'Options', 'WebDriverWait', 'EC', 'TimeoutException',
+                 'NoSuchElementException', 'ElementClickInterceptedException', 'requests', 'HTTPAdapter'):
+        monkeypatch.setattr(rp, name, None)
+    barrier = threading.Barrier(8)
+    seen, loaded_requests = [], []
+
+    def load():
+        barrier.wait()
+        rp.load_selenium()
+        seen.append((rp.By, rp.TimeoutException))
+        if rp.load_requests():
+            loaded_requests.append(rp.HTTPAdapter)
+
+    threads = [threading.Thread(target=load) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(seen) == 8 and all(None not in loaded for loaded in seen)
+    assert None not in loaded_requests
+
+
+def test_check_command_exits_with_the_result_and_imports_neither_engine(tmp_path):
+    script = ("import runpy, sys; sys.argv = ['register_parking.py', '--check', '--engine', 'http']\n"
+              "try:\n    runpy.run_path('register_parking.py', run_name='__main__')\n"
+              "except SystemExit as e:\n"
+              "    print('selenium' in sys.modules, 'requests' in sys.modules, e.code)")
+    env = dict(os.environ, R2P_STATE_DIR=str(tmp_path), **VEHICLE_ENV)
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env, capture_output=True, text=True,
+                            timeout=60).stdout.splitlines()
+    assert output[0] == 'OK       ABC123: fields'
+    assert 'checks in' in output[-2]
+    selenium_loaded, requests_loaded, code = output[-1].split()
+    assert (selenium_loaded, requests_loaded) == ('False', 'False')
+    # Without requests the http engine can't run, which --check reports as an error
+    assert code == ('1' if any('ERROR' in line for line in output) else '0')
+
+    env['VEHICLE_PLATE'] = 'NOT A PLATE!'
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'register_parking.py'), '--check', '--engine', 'http'],
+                            cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 1
+    assert 'ERROR    NOT A PLATE!: vehicle plate' in result.stdout
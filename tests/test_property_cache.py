@@ -0,0 +1,112 @@
+import time
+
+import pytest
+
+from conftest import make_registration
+
+
+@pytest.fixture
+def cache(rp, tmp_path):
+    return rp.PropertyCache(path=str(tmp_path / 'properties.json'), ttl=60)
+
+
+def test_entries_persist_per_site_and_expire(rp, cache, monkeypatch):
+    cache.record('Sondery, The', '1001')
+    assert rp.PropertyCache(path=cache.path, ttl=60).lookup('Sondery, The') == '1001'
+    site = rp.REGISTER2PARK_URL
+    monkeypatch.setattr(rp, 'REGISTER2PARK_URL', 'https://other.example')
+    assert cache.lookup('Sondery, The') is None
+    monkeypatch.setattr(rp, 'REGISTER2PARK_URL', site)
+
+    cache._entries[rp.REGISTER2PARK_URL]['Sondery, The']['resolved_at'] = time.time() - 120
+    assert cache.lookup('Sondery, The') is None
+    # Recording the same id again renews an expired entry
+    cache.record('Sondery, The', '1001')
+    assert cache.lookup('Sondery, The') == '1001'
+    cache.invalidate('Sondery, The')
+    assert rp.PropertyCache(path=cache.path).lookup('Sondery, The') is None
+
+
+def test_browser_shortcut_flag_only_affects_browser_lookups(cache):
+    cache.record('Sondery, The', '1001', browser_shortcut=False)
+    assert cache.lookup('Sondery, The', browser=True) is None
+    assert cache.lookup('Sondery, The') == '1001'
+    cache.record('Sondery, The', '1001')
+    assert cache.lookup('Sondery, The', browser=True) == '1001'
+
+
+def test_unwritable_path_keeps_entries_in_memory(rp, tmp_path):
+    (tmp_path / 'file').write_text('')
+    cache = rp.PropertyCache(path=str(tmp_path / 'file' / 'properties.json'))
+    cache.record('Sondery, The', '1001')
+    assert cache.lookup('Sondery, The') == '1001'
+
+
+def test_http_engine_uses_refreshes_and_replaces_cached_ids(rp, server):
+    pytest.importorskip('requests')
+    cache = rp.get_property_cache()
+    assert rp.register_parking_http(make_registration(rp, 'PC0001'))
+    assert cache.lookup('Sondery, The') == '1001'
+
+    # A cached id skips the search
+    result = rp.register_parking_http(make_registration(rp, 'PC0002'))
+    assert 'http property_search' not in result.metrics['steps']
+
+    # An expired entry is searched for again
+    cache._entries[rp.REGISTER2PARK_URL]['Sondery, The']['resolved_at'] -= cache.ttl + 1
+    result = rp.register_parking_http(make_registration(rp, 'PC0003'))
+    assert 'http property_search' in result.metrics['steps']
+
+    # An id the site doesn't accept is dropped and the search finds the right one
+    cache.record('Sondery, The', '9999')
+    result = rp.register_parking_http(make_registration(rp, 'PC0004'))
+    assert result and result.metrics['fallbacks'] == ['property cache: stale']
+    assert server.registrations[-1]['property_id'] == '1001'
+    assert cache.lookup('Sondery, The') == '1001'
+
+
+class FakeDriver:
+    def __init__(self):
+        self.visited = []
+
+    def get(self, url):
+        self.visited.append(url)
+
+
+def test_failed_browser_shortcut_falls_back_to_the_search(rp, monkeypatch):
+    """The cached selection is ignored by the site; the search then finds the
+    same id, so browser runs stop using the shortcut."""
+    rp.get_property_cache().record('Sondery, The', '1001')
+    monkeypatch.setattr(rp, 'build_registration_steps', lambda cached_property=False: cached_property)
+
+    def run_steps(driver, cached_property, context, budget=None):
+        if cached_property:
+            context['failed_step'] = 'select cached property'
+            return False
+        context['resolved_property_id'] = '1001'
+        return True
+
+    monkeypatch.setattr(rp, 'run_steps', run_steps)
+    driver, context = FakeDriver(), {}
+    assert rp._run_registration_steps(driver, make_registration(rp, 'BRW001'), context, time.monotonic())
+    assert 'failed_step' not in context
+    assert driver.visited == [rp.REGISTER_URL]
+    assert rp.get_property_cache().lookup('Sondery, The', browser=True) is None
+    assert rp.get_property_cache().lookup('Sondery, The') == '1001'
+
+
+def test_failure_after_the_shortcut_is_not_retried(rp, monkeypatch):
+    rp.get_property_cache().record('Sondery, The', '1001')
+    monkeypatch.setattr(rp, 'build_registration_steps', lambda cached_property=False: cached_property)
+    calls = []
+
+    def run_steps(driver, cached_property, context, budget=None):
+        calls.append(cached_property)
+        context['failed_step'] = 'submit vehicle form'
+        return False
+
+    monkeypatch.setattr(rp, 'run_steps', run_steps)
+    context = {}
+    assert not rp._run_registration_steps(FakeDriver(), make_registration(rp, 'BRW002'), context, time.monotonic())
+    assert calls == [True] and context['failed_step'] == 'submit vehicle form'
+    assert rp.get_property_cache().lookup('Sondery, The', browser=True) == '1001'
@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import make_registration
+from ledger import Ledger
+from register_parking import RegistrationResult
+from scheduler import Scheduler, backoff_delay
+
+HOUR = 3600
+
+
+def _result(plate, success=True):
+    return RegistrationResult(plate, success, error=None if success else 'boom')
+
+
+def _key(registration):
+    return registration.vehicle_plate
+
+
+def _scheduler(rp, plates, ledger=None, **options):
+    vehicles = {'list': [make_registration(rp, plate) for plate in plates]}
+    options.setdefault('jitter', 0)
+    scheduler = Scheduler(lambda: vehicles['list'], lambda registration: _result(registration.vehicle_plate),
+                          key=_key, ledger=ledger, **options)
+    return scheduler, vehicles
+
+
+def test_backoff_doubles_with_equal_jitter_up_to_the_cap():
+    for attempt, step in ((1, 30), (2, 60), (3, 120), (10, 1800)):
+        for _ in range(20):
+            assert step / 2 <= backoff_delay(attempt) <= step
+
+
+def test_stale_heap_entries_are_skipped(rp):
+    scheduler, _ = _scheduler(rp, [])
+    scheduler._schedule('A', 100)
+    scheduler._schedule('B', 200)
+    scheduler._schedule('A', 300)
+    assert scheduler._next_due() == 200
+    scheduler._due.pop('B')
+    assert scheduler._next_due() == 300
+    assert len(scheduler._heap) == 1
+
+
+def test_vehicles_the_ledger_shows_registered_wait_for_renewal(rp, tmp_path):
+    with Ledger(str(tmp_path / 'ledger.sqlite3')) as ledger:
+        registered_at = datetime.now(timezone.utc)
+        ledger.record(make_registration(rp, 'OLD001'), SimpleNamespace(confirmation_code='C'), timedelta(hours=24),
+                      engine='http', registered_at=registered_at)
+        scheduler, _ = _scheduler(rp, ['OLD001', 'NEW001'], ledger=ledger, renew_margin=2 * HOUR)
+        scheduler._reload()
+    expires_at = registered_at.replace(microsecond=0).timestamp() + 24 * HOUR
+    assert scheduler._due['OLD001'] == pytest.approx(expires_at - 2 * HOUR)
+    assert scheduler._due['NEW001'] == pytest.approx(time.time(), abs=5)
+
+
+def test_success_renews_before_expiry_and_failures_back_off(rp):
+    scheduler, _ = _scheduler(rp, ['OK0001', 'BAD001'], validity=24 * HOUR, renew_margin=2 * HOUR,
+                              retry_delay=lambda attempt: 60 * attempt)
+    scheduler._reload()
+    started = time.time()
+    scheduler._finished('OK0001', _result('OK0001'))
+    assert scheduler._due['OK0001'] == pytest.approx(started + 22 * HOUR, abs=5)
+    for attempt in (1, 2, 3):
+        scheduler._finished('BAD001', _result('BAD001', success=False))
+        assert scheduler._attempts['BAD001'] == attempt
+        assert scheduler._due['BAD001'] == pytest.approx(started + 60 * attempt, abs=5)
+    # A success resets the backoff
+    scheduler._finished('BAD001', _result('BAD001'))
+    assert 'BAD001' not in scheduler._attempts
+
+
+def test_reload_adds_and_removes_vehicles(rp):
+    scheduler, vehicles = _scheduler(rp, ['AAA111', 'BBB222'])
+    scheduler._reload()
+    assert set(scheduler._due) == {'AAA111', 'BBB222'}
+    vehicles['list'] = [make_registration(rp, 'BBB222'), make_registration(rp, 'CCC333'),
+                        make_registration(rp, 'DDD444', unit_number=None)]
+    scheduler._reload()
+    assert set(scheduler._registrations) == set(scheduler._due) == {'BBB222', 'CCC333'}
+    assert scheduler._next_due() is not None
+
+    # A failed reload keeps the current list
+    scheduler.load_registrations = lambda: 1 / 0
+    scheduler._reload()
+    assert set(scheduler._registrations) == {'BBB222', 'CCC333'}
+
+
+def test_removed_vehicle_is_not_rescheduled_when_its_run_finishes(rp):
+    results = []
+    scheduler, vehicles = _scheduler(rp, ['AAA111'], on_result=results.append)
+    scheduler._reload()
+    scheduler._due.pop('AAA111')  # running
+    vehicles['list'] = []
+    scheduler._reload()
+    scheduler._finished('AAA111', _result('AAA111'))
+    scheduler._finished('AAA111', _result('AAA111', success=False))
+    assert scheduler._due == {} and scheduler._attempts == {}
+    assert len(results) == 2
+
+
+def test_manifest_change_is_noticed(rp, tmp_path):
+    manifest = tmp_path / 'vehicles.csv'
+    manifest.write_text('plate\n')
+    scheduler, _ = _scheduler(rp, [], manifest_path=str(manifest))
+    scheduler._reload()
+    assert not scheduler._manifest_changed()
+    stat = os.stat(manifest)
+    os.utime(manifest, (stat.st_atime, stat.st_mtime + 10))
+    assert scheduler._manifest_changed()
+
+
+def _run_until(scheduler, condition, timeout=30):
+    thread = threading.Thread(target=scheduler.run)
+    thread.start()
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.05)
+    scheduler.stop()
+    thread.join(timeout)
+    assert not thread.is_alive()
+
+
+def test_run_limits_concurrency_and_retries(rp):
+    running, peak, lock = [0], [0], threading.Lock()
+    attempts = {}
+
+    def register(registration):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            attempts[registration.vehicle_plate] = attempts.get(registration.vehicle_plate, 0) + 1
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        # The first attempt of FLAKY1 fails
+        return _result(registration.vehicle_plate, success=registration.vehicle_plate != 'FLAKY1'
+                       or attempts['FLAKY1'] > 1)
+
+    results = []
+    plates = ['FLAKY1', 'AAA111', 'BBB222', 'CCC333']
+    scheduler = Scheduler(lambda: [make_registration(rp, plate) for plate in plates], register, key=_key,
+                          concurrency=2, jitter=0, retry_delay=lambda attempt: 0.1, on_result=results.append)
+    _run_until(scheduler, lambda: len(results) == 5)
+    assert len(results) == 5 and peak[0] == 2
+    assert attempts == {'FLAKY1': 2, 'AAA111': 1, 'BBB222': 1, 'CCC333': 1}
+    # Everyone is now waiting for their renewal
+    assert min(scheduler._due.values()) > time.time() + HOUR
+
+
+def test_daemon_registers_against_the_stand_in_server(rp, server):
+    pytest.importorskip('requests')
+    plates = ['DMN001', 'DMN002', 'DMN003']
+    results = []
+    with rp.DriverPool(size=2) as pool:
+        scheduler = rp.new_scheduler(lambda: [make_registration(rp, plate) for plate in plates], pool,
+                                     concurrency=2, engine='http', on_result=results.append)
+        _run_until(scheduler, lambda: len(results) == 3)
+    assert all(results)
+    assert sorted(registration['vehicleLicensePlate'] for registration in server.registrations) == plates
+    # A restarted daemon finds them in the ledger and waits for their renewal
+    restarted = rp.new_scheduler(lambda: [make_registration(rp, plate) for plate in plates], pool, engine='http')
+    restarted._reload()
+    assert min(restarted._due.values()) > time.time() + HOUR
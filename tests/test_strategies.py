@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from metrics import RunMetrics
+
+
+@pytest.fixture
+def cache(rp, tmp_path, monkeypatch):
+    cache = rp.StrategyCache(path=str(tmp_path / 'strategies.json'))
+    monkeypatch.setattr(rp, '_strategy_cache', cache)
+    return cache
+
+
+def _strategies(outcomes, tried):
+    """(name, attempt) pairs whose attempts log their name to `tried` and
+    return outcomes[name]; an exception outcome is raised."""
+    def attempt(name):
+        def run(driver):
+            tried.append(name)
+            if isinstance(outcomes[name], Exception):
+                raise outcomes[name]
+            return outcomes[name]
+        return run
+    return [(name, attempt(name)) for name in outcomes]
+
+
+def test_first_success_is_learned_and_tried_first_next_time(rp, cache):
+    tried = []
+    outcomes = {'click': False, 'xpath': RuntimeError('stale element'), 'js': True}
+    run = RunMetrics('selenium')
+    with run.activate():
+        assert rp.run_strategies(None, 'select property', _strategies(outcomes, tried))
+    assert tried == ['click', 'xpath', 'js']
+    assert run.fallbacks == ['select property: js']
+    assert cache.preferred('select property') == 'js'
+
+    tried.clear()
+    assert rp.run_strategies(None, 'select property', _strategies(outcomes, tried))
+    assert tried == ['js']
+
+
+def test_learned_strategy_that_stops_working_is_relearned(rp, cache):
+    cache.record_success('rules popup', 'js')
+    tried = []
+    assert rp.run_strategies(None, 'rules popup', _strategies({'click': False, 'xpath': True, 'js': False}, tried))
+    # The learned one first, then the rest in their usual order
+    assert tried == ['js', 'click', 'xpath']
+    assert cache.preferred('rules popup') == 'xpath'
+
+
+def test_nothing_working_forgets_the_step(rp, cache):
+    cache.record_success('next button', 'click')
+    assert not rp.run_strategies(None, 'next button', _strategies({'click': False, 'js': False}, []))
+    assert cache.preferred('next button') is None
+    assert json.load(open(cache.path)) == {rp.REGISTER2PARK_URL: {}}
+
+
+def test_entries_are_kept_per_site(rp, cache, monkeypatch):
+    cache.record_success('select property', 'xpath')
+    site = rp.REGISTER2PARK_URL
+    monkeypatch.setattr(rp, 'REGISTER2PARK_URL', 'https://staging.example')
+    assert cache.preferred('select property') is None
+    cache.record_success('select property', 'js')
+    assert cache.preferred('select property') == 'js'
+    saved = json.load(open(cache.path))
+    assert {url: entries['select property']['strategy'] for url, entries in saved.items()} == \
+        {site: 'xpath', 'https://staging.example': 'js'}
+
+
+def test_file_is_rewritten_only_when_the_preferred_strategy_changes(rp, cache, monkeypatch):
+    writes = []
+    write = rp._write_json_atomic
+    monkeypatch.setattr(rp, '_write_json_atomic', lambda path, data: writes.append(path) or write(path, data))
+    for _ in range(5):
+        cache.record_success('select property', 'xpath')
+    assert len(writes) == 1
+    assert cache._entries[rp.REGISTER2PARK_URL]['select property']['successes'] == 5
+    cache.record_success('select property', 'js')
+    cache.invalidate('select property')
+    cache.invalidate('select property')
+    assert len(writes) == 3
+    # A fresh cache reads back what was saved
+    assert rp.StrategyCache(path=cache.path).preferred('select property') is None
+
+
+def test_empty_path_keeps_strategies_in_memory(rp, monkeypatch):
+    monkeypatch.setattr(rp, '_write_json_atomic', lambda path, data: pytest.fail(f"wrote {path}"))
+    cache = rp.StrategyCache(path='')
+    cache.record_success('select property', 'js')
+    assert cache.preferred('select property') == 'js'
@@ -0,0 +1,94 @@
+import json
+
+from tracing import NetworkTrace, load_trace, main, summarise
+
+PAGE_TIMING = ['https://example.test/register',
+               {'start': 1000.0, 'ttfb': 50.2, 'dom_interactive': 120.0, 'dom_content_loaded': 130.0,
+                'load': 300.0, 'transfer_bytes': 5000},
+               ['https://example.test/app.js']]
+
+
+def event(method, **params):
+    return {'message': json.dumps({'message': {'method': method, 'params': params}})}
+
+
+class FakeDriver:
+    """Serves queued performance-log batches, one per get_log() call."""
+
+    def __init__(self, *batches):
+        self.batches = list(batches)
+
+    def get_log(self, kind):
+        assert kind == 'performance'
+        return self.batches.pop(0) if self.batches else []
+
+    def execute_cdp_cmd(self, command, params):
+        return {'metrics': [{'name': 'JSHeapUsedSize', 'value': 123.0}]}
+
+    def execute_script(self, script):
+        return PAGE_TIMING
+
+
+OPEN_PAGE = [
+    event('Network.requestWillBeSent', requestId='1', timestamp=10.0, type='Document',
+          request={'url': 'https://example.test/register', 'method': 'GET'}, initiator={'type': 'other'}),
+    event('Network.responseReceived', requestId='1', type='Document',
+          response={'status': 200, 'timing': {'sendStart': 1.0, 'receiveHeadersEnd': 41.0}}),
+    event('Network.loadingFinished', requestId='1', timestamp=10.2, encodedDataLength=5000),
+    event('Network.requestWillBeSent', requestId='2', timestamp=10.21, type='Script',
+          request={'url': 'https://example.test/app.js', 'method': 'GET'}, initiator={'type': 'parser'}),
+    event('Network.responseReceived', requestId='2', type='Script', response={'status': 200, 'fromDiskCache': True}),
+    event('Network.loadingFinished', requestId='2', timestamp=10.9, encodedDataLength=90000),
+    event('Network.requestWillBeSent', requestId='3', timestamp=10.3, type='Image',
+          request={'url': 'https://example.test/logo.png', 'method': 'GET'}),
+    event('Network.loadingFailed', requestId='3', timestamp=10.31, errorText='net::ERR_BLOCKED_BY_CLIENT',
+          blockedReason='inspector'),
+]
+SUBMIT = [
+    event('Network.requestWillBeSent', requestId='4', timestamp=11.0, type='XHR',
+          request={'url': 'https://example.test/api', 'method': 'POST'}),
+    event('Network.loadingFailed', requestId='4', timestamp=11.5, errorText='net::ERR_FAILED'),
+]
+
+
+def test_trace_builds_waterfall_attributed_to_steps(tmp_path):
+    # The first batch is left over from before the run and is dropped
+    stale = [event('Network.requestWillBeSent', requestId='old', timestamp=1.0,
+                   request={'url': 'https://example.test/old', 'method': 'GET'})]
+    trace = NetworkTrace(FakeDriver(stale, OPEN_PAGE, SUBMIT), label='ABC 123')
+    trace.step('open register page')
+    path, summary = trace.finish(str(tmp_path), {'vehicle_plate': 'ABC 123', 'success': False})
+
+    saved = load_trace(path)
+    assert saved['vehicle_plate'] == 'ABC 123'
+    assert saved['metrics'] == {'JSHeapUsedSize': 123.0}
+    rows = [dict(zip(saved['request_columns'], row)) for row in saved['requests']]
+    assert [row['url'].rsplit('/', 1)[1] for row in rows] == ['register', 'app.js', 'logo.png', 'api']
+    document, script = rows[0], rows[1]
+    assert (document['start_ms'], document['duration_ms'], document['ttfb_ms']) == (0.0, 200.0, 40.0)
+    assert script['from_cache'] and script['render_blocking'] and script['step'] == 'open register page'
+    assert rows[3]['step'] == 'finish'
+
+    assert summary['requests'] == 4 and summary['bytes'] == 95000
+    assert summary['by_step'] == {'open register page': {'requests': 3, 'bytes': 95000},
+                                  'finish': {'requests': 1, 'bytes': 0}}
+    assert [request['url'] for request in summary['slowest']] == ['https://example.test/app.js',
+                                                                   'https://example.test/register']
+    assert [request['url'] for request in summary['render_blocking_scripts']] == ['https://example.test/app.js']
+    assert summary['blocked'] == ['https://example.test/logo.png']
+    assert summary['failed'] == ['https://example.test/api']
+    assert summary['pages'][0]['timing']['ttfb'] == 50.2
+    assert summarise(saved) == summary
+
+
+def test_only_the_newest_traces_are_kept(tmp_path):
+    for _ in range(4):
+        NetworkTrace(FakeDriver(), label='run').finish(str(tmp_path), keep=2)
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_command_line_summary(tmp_path, capsys):
+    trace = NetworkTrace(FakeDriver([], OPEN_PAGE), label='cli')
+    path, _ = trace.finish(str(tmp_path))
+    assert main([path, '--json']) == 0
+    assert json.loads(capsys.readouterr().out)['blocked'] == ['https://example.test/logo.png']
@@ -0,0 +1,84 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import user_data
+from user_data import UserDataStore
+
+pytestmark = pytest.mark.skipif(user_data.fcntl is None, reason='profile locking needs fcntl')
+
+
+def _write(path, size=1):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'0' * size)
+
+
+def test_concurrent_checkouts_get_separate_slots(tmp_path):
+    store = UserDataStore(str(tmp_path))
+    first, second = store.checkout(), store.checkout()
+    assert first.path != second.path
+    store.release(first)
+    # A released slot is the first to be handed out again
+    assert store.checkout().path == first.path
+
+
+def test_slot_held_by_another_process_is_not_shared(tmp_path):
+    store = UserDataStore(str(tmp_path))
+    held = store.checkout()
+    other = subprocess.run(
+        [sys.executable, '-c', 'import sys; from user_data import UserDataStore; '
+                               'print(UserDataStore(sys.argv[1]).checkout().path)', str(tmp_path)],
+        capture_output=True, text=True, check=True,
+        env=dict(os.environ, PYTHONPATH=os.path.dirname(user_data.__file__)),
+    ).stdout.strip()
+    assert other != held.path
+    store.release(held)
+
+
+def test_session_state_is_cleared_and_caches_kept(tmp_path):
+    store = UserDataStore(str(tmp_path))
+    slot = store.checkout()
+    for name in ('Default/Network/Cookies', 'Default/Local Storage/leveldb/000003.log', 'Default/Web Data',
+                 'SingletonLock', 'Default/Cache/Cache_Data/data_0', 'Default/Code Cache/js/index'):
+        _write(os.path.join(slot.path, name))
+    store.release(slot)
+    assert not os.path.exists(os.path.join(slot.path, 'Default/Network/Cookies'))
+    assert not os.path.exists(os.path.join(slot.path, 'Default/Local Storage'))
+    assert not os.path.exists(os.path.join(slot.path, 'Default/Web Data'))
+    assert not os.path.exists(os.path.join(slot.path, 'SingletonLock'))
+    assert os.path.exists(os.path.join(slot.path, 'Default/Cache/Cache_Data/data_0'))
+    assert os.path.exists(os.path.join(slot.path, 'Default/Code Cache/js/index'))
+
+
+def test_cleanup_empties_oversized_caches_and_removes_unused_slots(tmp_path):
+    store = UserDataStore(str(tmp_path), max_cache_bytes=1000, max_age=3600)
+    big, stale, busy = store.checkout(), store.checkout(), store.checkout()
+    for slot in (big, stale, busy):
+        _write(os.path.join(slot.path, 'Default/Cache/data'), 5000)
+        _write(os.path.join(slot.path, 'Preferences'))
+    store.release(big)
+    store.release(stale)
+    old = time.time() - 7200
+    os.utime(os.path.join(str(tmp_path), 'slot-1.lock'), (old, old))
+
+    assert store.cleanup(force=True) == 2
+    assert not os.path.exists(os.path.join(big.path, 'Default/Cache'))
+    assert os.path.exists(os.path.join(big.path, 'Preferences'))
+    assert not os.path.exists(stale.path)
+    # Slots in use are never touched
+    assert os.path.exists(os.path.join(busy.path, 'Default/Cache/data'))
+
+
+def test_cleanup_runs_at_most_once_per_interval(tmp_path):
+    store = UserDataStore(str(tmp_path), max_cache_bytes=1000, cleanup_interval=3600)
+    slot = store.checkout()
+    store.release(slot)
+    _write(os.path.join(slot.path, 'Default/Cache/data'), 5000)
+    assert store.cleanup(force=True) == 1
+    _write(os.path.join(slot.path, 'Default/Cache/data'), 5000)
+    assert store.cleanup() == 0
+    assert os.path.exists(os.path.join(slot.path, 'Default/Cache/data'))
@@ -0,0 +1,195 @@
+import multiprocessing
+import sqlite3
+import time
+
+import pytest
+
+from conftest import make_registration
+from work_queue import DEAD, DONE, LEASED, QUEUED, SQLiteWorkQueue, WorkQueue, open_queue
+
+
+@pytest.fixture
+def work_queue(tmp_path):
+    work_queue = SQLiteWorkQueue(str(tmp_path / 'queue.sqlite3'))
+    yield work_queue
+    work_queue.close()
+
+
+def _state(work_queue, job):
+    conn = sqlite3.connect(work_queue.path)
+    try:
+        return conn.execute('SELECT state FROM jobs WHERE id = ?', (job.id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_enqueue_is_idempotent(work_queue):
+    assert work_queue.enqueue('ABC|Sondery|1', 'Sondery', {'vehicle_plate': 'ABC'})
+    assert not work_queue.enqueue('ABC|Sondery|1', 'Sondery', {'vehicle_plate': 'ABC'})
+    assert work_queue.counts() == {QUEUED: 1}
+
+
+def test_lease_hands_each_job_to_one_owner(work_queue):
+    work_queue.enqueue('a', 'P1', {'n': 1})
+    work_queue.enqueue('b', 'P2', {'n': 2})
+    first = work_queue.lease('w1', 60)
+    second = work_queue.lease('w2', 60)
+    assert {first.payload['n'], second.payload['n']} == {1, 2}
+    assert first.attempts == second.attempts == 1
+    assert work_queue.lease('w3', 60) is None
+    assert work_queue.counts() == {LEASED: 2}
+
+
+def test_job_is_not_available_before_available_at(work_queue):
+    work_queue.enqueue('a', 'P', {}, available_at=time.time() + 60)
+    assert work_queue.lease('w1', 60) is None
+    assert work_queue.next_available() > time.time() + 50
+
+
+def test_expired_lease_is_redelivered_and_only_the_new_holder_can_finish(work_queue):
+    work_queue.enqueue('a', 'P', {})
+    stale = work_queue.lease('w1', 0.05)
+    time.sleep(0.1)
+    current = work_queue.lease('w2', 60)
+    assert current.id == stale.id
+    assert current.attempts == 2
+    assert not work_queue.complete(stale, {'by': 'w1'})
+    assert work_queue.complete(current, {'by': 'w2'})
+    assert _state(work_queue, current) == DONE
+
+
+def test_fail_requeues_with_retry_at_or_marks_dead(work_queue):
+    work_queue.enqueue('a', 'P', {})
+    job = work_queue.lease('w1', 60)
+    assert work_queue.fail(job, 'boom', retry_at=time.time() + 60)
+    assert _state(work_queue, job) == QUEUED
+    assert work_queue.lease('w1', 60) is None
+
+    work_queue.enqueue('b', 'P2', {})
+    job = work_queue.lease('w1', 60)
+    assert work_queue.fail(job, 'boom')
+    assert _state(work_queue, job) == DEAD
+
+
+def test_property_rate_limit_spans_owners_and_next_available_accounts_for_it(work_queue):
+    work_queue.enqueue('a', 'P', {})
+    work_queue.enqueue('b', 'P', {})
+    work_queue.enqueue('c', 'Other', {})
+    started = time.time()
+    assert work_queue.lease('w1', 60, min_interval=30).property_name == 'P'
+    # The other property isn't held back, the second job at P is
+    assert work_queue.lease('w2', 60, min_interval=30).property_name == 'Other'
+    assert work_queue.lease('w2', 60, min_interval=30) is None
+    assert work_queue.next_available(min_interval=30) == pytest.approx(started + 30, abs=1)
+
+
+def test_purge_deletes_only_old_finished_jobs(work_queue):
+    for key in ('done', 'dead', 'queued', 'leased'):
+        work_queue.enqueue(key, key, {})
+    work_queue.complete(work_queue.lease('w1', 60), {})
+    work_queue.fail(work_queue.lease('w1', 60), 'boom')
+    work_queue.lease('w1', 60)
+    assert work_queue.purge(60) == 0
+    assert work_queue.purge(0) == 2
+    assert work_queue.counts() == {QUEUED: 1, LEASED: 1}
+
+
+def test_backends_must_implement_the_whole_interface(work_queue):
+    with pytest.raises(TypeError):
+        WorkQueue()
+
+    class Partial(WorkQueue):
+        def enqueue(self, idempotency_key, property_name, payload, available_at=None):
+            return True
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_open_queue_urls(tmp_path):
+    for url in (str(tmp_path / 'plain.sqlite3'), f"sqlite://{tmp_path}/url.sqlite3"):
+        work_queue = open_queue(url)
+        assert isinstance(work_queue, SQLiteWorkQueue)
+        work_queue.close()
+    with pytest.raises(ValueError):
+        open_queue('redis://localhost/0')
+
+
+def _lease_all(path, owner, results):
+    work_queue = SQLiteWorkQueue(path)
+    leased = []
+    while True:
+        job = work_queue.lease(owner, 60)
+        if job is None:
+            break
+        leased.append(job.payload['n'])
+        work_queue.complete(job, {'owner': owner})
+    work_queue.close()
+    results.put(leased)
+
+
+def test_processes_sharing_a_queue_never_take_the_same_job(work_queue):
+    for n in range(40):
+        work_queue.enqueue(f"job-{n}", f"P{n}", {'n': n})
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_lease_all, args=(work_queue.path, f"w{i}", results))
+                 for i in range(3)]
+    for process in processes:
+        process.start()
+    leased = [n for _ in processes for n in results.get(timeout=30)]
+    for process in processes:
+        process.join(timeout=30)
+    assert sorted(leased) == list(range(40))
+    assert work_queue.counts() == {DONE: 40}
+
+
+def test_enqueue_registrations_skips_incomplete_and_duplicate(rp, work_queue):
+    registrations = [make_registration(rp, 'ABC123'), make_registration(rp, 'abc 123'),
+                     make_registration(rp, 'XYZ789', guest_phone=None)]
+    assert rp.enqueue_registrations(work_queue, registrations) == 1
+    assert work_queue.counts() == {QUEUED: 1}
+
+
+def test_worker_runs_queued_registrations_against_the_server(rp, server, work_queue, monkeypatch):
+    pytest.importorskip('requests')
+    monkeypatch.setattr(rp, 'PROPERTY_RATE_LIMIT', 0)
+    monkeypatch.setattr(rp, 'RETRY_BASE_SECONDS', 0.01)
+    plates = [f"WQ{n:03d}" for n in range(6)]
+    rp.enqueue_registrations(work_queue, [make_registration(rp, plate) for plate in plates])
+    results = []
+    worker = rp.Worker(work_queue, concurrency=2, engine='http', on_result=results.append, exit_when_idle=True)
+    worker.run()
+    assert sorted(result.vehicle_plate for result in results) == plates
+    assert all(results)
+    assert work_queue.counts() == {DONE: 6}
+    assert sorted(registration['vehicleLicensePlate'] for registration in server.registrations) == plates
+
+
+def test_worker_skips_a_redelivered_job_the_ledger_shows_done(rp, server, work_queue):
+    pytest.importorskip('requests')
+    registration = make_registration(rp, 'DONE01')
+    assert rp.run_registration(registration, engine='http')
+    rp.enqueue_registrations(work_queue, [registration])
+    results = []
+    rp.Worker(work_queue, engine='http', on_result=results.append, exit_when_idle=True).run()
+    assert [result.skipped for result in results] == [True]
+    assert len(server.registrations) == 1
+
+
+def test_worker_retries_failures_and_purges_finished_jobs(rp, server, work_queue, monkeypatch):
+    pytest.importorskip('requests')
+    monkeypatch.setattr(rp, 'PROPERTY_RATE_LIMIT', 0)
+    monkeypatch.setattr(rp, 'RETRY_BASE_SECONDS', 0.01)
+    monkeypatch.setattr(rp, 'MAX_ATTEMPTS', 2)
+    monkeypatch.setattr(rp, 'QUEUE_RETENTION_HOURS', 0)
+    server.fail_endpoints.add('vehicle_information')
+    rp.enqueue_registrations(work_queue, [make_registration(rp, 'FAIL01')])
+    results = []
+    worker = rp.Worker(work_queue, engine='http', on_result=results.append, exit_when_idle=True)
+    worker.run()
+    assert [result.success for result in results] == [False, False]
+    assert work_queue.counts() == {DEAD: 1}
+    # The dead job is purged on the next idle check
+    worker._next_purge = 0
+    worker._idle()
+    assert work_queue.counts() == {}
@@ -0,0 +1,270 @@
+"""Network and performance traces of browser registrations.
+
+With tracing enabled, Chrome is started with its performance log turned on,
+which records the DevTools Network and Page events of every request. A
+NetworkTrace collects those events for one registration, adds the page's own
+Navigation and Resource Timing entries and the CDP Performance metrics, and
+writes them as a compact gzipped JSON file. Requests are attributed to the
+registration step during which they started:
+
+    pages     one entry per document: URL and navigation timing (ms)
+    requests  the waterfall, one row per request, columns in REQUEST_COLUMNS
+    metrics   Performance.getMetrics at the end of the run
+
+summarise() condenses a trace into what to look at first (slowest
+resources, render-blocking scripts, bytes by type, blocked requests), and
+`python tracing.py TRACE...` prints that summary for saved traces.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+# Chrome options that make the driver record DevTools events in its
+# 'performance' log
+LOGGING_PREFS = {'performance': 'ALL'}
+PERF_LOGGING_PREFS = {'enableNetwork': True, 'enablePage': True}
+
+REQUEST_COLUMNS = (
+    'start_ms', 'duration_ms', 'ttfb_ms', 'type', 'method', 'status', 'bytes',
+    'from_cache', 'render_blocking', 'initiator', 'failure', 'step', 'url',
+)
+
+# Navigation timing of the current document and Resource Timing's view of
+# which resources blocked rendering, in one script call
+PAGE_TIMING_SCRIPT = """
+    const nav = performance.getEntriesByType('navigation')[0];
+    const timing = nav ? {
+        start: performance.timeOrigin,
+        ttfb: nav.responseStart,
+        dom_interactive: nav.domInteractive,
+        dom_content_loaded: nav.domContentLoadedEventEnd,
+        load: nav.loadEventEnd,
+        transfer_bytes: nav.transferSize,
+    } : null;
+    const blocking = performance.getEntriesByType('resource')
+        .filter(function (entry) { return entry.renderBlockingStatus === 'blocking'; })
+        .map(function (entry) { return entry.name; });
+    return [location.href, timing, blocking];
+"""
+
+
+def configure_options(options):
+    """Turn on the performance log in Chrome `options`."""
+    options.set_capability('goog:loggingPrefs', LOGGING_PREFS)
+    options.add_experimental_option('perfLoggingPrefs', PERF_LOGGING_PREFS)
+
+
+class NetworkTrace:
+    """Collects the network waterfall and timings of one registration."""
+
+    def __init__(self, driver, label=None):
+        self.driver = driver
+        self.label = label
+        self.started_at = datetime.now(timezone.utc)
+        self.pages = []
+        self._requests = {}
+        self._render_blocking = set()
+        self._origin = None
+        # Events left in the log by whatever used this browser before
+        self._drain()
+        try:
+            driver.execute_cdp_cmd('Performance.enable', {})
+        except Exception:
+            pass
+
+    def _drain(self):
+        try:
+            return self.driver.get_log('performance')
+        except Exception:
+            return []
+
+    def collect(self, step=None):
+        """Fold the DevTools events logged since the last call into the
+        waterfall, attributing requests they start to `step`."""
+        for entry in self._drain():
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            self._event(message.get('method', ''), message.get('params', {}), step)
+
+    def step(self, name):
+        """Called after each step: record the requests it made and the page it left."""
+        self.sample_page()
+        self.collect(name)
+
+    def _event(self, method, params, step=None):
+        if not method.startswith('Network.') or 'requestId' not in params:
+            return
+        request = self._requests.setdefault(params['requestId'], {})
+        if method == 'Network.requestWillBeSent':
+            if self._origin is None:
+                self._origin = params['timestamp']
+            # A redirect reuses the request id; keep the final hop's URL but the first start
+            request.setdefault('start', params['timestamp'])
+            request.setdefault('step', step)
+            request.update(
+                url=params['request']['url'], method=params['request']['method'],
+                type=params.get('type'), initiator=params.get('initiator', {}).get('type'),
+            )
+        elif method == 'Network.responseReceived':
+            response = params['response']
+            timing = response.get('timing') or {}
+            request.update(
+                status=response.get('status'), type=params.get('type') or request.get('type'),
+                from_cache=bool(response.get('fromDiskCache') or response.get('fromServiceWorker')),
+                ttfb=(timing['receiveHeadersEnd'] - timing['sendStart'])
+                if 'receiveHeadersEnd' in timing and 'sendStart' in timing else None,
+            )
+        elif method == 'Network.loadingFinished':
+            request.update(end=params['timestamp'], bytes=params.get('encodedDataLength'))
+        elif method == 'Network.loadingFailed':
+            request.update(end=params['timestamp'],
+                           failure=params.get('blockedReason') and f"blocked:{params['blockedReason']}"
+                           or params.get('errorText') or 'failed')
+
+    def sample_page(self):
+        """Record the current document's navigation timing, once per document."""
+        try:
+            url, timing, blocking = self.driver.execute_script(PAGE_TIMING_SCRIPT)
+        except Exception:
+            return
+        self._render_blocking.update(blocking or [])
+        if timing and not any(page['timing'] and page['timing']['start'] == timing['start'] for page in self.pages):
+            self.pages.append({'url': url, 'timing': {key: round(value, 1) for key, value in timing.items()}})
+
+    def _metrics(self):
+        try:
+            metrics = self.driver.execute_cdp_cmd('Performance.getMetrics', {})['metrics']
+        except Exception:
+            return {}
+        return {metric['name']: round(metric['value'], 4) for metric in metrics}
+
+    def rows(self):
+        """The waterfall as rows of REQUEST_COLUMNS, in start order."""
+        rows = []
+        for request in self._requests.values():
+            if 'url' not in request or self._origin is None:
+                continue
+            start = request['start']
+            rows.append([
+                round((start - self._origin) * 1000, 1),
+                round((request['end'] - start) * 1000, 1) if 'end' in request else None,
+                round(request['ttfb'], 1) if request.get('ttfb') is not None else None,
+                request.get('type'), request.get('method'), request.get('status'), request.get('bytes'),
+                request.get('from_cache', False), request['url'] in self._render_blocking,
+                request.get('initiator'), request.get('failure'), request.get('step'), request['url'],
+            ])
+        return sorted(rows, key=lambda row: row[0])
+
+    def finish(self, directory, summary=None, keep=50):
+        """Collect what's left, write the trace and `summary` (a dict describing
+        the run) to `directory`, keeping the newest `keep` traces there, and
+        return (path, summarise(trace))."""
+        self.sample_page()
+        self.collect('finish')
+        trace = dict(summary or {}, label=self.label, started_at=self.started_at.isoformat(timespec='seconds'),
+                     pages=self.pages, request_columns=REQUEST_COLUMNS, requests=self.rows(),
+                     metrics=self._metrics())
+        os.makedirs(directory, exist_ok=True)
+        stamp = self.started_at.strftime('%Y%m%dT%H%M%SZ')
+        name = ''.join(c if c.isalnum() or c in '-_' else '-' for c in str(self.label or 'run'))[:40]
+        path = os.path.join(directory, f"{stamp}-{name}-{os.urandom(3).hex()}.json.gz")
+        with gzip.open(path, 'wt') as f:
+            json.dump(trace, f, separators=(',', ':'))
+        _prune(directory, keep)
+        return path, summarise(trace)
+
+
+def _prune(directory, keep):
+    """Delete all but the `keep` most recent traces."""
+    try:
+        traces = sorted(name for name in os.listdir(directory) if name.endswith('.json.gz'))
+    except OSError:
+        return
+    for name in traces[:-keep] if keep else []:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def summarise(trace, top=5):
+    """Condense a trace (as written by NetworkTrace.finish) into totals, the
+    slowest requests, render-blocking scripts and blocked requests."""
+    requests = [dict(zip(trace['request_columns'], row)) for row in trace['requests']]
+    by_type = {}
+    for request in requests:
+        totals = by_type.setdefault(request['type'] or 'Other', {'requests': 0, 'bytes': 0})
+        totals['requests'] += 1
+        totals['bytes'] += request['bytes'] or 0
+    by_step = {}
+    for request in requests:
+        totals = by_step.setdefault(request['step'] or 'start', {'requests': 0, 'bytes': 0})
+        totals['requests'] += 1
+        totals['bytes'] += request['bytes'] or 0
+    finished = [request for request in requests if request['duration_ms'] is not None and not request['failure']]
+
+    def brief(request):
+        return {'url': request['url'], 'step': request['step'], 'duration_ms': request['duration_ms'],
+                'ttfb_ms': request['ttfb_ms'], 'bytes': request['bytes']}
+
+    return {
+        'requests': len(requests),
+        'bytes': sum(request['bytes'] or 0 for request in requests),
+        'by_type': by_type,
+        'by_step': by_step,
+        'slowest': [brief(request) for request in sorted(finished, key=lambda r: -r['duration_ms'])[:top]],
+        'render_blocking_scripts': [brief(request) for request in requests
+                                    if request['render_blocking'] and request['type'] == 'Script'],
+        'blocked': [request['url'] for request in requests if (request['failure'] or '').startswith('blocked:')],
+        'failed': [request['url'] for request in requests
+                   if request['failure'] and not request['failure'].startswith('blocked:')],
+        'pages': trace['pages'],
+    }
+
+
+def load_trace(path):
+    with gzip.open(path, 'rt') as f:
+        return json.load(f)
+
+
+def print_summary(path, summary):
+    print(f"{path}: {summary['requests']} requests, {summary['bytes'] / 1024:.0f} KiB")
+    for page in summary['pages']:
+        timing = page['timing']
+        print(f"  page {page['url']}: ttfb {timing['ttfb']} ms, DOMContentLoaded {timing['dom_content_loaded']} ms, "
+              f"load {timing['load']} ms")
+    for kind, totals in sorted(summary['by_type'].items(), key=lambda item: -item[1]['bytes']):
+        print(f"  {kind:<12} {totals['requests']:>4} requests {totals['bytes'] / 1024:>8.0f} KiB")
+    for step, totals in summary['by_step'].items():
+        print(f"  step {step:<24} {totals['requests']:>4} requests {totals['bytes'] / 1024:>8.0f} KiB")
+    for request in summary['slowest']:
+        print(f"  slow    {request['duration_ms']:>8.1f} ms  {request['url']} ({request['step']})")
+    for request in summary['render_blocking_scripts']:
+        print(f"  blocking script {request['duration_ms']} ms  {request['url']}")
+    for url in summary['blocked']:
+        print(f"  blocked {url}")
+    for url in summary['failed']:
+        print(f"  failed  {url}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarise registration network traces')
+    parser.add_argument('traces', nargs='+', help='Trace files (.json.gz) written with TRACE_DIR set')
+    parser.add_argument('--json', action='store_true', help='Print the summaries as JSON lines')
+    args = parser.parse_args(argv)
+    for path in args.traces:
+        summary = summarise(load_trace(path))
+        if args.json:
+            print(json.dumps(dict(summary, trace=path)))
+        else:
+            print_summary(path, summary)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
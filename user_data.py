@@ -0,0 +1,176 @@
+"""Persistent Chrome user-data directories that keep the browser's caches.
+
+A throwaway profile means every browser start downloads the site's static
+assets again and recompiles its scripts. A UserDataStore instead hands out
+long-lived user-data directories (slot-0, slot-1, ... under the store), each
+held with an exclusive lock for as long as its browser runs, so concurrent
+browsers in any number of processes never share one. Session state (cookies,
+storage, autofill data, open tabs) is deleted whenever a slot is taken or
+given back; the HTTP cache and the compiled-script code cache are kept.
+
+Cleanup runs at most once per `cleanup_interval`: slots nobody has used for
+`max_age` are deleted, and the caches of slots that have grown beyond
+`max_cache_bytes` are emptied. Locking needs fcntl, so on platforms without
+it the store is unavailable and browsers use throwaway profiles.
+"""
+import os
+import shutil
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Session state in a user-data directory, relative to it. The Singleton*
+# files are left behind by a Chrome that didn't exit cleanly.
+SESSION_STATE = (
+    'Default/Cookies', 'Default/Cookies-journal',
+    'Default/Network/Cookies', 'Default/Network/Cookies-journal',
+    'Default/Local Storage', 'Default/Session Storage', 'Default/IndexedDB',
+    'Default/Service Worker', 'Default/Web Data', 'Default/Web Data-journal',
+    'Default/Login Data', 'Default/Login Data-journal',
+    'Default/History', 'Default/History-journal',
+    'Default/Sessions', 'Default/Current Session', 'Default/Current Tabs',
+    'Default/Last Session', 'Default/Last Tabs',
+    'SingletonLock', 'SingletonSocket', 'SingletonCookie',
+)
+
+# What is kept between runs and emptied when a slot outgrows its budget
+CACHE_DIRS = (
+    'Default/Cache', 'Default/Code Cache', 'Default/GPUCache',
+    'ShaderCache', 'GrShaderCache', 'GraphiteDawnCache',
+)
+
+CLEANUP_MARKER = '.last-cleanup'
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class ProfileSlot:
+    """A user-data directory checked out of a UserDataStore."""
+
+    def __init__(self, path, lock_file):
+        self.path = path
+        self._lock_file = lock_file
+
+    def __repr__(self):
+        return f"ProfileSlot({self.path!r})"
+
+
+class UserDataStore:
+    """Persistent user-data directories under `directory`, one per running browser."""
+
+    def __init__(self, directory, max_cache_bytes=200 * 1024 * 1024, cleanup_interval=24 * 3600,
+                 max_age=14 * 24 * 3600):
+        self.directory = directory
+        self.max_cache_bytes = max_cache_bytes
+        self.cleanup_interval = cleanup_interval
+        self.max_age = max_age
+
+    @property
+    def available(self):
+        return fcntl is not None
+
+    def _lock_path(self, index):
+        # Outside the slot, so deleting the slot never removes a held lock
+        return os.path.join(self.directory, f"slot-{index}.lock")
+
+    def _try_lock(self, index):
+        lock_file = open(self._lock_path(index), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _slots(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted(int(name[5:-5]) for name in names
+                      if name.startswith('slot-') and name.endswith('.lock') and name[5:-5].isdigit())
+
+    def checkout(self):
+        """Lock the lowest-numbered free slot, creating one if all are in use,
+        clear its session state and return it as a ProfileSlot."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.cleanup()
+        index = 0
+        while True:
+            lock_file = self._try_lock(index)
+            if lock_file is not None:
+                break
+            index += 1
+        path = os.path.join(self.directory, f"slot-{index}")
+        os.makedirs(path, exist_ok=True)
+        self.clear_session(path)
+        # The lock file's mtime records when the slot was last used
+        os.utime(self._lock_path(index))
+        return ProfileSlot(path, lock_file)
+
+    def release(self, slot):
+        """Clear the session state of a slot whose browser has quit and unlock it."""
+        try:
+            self.clear_session(slot.path)
+        finally:
+            slot._lock_file.close()
+
+    def clear_session(self, path):
+        """Delete cookies, storage and other session state, keeping the caches."""
+        for name in SESSION_STATE:
+            _remove(os.path.join(path, name))
+
+    def cleanup(self, force=False):
+        """Delete slots unused for `max_age` and empty the caches of slots over
+        `max_cache_bytes`, unless that was done less than `cleanup_interval`
+        ago. Slots in use are left alone. Returns the number of slots changed."""
+        marker = os.path.join(self.directory, CLEANUP_MARKER)
+        try:
+            if not force and time.time() - os.path.getmtime(marker) < self.cleanup_interval:
+                return 0
+        except OSError:
+            pass
+        with open(marker, 'a'):
+            os.utime(marker)
+
+        changed = 0
+        for index in self._slots():
+            lock_file = self._try_lock(index)
+            if lock_file is None:
+                continue
+            try:
+                path = os.path.join(self.directory, f"slot-{index}")
+                if time.time() - os.path.getmtime(self._lock_path(index)) > self.max_age:
+                    # The lock file stays: removing it could let two processes lock different files
+                    if os.path.exists(path):
+                        _remove(path)
+                        changed += 1
+                elif _size(path) > self.max_cache_bytes:
+                    for name in CACHE_DIRS:
+                        _remove(os.path.join(path, name))
+                    changed += 1
+            finally:
+                lock_file.close()
+        return changed
@@ -0,0 +1,235 @@
+"""Shared work queue for spreading registrations across worker processes.
+
+Jobs are leased rather than popped: a worker that takes a job holds it until
+its lease runs out, and a job whose worker died becomes available again once
+the lease expires (at-least-once delivery). Each job carries an idempotency
+key, so enqueueing the same registration twice in one validity window adds
+it once. Lease selection also enforces a minimum interval between job starts
+per property, shared by every worker, so adding workers doesn't hammer the
+site.
+
+Backends implement WorkQueue; open_queue() picks one from a URL. The SQLite
+backend works for any number of processes on one host, or on several hosts
+sharing a filesystem with working POSIX locks.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional
+
+QUEUED, LEASED, DONE, DEAD = 'queued', 'leased', 'done', 'dead'
+
+
+@dataclass
+class Job:
+    """A leased job. `payload` is the registration record it was enqueued with."""
+    id: int
+    idempotency_key: str
+    property_name: str
+    payload: dict
+    attempts: int
+    lease_owner: Optional[str] = None
+    lease_expires: Optional[float] = None
+
+
+class WorkQueue(ABC):
+    """Interface of a work queue backend."""
+
+    @abstractmethod
+    def enqueue(self, idempotency_key, property_name, payload, available_at=None):
+        """Add a job unless one with `idempotency_key` exists. Returns True if added."""
+
+    @abstractmethod
+    def lease(self, owner, lease_seconds, min_interval=0):
+        """Take the next available job for `lease_seconds`, skipping properties
+        that started a job less than `min_interval` seconds ago. Returns a Job,
+        or None if nothing can be taken now."""
+
+    @abstractmethod
+    def complete(self, job, result):
+        """Mark a leased job done with `result` (a JSON-serialisable dict)."""
+
+    @abstractmethod
+    def fail(self, job, error, retry_at=None):
+        """Release a leased job after a failure: it becomes available again at
+        `retry_at`, or is marked dead if `retry_at` is None."""
+
+    @abstractmethod
+    def next_available(self, min_interval=0):
+        """Return when lease() with `min_interval` could next take a job (epoch
+        seconds), or None if there are no jobs left to run."""
+
+    @abstractmethod
+    def counts(self):
+        """Return {state: number of jobs}."""
+
+    @abstractmethod
+    def purge(self, older_than):
+        """Delete done and dead jobs last updated more than `older_than`
+        seconds ago. Returns how many were deleted."""
+
+    def close(self):
+        pass
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    property_name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_available ON jobs (state, available_at);
+CREATE INDEX IF NOT EXISTS jobs_lease ON jobs (state, lease_expires);
+CREATE TABLE IF NOT EXISTS property_starts (
+    property_name TEXT PRIMARY KEY,
+    last_started REAL NOT NULL
+);
+"""
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """WorkQueue in a SQLite file. Leasing runs in an IMMEDIATE transaction,
+    so concurrent workers never take the same job."""
+
+    def __init__(self, path):
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    def _transaction(self, sql_steps):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                value = sql_steps(self._conn)
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            return value
+
+    def enqueue(self, idempotency_key, property_name, payload, available_at=None):
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO jobs (idempotency_key, property_name, payload, state, available_at,'
+                ' created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (idempotency_key, property_name, json.dumps(payload), QUEUED, available_at or now, now, now),
+            )
+            return cursor.rowcount == 1
+
+    def lease(self, owner, lease_seconds, min_interval=0):
+        def _lease(conn):
+            now = time.time()
+            # Queued jobs that are due, and leased jobs whose worker has gone quiet
+            row = conn.execute(
+                'SELECT jobs.* FROM jobs LEFT JOIN property_starts USING (property_name)'
+                ' WHERE ((jobs.state = ? AND jobs.available_at <= ?) OR (jobs.state = ? AND jobs.lease_expires < ?))'
+                ' AND (property_starts.last_started IS NULL OR property_starts.last_started <= ?)'
+                ' ORDER BY jobs.available_at, jobs.id LIMIT 1',
+                (QUEUED, now, LEASED, now, now - min_interval),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                'UPDATE jobs SET state = ?, attempts = attempts + 1, lease_owner = ?, lease_expires = ?,'
+                ' updated_at = ? WHERE id = ?',
+                (LEASED, owner, now + lease_seconds, now, row['id']),
+            )
+            conn.execute(
+                'INSERT INTO property_starts (property_name, last_started) VALUES (?, ?)'
+                ' ON CONFLICT (property_name) DO UPDATE SET last_started = excluded.last_started',
+                (row['property_name'], now),
+            )
+            return Job(
+                id=row['id'], idempotency_key=row['idempotency_key'], property_name=row['property_name'],
+                payload=json.loads(row['payload']), attempts=row['attempts'] + 1,
+                lease_owner=owner, lease_expires=now + lease_seconds,
+            )
+        return self._transaction(_lease)
+
+    def _finish(self, job, state, available_at=None, error=None, result=None):
+        # Only the current lease holder may finish a job; a worker whose lease
+        # expired and was taken over must not overwrite the new holder's outcome
+        def _update(conn):
+            cursor = conn.execute(
+                'UPDATE jobs SET state = ?, available_at = COALESCE(?, available_at), lease_owner = NULL,'
+                ' lease_expires = NULL, error = ?, result = ?, updated_at = ?'
+                ' WHERE id = ? AND state = ? AND lease_owner = ?',
+                (state, available_at, error, json.dumps(result) if result is not None else None, time.time(),
+                 job.id, LEASED, job.lease_owner),
+            )
+            return cursor.rowcount == 1
+        return self._transaction(_update)
+
+    def complete(self, job, result):
+        return self._finish(job, DONE, result=result)
+
+    def fail(self, job, error, retry_at=None):
+        if retry_at is None:
+            return self._finish(job, DEAD, error=error)
+        return self._finish(job, QUEUED, available_at=retry_at, error=error)
+
+    def next_available(self, min_interval=0):
+        # A job is due when it is available (or its lease expires) and its
+        # property is out of the rate limit
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT MIN(MAX(CASE WHEN jobs.state = ? THEN jobs.available_at ELSE jobs.lease_expires END,'
+                ' COALESCE(property_starts.last_started + ?, 0)))'
+                ' FROM jobs LEFT JOIN property_starts USING (property_name) WHERE jobs.state IN (?, ?)',
+                (QUEUED, min_interval, QUEUED, LEASED),
+            ).fetchone()
+        return row[0]
+
+    def purge(self, older_than):
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM jobs WHERE state IN (?, ?) AND updated_at < ?',
+                                        (DONE, DEAD, time.time() - older_than))
+            return cursor.rowcount
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall()
+        return {state: count for state, count in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Backends by URL scheme; a backend is constructed with the rest of the URL
+BACKENDS = {
+    'sqlite': SQLiteWorkQueue,
+}
+
+
+def open_queue(url):
+    """Open the queue at `url`, e.g. 'sqlite:///var/lib/r2p/queue.sqlite3'. A
+    plain path is taken as a SQLite file."""
+    scheme, separator, location = url.partition('://')
+    if not separator:
+        return SQLiteWorkQueue(url)
+    if scheme not in BACKENDS:
+        raise ValueError(f"Unknown work queue backend '{scheme}', expected one of {', '.join(BACKENDS)}")
+    # sqlite:///abs/path keeps its leading slash, sqlite://rel/path is relative
+    return BACKENDS[scheme](location)